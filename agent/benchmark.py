@@ -0,0 +1,752 @@
+"""Benchmarks of the hot paths of the agents.
+
+Every benchmark is a set of cases, e.g., "gnn.forward/stare/capacity=96/batch=32". A
+case is timed by calling it repeatedly, after a warm-up call, and its median and
+minimum seconds per call are written to a JSON file. Comparing that file with an older
+one (the baseline) flags every case that got slower by more than a threshold.
+
+    make bench
+    python -m agent.benchmark --output new.json --baseline benchmark-baseline.json
+    python -m agent.benchmark --quick --filter gnn.forward
+
+The working memories are synthetic (`agent.dqn.synthetic`). They have `capacity`
+long-term memories and `SHORT_CAPACITY` short-term ones, and use the entities and
+relations of the xl-different-prob room, like `DQNAgent`. The "*.local_env" cases run
+the agents on `agent.local_env`, whose steps cost next to nothing, so that they time
+the agents alone. The "policy.manage_memory" and "agent.step.local_env" cases are timed
+in both the checked and the fast mode (`agent.utils.set_checked`), and "memory.step"
+times a step of humemai's memory systems and of `agent.store.MemoryStore`.
+
+With `--scaling`, the GNN's forward pass is timed instead on single working memories
+of 10 to 100k quadruples, and the exponent of the curve, i.e., the slope of log time
+over log size, is checked. It's about 1 if the cost is linear in the size.
+
+    python -m agent.benchmark --scaling --output scaling.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from functools import partial
+from typing import Callable, Iterator
+
+import numpy as np
+import torch
+from torch.profiler import ProfilerActivity, profile
+
+CAPACITIES = [12, 96, 192, 384]
+BATCH_SIZES = [1, 8, 32, 128]
+GCN_TYPES = ["stare", "vanilla"]
+SHORT_CAPACITY = 15
+QUICK = {"capacities": [12, 96], "batch_sizes": [1, 8]}
+SCALING_SIZES = [10, 100, 1_000, 10_000, 100_000]
+MAX_EXPONENT = 1.25
+
+ENV_STR = "room_env:RoomEnv-v2"
+ROOM_SIZE = "xl-different-prob"
+TERMINATES_AT = 99
+
+# {mode: whether it's checked}, see `agent.utils.set_checked`
+MODES = {"checked": True, "fast": False}
+
+# {name: a function of (capacities, batch_sizes, wanted) that yields (case, callable)}
+# `wanted(case)` tells whether a case is timed. A case that isn't wanted is not built,
+# and neither is what only such cases share, e.g., a GNN or an agent.
+BENCHMARKS = {}
+
+
+def register(name: str) -> Callable:
+    r"""Register a benchmark under `name`."""
+
+    def decorator(function: Callable) -> Callable:
+        BENCHMARKS[name] = function
+        return function
+
+    return decorator
+
+
+def measure(function: Callable, repeat: int = 5, min_time: float = 0.05) -> dict:
+    r"""Time a function.
+
+    After a warm-up call, it's called `number` times in a row, `repeat` times, where
+    `number` is chosen so that every row takes at least `min_time` seconds.
+
+    Args:
+        function: the function to time, without arguments
+        repeat: the number of rows
+        min_time: the minimum seconds of a row
+
+    Returns:
+        median_s, min_s: the median and the minimum seconds per call over the rows
+        number, repeat: the calls per row, and the rows
+
+    """
+    start = time.perf_counter()
+    function()
+    first = time.perf_counter() - start
+    number = max(1, int(min_time / max(first, 1e-9)))
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+
+    return {
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def make_states(capacity: int, num: int, seed: int = 0) -> list[list[list]]:
+    r"""Make synthetic working memories.
+
+    Args:
+        capacity: the number of long-term memories of every state
+        num: the number of states
+        seed: the seed of the states
+
+    """
+    from .dqn.synthetic import generate_working_memory, make_vocab
+
+    vocab = make_vocab(ENV_STR, ROOM_SIZE, TERMINATES_AT)
+    rng = random.Random(seed)
+    return [
+        generate_working_memory(
+            capacity + SHORT_CAPACITY, vocab, num_short=SHORT_CAPACITY, seed=rng
+        )
+        for _ in range(num)
+    ]
+
+
+def _grid(
+    wanted: Callable[[str], bool],
+    prefix: str,
+    capacities: list[int],
+    batch_sizes: list[int] | None = None,
+) -> list[tuple[str, int, int | None]]:
+    # The wanted cases "{prefix}capacity=.../batch=...", as (case, capacity,
+    # batch_size). Without batch sizes, they are "{prefix}capacity=...".
+    cases = []
+    for capacity in capacities:
+        for batch_size in batch_sizes or [None]:
+            case = f"{prefix}capacity={capacity}"
+            if batch_size is not None:
+                case += f"/batch={batch_size}"
+            if wanted(case):
+                cases.append((case, capacity, batch_size))
+    return cases
+
+
+def _batch(states: list[list[list]]) -> np.ndarray:
+    # Like the observations in the replay buffer: an object array of lists.
+    data = np.empty(len(states), dtype=object)
+    for idx, state in enumerate(states):
+        data[idx] = state
+    return data
+
+
+def _gnn(gcn_type: str):
+    from .dqn.nn import GNN
+    from .dqn.synthetic import make_vocab
+
+    vocab = make_vocab(ENV_STR, ROOM_SIZE, TERMINATES_AT)
+    return GNN(
+        entities=vocab["entities"],
+        relations=vocab["relations"],
+        gcn_layer_params={
+            "type": gcn_type,
+            "embedding_dim": 8,
+            "num_layers": 2,
+            "gcn_drop": 0.1,
+            "triple_qual_weight": 0.8,
+        },
+    )
+
+
+@register("process_graph")
+def bench_process_graph(
+    capacities: list[int], batch_sizes: list[int], wanted: Callable[[str], bool]
+) -> Iterator:
+    from .dqn.nn.utils import process_graph
+
+    for case, capacity, _ in _grid(wanted, "", capacities):
+        state = make_states(capacity, 1)[0]
+        yield case, partial(process_graph, state)
+
+
+@register("gnn.process_batch")
+def bench_process_batch(
+    capacities: list[int], batch_sizes: list[int], wanted: Callable[[str], bool]
+) -> Iterator:
+    for gcn_type in GCN_TYPES:
+        cases = _grid(wanted, f"{gcn_type}/", capacities, batch_sizes)
+        if not cases:
+            continue
+        gnn = _gnn(gcn_type)
+        for case, capacity, batch_size in cases:
+            data = _batch(make_states(capacity, batch_size))
+            yield case, partial(gnn.process_batch, data)
+
+
+@register("gnn.forward")
+def bench_forward(
+    capacities: list[int], batch_sizes: list[int], wanted: Callable[[str], bool]
+) -> Iterator:
+    for gcn_type in GCN_TYPES:
+        cases = _grid(wanted, f"{gcn_type}/", capacities, batch_sizes)
+        if not cases:
+            continue
+        gnn = _gnn(gcn_type)
+        for case, capacity, batch_size in cases:
+            data = _batch(make_states(capacity, batch_size))
+            yield case, partial(gnn, data, policy_type="mm")
+
+
+@register("gnn.forward_backward")
+def bench_forward_backward(
+    capacities: list[int], batch_sizes: list[int], wanted: Callable[[str], bool]
+) -> Iterator:
+    def forward_backward(gnn, data: np.ndarray) -> None:
+        gnn.zero_grad()
+        q_mm = gnn(data, policy_type="mm")
+        q_explore = gnn(data, policy_type="explore")
+        (torch.cat(q_mm).sum() + torch.cat(q_explore).sum()).backward()
+
+    for gcn_type in GCN_TYPES:
+        cases = _grid(wanted, f"{gcn_type}/", capacities, batch_sizes)
+        if not cases:
+            continue
+        gnn = _gnn(gcn_type)
+        for case, capacity, batch_size in cases:
+            data = _batch(make_states(capacity, batch_size))
+            yield case, partial(forward_backward, gnn, data)
+
+
+def _transition(state: list[list], next_state: list[list]) -> tuple:
+    return (
+        state,
+        np.array(0),
+        np.zeros(SHORT_CAPACITY, dtype=int),
+        1.0,
+        1.0,
+        next_state,
+        False,
+    )
+
+
+def _replay_buffer(capacity: int, batch_size: int, size: int = 256):
+    from .dqn.utils import ReplayBuffer
+
+    size = max(size, batch_size)
+    states = make_states(capacity, size + 1)
+    replay_buffer = ReplayBuffer(size, batch_size)
+    for state, next_state in zip(states[:-1], states[1:]):
+        replay_buffer.store(*_transition(state, next_state))
+    return replay_buffer, states[0]
+
+
+@register("replay.store")
+def bench_replay_store(
+    capacities: list[int], batch_sizes: list[int], wanted: Callable[[str], bool]
+) -> Iterator:
+    for case, capacity, _ in _grid(wanted, "", capacities):
+        replay_buffer, state = _replay_buffer(capacity, 1)
+        yield case, partial(replay_buffer.store, *_transition(state, state))
+
+
+@register("replay.sample_batch")
+def bench_replay_sample(
+    capacities: list[int], batch_sizes: list[int], wanted: Callable[[str], bool]
+) -> Iterator:
+    for case, capacity, batch_size in _grid(wanted, "", capacities, batch_sizes):
+        replay_buffer, _ = _replay_buffer(capacity, batch_size)
+        yield case, replay_buffer.sample_batch
+
+
+@register("update_model")
+def bench_update_model(
+    capacities: list[int], batch_sizes: list[int], wanted: Callable[[str], bool]
+) -> Iterator:
+    from .dqn.utils import update_model
+
+    for gcn_type in GCN_TYPES:
+        cases = _grid(wanted, f"{gcn_type}/", capacities, batch_sizes)
+        if not cases:
+            continue
+        dqn, dqn_target = _gnn(gcn_type), _gnn(gcn_type)
+        optimizer = torch.optim.Adam(list(dqn.parameters()), lr=0.001)
+        for case, capacity, batch_size in cases:
+            replay_buffer, _ = _replay_buffer(capacity, batch_size)
+            yield (
+                case,
+                partial(
+                    update_model,
+                    replay_buffer=replay_buffer,
+                    optimizer=optimizer,
+                    device="cpu",
+                    dqn=dqn,
+                    dqn_target=dqn_target,
+                    ddqn=True,
+                    gamma={"mm": 0.9, "explore": 0.9},
+                ),
+            )
+
+
+def _in_mode(checked: bool, function: Callable) -> Callable:
+    from .utils import checked_mode
+
+    def run():
+        with checked_mode(checked):
+            return function()
+
+    return run
+
+
+def _manage_memories(capacity: int, observations: list[list]) -> None:
+    from humemai.memory import LongMemory, MemorySystems, ShortMemory
+
+    from .policy import ingest_observations, manage_memory
+
+    memory_systems = MemorySystems(
+        short=ShortMemory(capacity=capacity),
+        long=LongMemory(capacity=capacity, semantic_decay_factor=1.0, min_strength=1),
+    )
+    ingest_observations(memory_systems, observations)
+    for mem_short in list(memory_systems.short):
+        manage_memory(memory_systems, "episodic", mem_short)
+
+
+@register("policy.manage_memory")
+def bench_manage_memory(
+    capacities: list[int], batch_sizes: list[int], wanted: Callable[[str], bool]
+) -> Iterator:
+    # A short-term memory as large as the long-term one, moved one memory at a time,
+    # so that the checks of `manage_memory` are O(capacity) each.
+    for capacity in capacities:
+        observations = [
+            [f"obj_{i:03d}", "atlocation", "room_000", 0] for i in range(capacity)
+        ]
+        for mode, checked in MODES.items():
+            case = f"{mode}/capacity={capacity}"
+            if not wanted(case):
+                continue
+            yield (
+                case,
+                _in_mode(checked, partial(_manage_memories, capacity, observations)),
+            )
+
+
+def _memory_step(memory, observations: list[list]) -> None:
+    # One step of an agent's memory: encode, manage, decay and read it for the GNN.
+    from humemai.memory import MemorySystems, ShortMemory
+
+    from .policy import manage_all_memories
+
+    if isinstance(memory, MemorySystems):
+        for mem in [ShortMemory.ob2short(obs) for obs in observations]:
+            memory.short.add(mem)
+        manage_all_memories(memory, ["episodic"] * memory.short.size)
+        memory.long.decay()
+        memory.get_working_memory().to_list()
+    else:
+        memory.add_observations(observations)
+        memory.manage(["episodic"] * memory.num_short)
+        memory.decay()
+        memory.working_memory()
+
+
+@register("memory.step")
+def bench_memory_step(
+    capacities: list[int], batch_sizes: list[int], wanted: Callable[[str], bool]
+) -> Iterator:
+    from humemai.memory import LongMemory, MemorySystems, ShortMemory
+
+    from .dqn.synthetic import make_vocab
+    from .store import MemoryStore
+
+    vocab = make_vocab()
+    rng = random.Random(0)
+    for capacity in capacities:
+        makers = {
+            "memory_systems": lambda: MemorySystems(
+                short=ShortMemory(capacity=SHORT_CAPACITY),
+                long=LongMemory(
+                    capacity=capacity, semantic_decay_factor=0.9, min_strength=1
+                ),
+            ),
+            "store": lambda: MemoryStore(
+                vocab["entities"],
+                vocab["relations"],
+                {"short": SHORT_CAPACITY, "long": capacity},
+                semantic_decay_factor=0.9,
+                min_strength=1,
+            ),
+        }
+        # The steps are drawn for every capacity, so that the cases don't depend on
+        # which ones are wanted.
+        steps = [
+            [
+                [rng.choice(vocab["objects"]), "atlocation", room, t]
+                for room in rng.sample(vocab["rooms"], SHORT_CAPACITY)
+            ]
+            for t in range(vocab["terminates_at"] + 1)
+        ]
+        for name, make in makers.items():
+            case = f"{name}/capacity={capacity}"
+            if not wanted(case):
+                continue
+            memory = make()
+            # A whole episode first, to fill the long-term memory.
+            for observations in steps:
+                _memory_step(memory, observations)
+            yield case, partial(_memory_step, memory, steps[-1])
+
+
+def _agent_step(agent) -> None:
+    done = agent.step(greedy=False)[-1]
+    if done:
+        agent.reset()
+
+
+def _env_config() -> dict:
+    return {
+        "question_prob": 1.0,
+        "terminates_at": TERMINATES_AT,
+        "randomize_observations": "all",
+        "room_size": ROOM_SIZE,
+        "rewards": {"correct": 1, "wrong": 0, "partial": 0},
+        "make_everything_static": False,
+        "num_total_questions": 1000,
+        "question_interval": 1,
+        "include_walls_in_observations": True,
+    }
+
+
+def _bench_agent_step(
+    env_str: str,
+    capacities: list[int],
+    wanted: Callable[[str], bool],
+    modes: bool = False,
+) -> Iterator:
+    from .dqn import DQNAgent
+
+    for capacity in capacities:
+        prefixes = [f"{mode}/" for mode in MODES] if modes else [""]
+        if not any(wanted(f"{prefix}capacity={capacity}") for prefix in prefixes):
+            continue
+        with tempfile.TemporaryDirectory() as default_root_dir:
+            agent = DQNAgent(
+                env_str=env_str,
+                capacity={"long": capacity, "short": SHORT_CAPACITY},
+                env_config=_env_config(),
+                default_root_dir=default_root_dir,
+                background_plotting=False,
+                timing=False,
+            )
+            agent.reset()
+            # The agent writes to its directory, so its cases are timed in it.
+            if not modes:
+                yield f"capacity={capacity}", partial(_agent_step, agent)
+            else:
+                for mode, checked in MODES.items():
+                    case = f"{mode}/capacity={capacity}"
+                    if wanted(case):
+                        yield case, _in_mode(checked, partial(_agent_step, agent))
+            agent.release_env()
+
+
+@register("agent.step")
+def bench_agent_step(
+    capacities: list[int], batch_sizes: list[int], wanted: Callable[[str], bool]
+) -> Iterator:
+    yield from _bench_agent_step(ENV_STR, capacities, wanted)
+
+
+@register("agent.step.local_env")
+def bench_agent_step_local(
+    capacities: list[int], batch_sizes: list[int], wanted: Callable[[str], bool]
+) -> Iterator:
+    from .local_env import LOCAL_ENV_STR
+
+    yield from _bench_agent_step(LOCAL_ENV_STR, capacities, wanted, modes=True)
+
+
+@register("handcrafted.run_episode.local_env")
+def bench_handcrafted_local(
+    capacities: list[int], batch_sizes: list[int], wanted: Callable[[str], bool]
+) -> Iterator:
+    from .handcrafted import HandcraftedAgent
+    from .local_env import LOCAL_ENV_STR
+
+    for case, capacity, _ in _grid(wanted, "", capacities):
+        with tempfile.TemporaryDirectory() as default_root_dir:
+            agent = HandcraftedAgent(
+                env_str=LOCAL_ENV_STR,
+                env_config=_env_config(),
+                mm_policy="handcrafted",
+                capacity={"long": capacity, "short": SHORT_CAPACITY},
+                default_root_dir=default_root_dir,
+            )
+            yield case, agent.run_episode
+            agent.release_env()
+
+
+def run_benchmarks(
+    names: list[str] | None = None,
+    capacities: list[int] = CAPACITIES,
+    batch_sizes: list[int] = BATCH_SIZES,
+    pattern: str | None = None,
+    repeat: int = 5,
+    min_time: float = 0.05,
+) -> dict:
+    r"""Run the benchmarks.
+
+    Args:
+        names: the benchmarks to run. None is all of them (`BENCHMARKS`).
+        capacities: the long-term memory capacities of the working memories
+        batch_sizes: the batch sizes
+        pattern: a regular expression. Only the cases whose full names match it are
+            built and timed.
+        repeat: see `measure`
+        min_time: see `measure`
+
+    Returns:
+        {"meta": {...}, "results": {case: {"median_s", "min_s", ...}}}
+
+    """
+    torch.manual_seed(0)
+    np.random.seed(0)
+
+    results = {}
+    for name in names or list(BENCHMARKS):
+
+        def wanted(case: str, name: str = name) -> bool:
+            return pattern is None or re.search(pattern, f"{name}/{case}") is not None
+
+        for case, function in BENCHMARKS[name](capacities, batch_sizes, wanted):
+            full_name = f"{name}/{case}"
+            results[full_name] = measure(function, repeat=repeat, min_time=min_time)
+            print(f"{full_name}: {results[full_name]['median_s'] * 1e3:.3f} ms")
+
+    return {"meta": _meta(), "results": results}
+
+
+def _meta() -> dict:
+    return {
+        "python": sys.version.split()[0],
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "num_threads": torch.get_num_threads(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float = 0.1) -> list[dict]:
+    r"""Compare the results of two runs, case by case, by their median times.
+
+    Args:
+        results: the new run, as returned by `run_benchmarks`
+        baseline: the old run
+        threshold: a case is a regression if it's slower than the baseline by more
+            than this fraction, and an improvement if it's faster by more than this.
+
+    Returns:
+        one row per case: {"case", "baseline_s", "new_s", "ratio", "status"}, where
+        the status is "regression", "improvement", "same", "new" or "missing".
+
+    """
+    new, old = results["results"], baseline["results"]
+    rows = []
+    for case in list(old) + [case for case in new if case not in old]:
+        row = {
+            "case": case,
+            "baseline_s": old[case]["median_s"] if case in old else None,
+            "new_s": new[case]["median_s"] if case in new else None,
+            "ratio": None,
+        }
+        if case not in new:
+            row["status"] = "missing"
+        elif case not in old:
+            row["status"] = "new"
+        else:
+            row["ratio"] = row["new_s"] / row["baseline_s"]
+            if row["ratio"] > 1 + threshold:
+                row["status"] = "regression"
+            elif row["ratio"] < 1 - threshold:
+                row["status"] = "improvement"
+            else:
+                row["status"] = "same"
+        rows.append(row)
+
+    return rows
+
+
+def allocated_bytes(function: Callable) -> int:
+    r"""The bytes that the operators of one call of a function allocate in total, as
+    recorded by the profiler. It's not the peak, since the memory that is freed in
+    between is counted too."""
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        function()
+    return sum(
+        max(event.self_cpu_memory_usage, 0)
+        for event in prof.key_averages()
+        if event.key != "[memory]"
+    )
+
+
+def scaling_curve(
+    gcn_type: str,
+    sizes: list[int] = SCALING_SIZES,
+    repeat: int = 5,
+    min_time: float = 0.05,
+) -> dict:
+    r"""Time the forward pass of a GNN on working memories of growing sizes.
+
+    Args:
+        gcn_type: the type of the GNN, e.g., "stare"
+        sizes: the numbers of quadruples of the working memories
+        repeat: see `measure`
+        min_time: see `measure`
+
+    Returns:
+        points: {"num_quadruples", "median_s", "min_s", "allocated_bytes"} per size
+        time_exponent, memory_exponent: see `scaling_exponent`
+
+    """
+    from .dqn.synthetic import generate_working_memory
+
+    gnn = _gnn(gcn_type)
+    points = []
+    for size in sizes:
+        data = _batch(
+            [generate_working_memory(size, num_short=SHORT_CAPACITY, seed=size)]
+        )
+        function = partial(gnn, data, policy_type="mm")
+        with torch.no_grad():
+            timing = measure(function, repeat=repeat, min_time=min_time)
+            memory = allocated_bytes(function)
+        points.append(
+            {
+                "num_quadruples": size,
+                "median_s": timing["median_s"],
+                "min_s": timing["min_s"],
+                "allocated_bytes": memory,
+            }
+        )
+        print(
+            f"gnn.forward/{gcn_type}/num_quadruples={size}: "
+            f"{timing['median_s'] * 1e3:.3f} ms, {memory / 2**20:.1f} MiB"
+        )
+
+    return {
+        "points": points,
+        "time_exponent": scaling_exponent(
+            sizes, [point["median_s"] for point in points]
+        ),
+        "memory_exponent": scaling_exponent(
+            sizes, [point["allocated_bytes"] for point in points]
+        ),
+    }
+
+
+def scaling_exponent(sizes: list[int], values: list[float]) -> float:
+    r"""The slope of the least-squares line of log(values) over log(sizes).
+
+    A cost that is linear in the size has an exponent of 1, and a quadratic one has
+    2. The small sizes are dominated by the constant overheads, so only the upper half
+    of the sizes is used, but at least two of them.
+
+    """
+    assert len(sizes) == len(values) >= 2
+    num = max(2, (len(sizes) + 1) // 2)
+    slope, _ = np.polyfit(np.log(sizes[-num:]), np.log(values[-num:]), 1)
+    return float(slope)
+
+
+def main_scaling(args: argparse.Namespace) -> None:
+    torch.manual_seed(0)
+    curves = {
+        gcn_type: scaling_curve(gcn_type, args.sizes, args.repeat)
+        for gcn_type in GCN_TYPES
+    }
+    with open(args.output, "w") as stream:
+        json.dump({"meta": _meta(), "scaling": curves}, stream, indent=2)
+    print(f"written to {args.output}")
+
+    super_linear = []
+    for gcn_type, curve in curves.items():
+        print(
+            f"{gcn_type}: time exponent {curve['time_exponent']:.2f}, "
+            f"memory exponent {curve['memory_exponent']:.2f}"
+        )
+        if max(curve["time_exponent"], curve["memory_exponent"]) > args.max_exponent:
+            super_linear.append(gcn_type)
+    if super_linear:
+        print(f"super-linear over {args.max_exponent}: {', '.join(super_linear)}")
+        sys.exit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the agents' hot paths.")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="a JSON file of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS))
+    parser.add_argument("--filter", help="a regular expression on the case names")
+    parser.add_argument("--capacities", nargs="+", type=int, default=CAPACITIES)
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=BATCH_SIZES)
+    parser.add_argument("--quick", action="store_true", help="fewer, smaller cases")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--scaling", action="store_true", help="time the GNN over growing sizes"
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=SCALING_SIZES)
+    parser.add_argument("--max-exponent", type=float, default=MAX_EXPONENT)
+    args = parser.parse_args()
+
+    if args.scaling:
+        main_scaling(args)
+        return
+
+    if args.quick:
+        args.capacities, args.batch_sizes = QUICK["capacities"], QUICK["batch_sizes"]
+
+    results = run_benchmarks(
+        args.benchmarks,
+        args.capacities,
+        args.batch_sizes,
+        args.filter,
+        args.repeat,
+    )
+    with open(args.output, "w") as stream:
+        json.dump(results, stream, indent=2)
+    print(f"written to {args.output}")
+
+    if args.baseline is None:
+        return
+
+    with open(args.baseline, "r") as stream:
+        baseline = json.load(stream)
+    rows = compare(results, baseline, args.threshold)
+    for row in rows:
+        ratio = "" if row["ratio"] is None else f"{row['ratio']:.2f}x"
+        print(f"{row['status']:>11} {ratio:>7}  {row['case']}")
+
+    regressions = [row for row in rows if row["status"] == "regression"]
+    if regressions:
+        print(f"{len(regressions)} regressions over {args.threshold:.0%}.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
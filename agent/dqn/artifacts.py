@@ -0,0 +1,377 @@
+"""Columnar binary result artifacts.
+
+An artifact is a directory that holds a table, written in shards of rows:
+
+    manifest.json              the columns, their kinds and dtypes
+    shards.jsonl               {"shard": i, "num_rows": n} per flush
+    <column>-00000.bin         the raw values of the rows of shard 0, one after another
+    <column>-00000.index.bin   int64 [start, end, ndim, *shape] of every row of shard 0
+    <column>-00001.bin
+    ...
+
+A column is either of kind "array", where every row is a number or a numeric array
+(e.g., q-values) whose values are stored flat with its shape in the index, or of kind
+"json", where every row is anything that JSON can encode (e.g., a memory state), stored
+as UTF-8 bytes. The rows are appended to the open shard as they are flushed, until it
+has `shard_size` rows, and a new shard is opened. After the rows, one line with the
+shard's number of rows so far is appended to `shards.jsonl`, so that a reader only
+ever sees complete rows, and neither the number of files nor the cost of a flush grows
+with the number of flushes. `Artifact` memory-maps the .bin files.
+
+The YAML results of older trainings (`q_values.yaml`,
+`states_q_values_actions_*.yaml`) can be converted with
+
+    python -m agent.dqn.artifacts <default_root_dir> [<default_root_dir> ...]
+"""
+
+import argparse
+import json
+import os
+from glob import escape, glob
+
+import numpy as np
+import yaml
+
+# The maximum number of dimensions of an array row.
+MAX_NDIM = 4
+
+
+def _kind_and_dtype(value) -> tuple[str, str | None]:
+    try:
+        array = np.asarray(value)
+    except ValueError:  # ragged nested lists
+        return "json", None
+    if array.dtype.kind in "biuf" and array.ndim <= MAX_NDIM:
+        return "array", array.dtype.str
+    return "json", None
+
+
+class ArtifactWriter:
+    r"""Write rows into an artifact, appending them to its shards.
+
+    The columns and their kinds are taken from the first row. Every row has to have
+    the same columns.
+
+    Attributes:
+        path (str): the directory of the artifact
+        shard_size (int): the maximum number of rows of a shard
+        manifest (dict): {"num_rows", "columns", "shards": [{"num_rows"}, ...]}, as
+            it's on disk
+
+    Example:
+    ```
+    writer = ArtifactWriter("training-results/states_q_values_actions_test")
+    for state, q_values in zip(states, q_values):
+        writer.append({"state": state, "q_values": q_values})
+    writer.close()
+
+    artifact = Artifact("training-results/states_q_values_actions_test")
+    artifact.get("q_values", 0)
+    ```
+
+    """
+
+    def __init__(self, path: str, shard_size: int = 1000) -> None:
+        """Create the directory and an empty manifest.
+
+        Args:
+            path: the directory of the artifact
+            shard_size: the maximum number of rows of a shard. The rows are
+                written when this many are appended, or when `flush` is called.
+
+        """
+        assert shard_size >= 1
+        self.path = path
+        self.shard_size = shard_size
+        self.manifest = {"num_rows": 0, "columns": {}, "shards": []}
+        self._rows = []
+
+        os.makedirs(self.path, exist_ok=True)
+        self._write_manifest()
+        open(os.path.join(self.path, "shards.jsonl"), "w").close()
+
+    def _write_manifest(self) -> None:
+        tmp = os.path.join(self.path, "manifest.json.tmp")
+        with open(tmp, "w") as stream:
+            json.dump({"columns": self.manifest["columns"]}, stream)
+        os.replace(tmp, os.path.join(self.path, "manifest.json"))
+
+    def append(self, row: dict) -> None:
+        r"""Append a row.
+
+        Args:
+            row: {column: value}
+
+        """
+        self._rows.append(row)
+        if len(self._rows) >= self.shard_size:
+            self.flush()
+
+    def flush(self) -> None:
+        r"""Append the appended rows to the open shard, and open new ones when it's
+        full."""
+        if not self._rows:
+            return
+
+        columns = self.manifest["columns"]
+        if not columns:
+            for name, value in self._rows[0].items():
+                kind, dtype = _kind_and_dtype(value)
+                columns[name] = {"kind": kind, "dtype": dtype}
+            self._write_manifest()
+
+        shards = self.manifest["shards"]
+        while self._rows:
+            if not shards or shards[-1]["num_rows"] >= self.shard_size:
+                shards.append({"num_rows": 0})
+            rows = self._rows[: self.shard_size - shards[-1]["num_rows"]]
+            self._rows = self._rows[len(rows) :]
+            self._append_to_shard(len(shards) - 1, rows)
+
+            shards[-1]["num_rows"] += len(rows)
+            self.manifest["num_rows"] += len(rows)
+            entry = {"shard": len(shards) - 1, "num_rows": shards[-1]["num_rows"]}
+            with open(os.path.join(self.path, "shards.jsonl"), "a") as stream:
+                stream.write(json.dumps(entry) + "\n")
+
+    def _append_to_shard(self, shard_idx: int, rows: list[dict]) -> None:
+        for name, spec in self.manifest["columns"].items():
+            dtype = np.dtype(spec["dtype"] if spec["kind"] == "array" else np.uint8)
+            fname = self._fname(name, shard_idx)
+            start = (
+                os.path.getsize(fname) // dtype.itemsize if os.path.isfile(fname) else 0
+            )
+            index = np.zeros((len(rows), 3 + MAX_NDIM), dtype=np.int64)
+            chunks = []
+            for row_idx, row in enumerate(rows):
+                if spec["kind"] == "array":
+                    array = np.asarray(row[name], dtype=dtype)
+                    index[row_idx, 2] = array.ndim
+                    index[row_idx, 3 : 3 + array.ndim] = array.shape
+                    chunk = array.reshape(-1)
+                else:
+                    chunk = np.frombuffer(json.dumps(row[name]).encode(), np.uint8)
+                index[row_idx, :2] = start, start + len(chunk)
+                start += len(chunk)
+                chunks.append(chunk)
+
+            with open(fname, "ab") as stream:
+                stream.write(np.concatenate(chunks).astype(dtype, copy=False).tobytes())
+            with open(self._fname(name, shard_idx, index=True), "ab") as stream:
+                stream.write(index.tobytes())
+
+    def _fname(self, name: str, shard_idx: int, index: bool = False) -> str:
+        suffix = ".index.bin" if index else ".bin"
+        return os.path.join(self.path, f"{name}-{shard_idx:05d}{suffix}")
+
+    def truncate(self) -> None:
+        r"""Bring the artifact on disk back to this writer's manifest, e.g., after
+        loading a pickled writer whose run went on writing rows."""
+        shards = self.manifest["shards"]
+        for fname in glob(os.path.join(escape(self.path), "*.bin")):
+            shard_idx = int(os.path.basename(fname).split("-")[-1].split(".")[0])
+            if shard_idx >= len(shards):
+                os.remove(fname)
+
+        for shard_idx, shard in enumerate(shards):
+            for name, spec in self.manifest["columns"].items():
+                dtype = np.dtype(spec["dtype"] if spec["kind"] == "array" else np.uint8)
+                index_fname = self._fname(name, shard_idx, index=True)
+                index = np.fromfile(index_fname, dtype=np.int64)
+                index = index.reshape(-1, 3 + MAX_NDIM)[: shard["num_rows"]]
+                os.truncate(index_fname, index.nbytes)
+                end = int(index[-1, 1]) if len(index) else 0
+                os.truncate(self._fname(name, shard_idx), end * dtype.itemsize)
+
+        tmp = os.path.join(self.path, "shards.jsonl.tmp")
+        with open(tmp, "w") as stream:
+            for shard_idx, shard in enumerate(shards):
+                entry = {"shard": shard_idx, "num_rows": shard["num_rows"]}
+                stream.write(json.dumps(entry) + "\n")
+        os.replace(tmp, os.path.join(self.path, "shards.jsonl"))
+
+    def close(self) -> None:
+        r"""Write the rows that are left."""
+        self.flush()
+
+
+class Artifact:
+    r"""Read an artifact written by `ArtifactWriter`.
+
+    Attributes:
+        path (str): the directory of the artifact
+        num_rows (int): the number of rows that were flushed
+        columns (dict): {column: {"kind", "dtype"}}
+        num_shards (int): the number of shards
+
+    """
+
+    def __init__(self, path: str, mmap: bool = True) -> None:
+        """Read the manifest and the numbers of rows of the shards.
+
+        Args:
+            path: the directory of the artifact
+            mmap: whether to memory-map the shards, instead of reading them
+
+        """
+        self.path = path
+        self.mmap = mmap
+        with open(os.path.join(path, "manifest.json"), "r") as stream:
+            self.columns = json.load(stream)["columns"]
+
+        shard_rows = {}
+        with open(os.path.join(path, "shards.jsonl"), "r") as stream:
+            for line in stream:
+                if line.endswith("\n"):  # not a line that is being written
+                    entry = json.loads(line)
+                    shard_rows[entry["shard"]] = entry["num_rows"]
+        self.num_shards = len(shard_rows)
+        self._shard_rows = [shard_rows[idx] for idx in range(self.num_shards)]
+        self._shard_starts = np.cumsum([0] + self._shard_rows)
+        self.num_rows = int(self._shard_starts[-1])
+        self._shards = {}
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def _load(self, name: str, shard_idx: int) -> tuple[np.ndarray, np.ndarray]:
+        if (name, shard_idx) not in self._shards:
+            spec = self.columns[name]
+            dtype = np.dtype(spec["dtype"] if spec["kind"] == "array" else np.uint8)
+            fname = os.path.join(self.path, f"{name}-{shard_idx:05d}")
+            # The writer may be appending more rows meanwhile.
+            num_rows = self._shard_rows[shard_idx]
+            index = np.fromfile(
+                fname + ".index.bin", dtype=np.int64, count=num_rows * (3 + MAX_NDIM)
+            ).reshape(num_rows, 3 + MAX_NDIM)
+            end = int(index[-1, 1]) if len(index) else 0
+            if self.mmap and end > 0:
+                values = np.memmap(fname + ".bin", dtype=dtype, mode="r", shape=(end,))
+            else:
+                values = np.fromfile(fname + ".bin", dtype=dtype, count=end)
+            self._shards[(name, shard_idx)] = values, index
+        return self._shards[(name, shard_idx)]
+
+    def _decode(self, name: str, values: np.ndarray, index_row: np.ndarray):
+        start, end, ndim = index_row[:3]
+        if self.columns[name]["kind"] == "array":
+            return values[start:end].reshape(tuple(index_row[3 : 3 + ndim]))
+        return json.loads(values[start:end].tobytes())
+
+    def get(self, name: str, row_idx: int):
+        r"""The value of one row of a column.
+
+        Args:
+            name: the column
+            row_idx: the row
+
+        """
+        if not 0 <= row_idx < self.num_rows:
+            raise IndexError(f"row {row_idx} is out of {self.num_rows} rows")
+        shard_idx = int(np.searchsorted(self._shard_starts, row_idx, "right")) - 1
+        values, index = self._load(name, shard_idx)
+        return self._decode(
+            name, values, index[row_idx - self._shard_starts[shard_idx]]
+        )
+
+    def shard(self, name: str, shard_idx: int) -> list:
+        r"""The values of all the rows of one shard of a column.
+
+        Args:
+            name: the column
+            shard_idx: the shard
+
+        """
+        values, index = self._load(name, shard_idx)
+        return [self._decode(name, values, index_row) for index_row in index]
+
+    def column(self, name: str, start: int = 0) -> list:
+        r"""The values of the rows of a column.
+
+        Args:
+            name: the column
+            start: the first row, e.g., the number of rows that were read before
+
+        """
+        first_shard = int(np.searchsorted(self._shard_starts, start, "right")) - 1
+        rows = []
+        for shard_idx in range(max(first_shard, 0), self.num_shards):
+            values, index = self._load(name, shard_idx)
+            skip = max(start - int(self._shard_starts[shard_idx]), 0)
+            rows += [
+                self._decode(name, values, index_row) for index_row in index[skip:]
+            ]
+        return rows
+
+    def row(self, row_idx: int) -> dict:
+        r"""All the columns of one row.
+
+        Args:
+            row_idx: the row
+
+        """
+        return {name: self.get(name, row_idx) for name in self.columns}
+
+
+def convert_yaml(default_root_dir: str) -> list[str]:
+    r"""Convert the YAML results of a training into artifacts, next to them. The
+    YAML files are kept.
+
+    `q_values.yaml` becomes one artifact per split and policy, in
+    `metrics/q_values_{split}_{policy}`, with the column "value", as `MetricSeries`
+    writes them. Every `states_q_values_actions_*.yaml` becomes an artifact of the
+    same name, with one column per key.
+
+    Args:
+        default_root_dir: the directory of the training
+
+    Returns:
+        the paths of the artifacts that were written
+
+    """
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    written = []
+
+    path = os.path.join(default_root_dir, "q_values.yaml")
+    if os.path.isfile(path):
+        with open(path, "r") as stream:
+            q_values = yaml.load(stream, Loader=loader)
+        for split, val in q_values.items():
+            for policy, rows in val.items():
+                writer = ArtifactWriter(
+                    os.path.join(
+                        default_root_dir, "metrics", f"q_values_{split}_{policy}"
+                    )
+                )
+                for row in rows:
+                    writer.append({"value": row})
+                writer.close()
+                written.append(writer.path)
+
+    pattern = os.path.join(escape(default_root_dir), "states_q_values_actions_*.yaml")
+    for path in sorted(glob(pattern)):
+        with open(path, "r") as stream:
+            rows = yaml.load(stream, Loader=loader)
+        writer = ArtifactWriter(os.path.splitext(path)[0])
+        for row in rows:
+            writer.append(row)
+        writer.close()
+        written.append(writer.path)
+
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Convert the YAML results of DQN trainings into artifacts."
+    )
+    parser.add_argument("default_root_dirs", nargs="+")
+    args = parser.parse_args()
+
+    for default_root_dir in args.default_root_dirs:
+        for path in convert_yaml(default_root_dir):
+            print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Keeping the best validation models of a `DQNAgent`.
+
+A `CheckpointManager` writes the state dicts from a background thread, so that the
+training doesn't wait for the disk. Every model is written to a temporary file first
+and then renamed. The models that are kept are listed, best first, in the index file
+`checkpoints.json`, which is also replaced atomically, and only then is the model that
+fell out of the top k removed. So a crash at any point leaves an index whose models
+are all complete files.
+"""
+
+import bisect
+import json
+import os
+import queue
+import threading
+
+import torch
+
+INDEX_FNAME = "checkpoints.json"
+
+
+class CheckpointManager:
+    r"""Keep the top-k models by their validation score.
+
+    The models are ordered by their score, and then by their episode, so that of two
+    models with the same score, the later one is the better one.
+
+    Attributes:
+        directory (str): where the models and the index are written
+        top_k (int): the number of models to keep
+        entries (list[dict]): {"episode", "score", "path"} of the kept models, best
+            first. The paths are relative to `directory`.
+
+    Example:
+    ```
+    checkpoints = CheckpointManager(agent.default_root_dir, top_k=3)
+    checkpoints.save(snapshot_state_dict(agent.dqn), episode=10, score=42)
+    ...
+    checkpoints.wait()
+    agent.dqn.load_state_dict(torch.load(checkpoints.best()))
+    ```
+
+    """
+
+    def __init__(self, directory: str, top_k: int = 1) -> None:
+        """Initialize the manager with an empty index.
+
+        Args:
+            directory: where the models and the index are written
+            top_k: the number of models to keep
+
+        """
+        assert top_k >= 1
+        self.directory = directory
+        self.top_k = top_k
+        self.entries = []
+        self._keys = []  # the sort keys of `entries`, for bisect
+        self._queue = None
+        self._thread = None
+        self._error = None
+
+    @staticmethod
+    def _key(entry: dict) -> tuple[int | float, int]:
+        return (-entry["score"], -entry["episode"])
+
+    def save(self, state_dict: dict, episode: int, score: int | float) -> None:
+        r"""Write a model in the background, and keep it if it's in the top k.
+
+        Args:
+            state_dict: the weights. They must not change afterwards, e.g., a
+                `snapshot_state_dict`.
+            episode: the number of episodes run so far
+            score: the validation score
+
+        """
+        self._raise_error()
+        if self._thread is None:
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._write_forever, daemon=True)
+            self._thread.start()
+        self._queue.put((state_dict, episode, score))
+
+    def _write_forever(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is not None and self._error is None:
+                    self._write(*job)
+            except Exception as error:
+                self._error = error
+            finally:
+                self._queue.task_done()
+            if job is None:
+                break
+
+    def _write(self, state_dict: dict, episode: int, score: int | float) -> None:
+        entry = {
+            "episode": episode,
+            "score": score,
+            "path": f"episode={episode}_val-score={score}.pt",
+        }
+        key = self._key(entry)
+        if len(self.entries) == self.top_k and key >= self._keys[-1]:
+            return  # not better than the worst that is kept
+
+        path = os.path.join(self.directory, entry["path"])
+        torch.save(state_dict, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+        idx = bisect.bisect_right(self._keys, key)
+        self._keys.insert(idx, key)
+        self.entries.insert(idx, entry)
+        evicted = None
+        if len(self.entries) > self.top_k:
+            self._keys.pop()
+            evicted = self.entries.pop()
+
+        self._write_index()
+        if evicted is not None:
+            os.remove(os.path.join(self.directory, evicted["path"]))
+
+    def _write_index(self) -> None:
+        path = os.path.join(self.directory, INDEX_FNAME)
+        with open(path + ".tmp", "w") as stream:
+            json.dump(self.entries, stream, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("Writing a checkpoint failed.") from self._error
+
+    def wait(self) -> None:
+        r"""Wait until all the models that were saved so far are written."""
+        if self._queue is not None:
+            self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        r"""Wait for the writes, and stop the thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._queue, self._thread = None, None
+        self._raise_error()
+
+    def best(self) -> str | None:
+        r"""The path of the best model, after waiting for the writes. None if there
+        is none."""
+        self.wait()
+        if not self.entries:
+            return None
+        return os.path.join(self.directory, self.entries[0]["path"])
+
+    def paths(self) -> list[str]:
+        r"""The paths of the kept models, best first, after waiting for the writes."""
+        self.wait()
+        return [os.path.join(self.directory, entry["path"]) for entry in self.entries]
+
+    def restore(self, entries: list[dict], state_dicts: list[dict]) -> None:
+        r"""Write the given models and their index, e.g., from a training checkpoint.
+
+        Args:
+            entries: the index, best first
+            state_dicts: the weights of the entries
+
+        """
+        self.wait()
+        for entry, state_dict in zip(entries, state_dicts):
+            path = os.path.join(self.directory, entry["path"])
+            torch.save(state_dict, path + ".tmp")
+            os.replace(path + ".tmp", path)
+        self.entries = [dict(entry) for entry in entries]
+        self._keys = [self._key(entry) for entry in self.entries]
+        self._write_index()
+
+    def __getstate__(self) -> dict:
+        self.wait()
+        state = self.__dict__.copy()
+        state["_queue"], state["_thread"] = None, None
+        return state
+
+
+def read_index(directory: str) -> list[dict]:
+    r"""Read the index of the kept models of a training.
+
+    Args:
+        directory: the `default_root_dir` of the training
+
+    Returns:
+        {"episode", "score", "path"} of the kept models, best first. The paths are
+        relative to `directory`.
+
+    """
+    with open(os.path.join(directory, INDEX_FNAME), "r") as stream:
+        return json.load(stream)
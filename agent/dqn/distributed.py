@@ -0,0 +1,326 @@
+"""Data-parallel learning with `torch.distributed`.
+
+Every rank runs its own `DQNAgent` (its own env and replay buffer) and samples its own
+shard of the batch. After the backward pass the gradients are averaged across the ranks
+with one all-reduce, so that every rank takes the same optimizer step and the online
+and target networks stay identical everywhere. The `gloo` backend is used by default,
+so this runs on CPUs, on one machine or on several.
+
+On one machine, the ranks can be spawned with `launch`. On several machines, start one
+process per rank (e.g., with `torchrun`) and call `init_process_group` in each of them.
+"""
+
+import os
+import time
+from datetime import timedelta
+from typing import Callable
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
+
+
+def init_process_group(
+    rank: int | None = None,
+    world_size: int | None = None,
+    master_addr: str = "127.0.0.1",
+    master_port: int = 29500,
+    backend: str = "gloo",
+    timeout_minutes: int = 30,
+) -> None:
+    r"""Initialize the default process group.
+
+    If `rank` and `world_size` are not given, they are read from the environment
+    variables `RANK` and `WORLD_SIZE` (as set by `torchrun`), as well as
+    `MASTER_ADDR` and `MASTER_PORT`.
+
+    Args:
+        rank: rank of this process
+        world_size: number of processes
+        master_addr: address of the rank 0 process
+        master_port: free port on the rank 0 process
+        backend: "gloo" or "nccl"
+        timeout_minutes: timeout for the collective operations. Validation only
+            runs on rank 0, so the others wait for it at the next all-reduce.
+
+    """
+    if rank is None or world_size is None:
+        dist.init_process_group(
+            backend=backend, timeout=timedelta(minutes=timeout_minutes)
+        )
+    else:
+        os.environ.setdefault("MASTER_ADDR", master_addr)
+        os.environ.setdefault("MASTER_PORT", str(master_port))
+        dist.init_process_group(
+            backend=backend,
+            rank=rank,
+            world_size=world_size,
+            timeout=timedelta(minutes=timeout_minutes),
+        )
+
+
+def get_rank() -> int:
+    """The rank of this process. 0 if not distributed."""
+    return dist.get_rank() if dist.is_available() and dist.is_initialized() else 0
+
+
+def get_world_size() -> int:
+    """The number of processes. 1 if not distributed."""
+    return dist.get_world_size() if dist.is_available() and dist.is_initialized() else 1
+
+
+def broadcast_parameters(model: torch.nn.Module, src: int = 0) -> None:
+    r"""Copy the parameters and buffers of `model` on rank `src` to the other ranks.
+
+    Args:
+        model: the model
+        src: the rank to copy from
+
+    """
+    tensors = [p.data for p in model.parameters()] + list(model.buffers())
+    for tensor in tensors:
+        dist.broadcast(tensor, src=src)
+
+
+def broadcast_object(obj: object, src: int = 0) -> object:
+    r"""Send a picklable object (e.g., the result directory) from rank `src` to the
+    other ranks.
+
+    Args:
+        obj: the object. Only the one on rank `src` matters.
+        src: the rank to send from
+
+    Returns:
+        the object of rank `src`
+
+    """
+    objects = [obj]
+    dist.broadcast_object_list(objects, src=src)
+    return objects[0]
+
+
+def broadcast_buffers(model: torch.nn.Module, src: int = 0) -> None:
+    r"""Copy the buffers (e.g., the running statistics of the batch norms) of `model`
+    on rank `src` to the other ranks. The parameters are kept identical by the
+    averaged gradients, but the buffers are updated from the local batches only.
+
+    Args:
+        model: the model
+        src: the rank to copy from
+
+    """
+    for buffer in model.buffers():
+        dist.broadcast(buffer, src=src)
+
+
+def all_reduce_gradients(model: torch.nn.Module) -> None:
+    r"""Average the gradients of `model` across all the ranks.
+
+    The gradients are flattened into one tensor, so that this costs one all-reduce
+    per update. Parameters without a gradient take part with zeros, so that every
+    rank sends a tensor of the same size.
+
+    Args:
+        model: the model whose `.grad`s are averaged in place.
+
+    """
+    world_size = dist.get_world_size()
+    params = [p for p in model.parameters() if p.requires_grad]
+    grads = [
+        p.grad.data if p.grad is not None else torch.zeros_like(p.data) for p in params
+    ]
+    flat = _flatten_dense_tensors(grads)
+    dist.all_reduce(flat, op=dist.ReduceOp.SUM)
+    flat /= world_size
+
+    for param, grad in zip(params, _unflatten_dense_tensors(flat, grads)):
+        if param.grad is None:
+            param.grad = grad
+        else:
+            param.grad.data.copy_(grad)
+
+
+def all_reduce_mean(values: list[float]) -> list[float]:
+    r"""Average a few scalars (e.g., the losses) across all the ranks.
+
+    Args:
+        values: the local values
+
+    Returns:
+        the averaged values
+
+    """
+    tensor = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return (tensor / dist.get_world_size()).tolist()
+
+
+def shard_batch_size(batch_size: int, world_size: int) -> int:
+    r"""The batch size that every rank samples, so that the global batch size stays
+    `batch_size`.
+
+    Args:
+        batch_size: the global batch size
+        world_size: the number of ranks
+
+    Returns:
+        the per-rank batch size
+
+    """
+    if batch_size % world_size != 0:
+        raise ValueError(
+            f"batch_size ({batch_size}) should be divisible by the number of ranks "
+            f"({world_size})."
+        )
+    return batch_size // world_size
+
+
+def launch(
+    fn: Callable,
+    world_size: int,
+    args: tuple = (),
+    master_addr: str = "127.0.0.1",
+    master_port: int = 29500,
+    start_method: str = "spawn",
+) -> None:
+    r"""Spawn `world_size` local processes and run `fn(rank, world_size, *args)` in
+    each of them, inside an initialized `gloo` process group.
+
+    Args:
+        fn: a picklable (i.e., module-level) function
+        world_size: number of processes
+        args: extra arguments to `fn`
+        master_addr: address of the rank 0 process
+        master_port: free port
+        start_method: "spawn", "fork", or "forkserver"
+
+    """
+    mp.start_processes(
+        _run,
+        args=(fn, world_size, args, master_addr, master_port),
+        nprocs=world_size,
+        join=True,
+        start_method=start_method,
+    )
+
+
+def _run(
+    rank: int,
+    fn: Callable,
+    world_size: int,
+    args: tuple,
+    master_addr: str,
+    master_port: int,
+) -> None:
+    os.environ["MASTER_ADDR"] = master_addr
+    os.environ["MASTER_PORT"] = str(master_port)
+    init_process_group(rank=rank, world_size=world_size)
+    try:
+        fn(rank, world_size, *args)
+    finally:
+        dist.destroy_process_group()
+
+
+def _train(rank: int, world_size: int, agent_kwargs: dict) -> None:
+    from .dqn import DQNAgent
+
+    agent = DQNAgent(**{**agent_kwargs, "distributed": True})
+    agent.train()
+
+
+def train_distributed(
+    agent_kwargs: dict,
+    world_size: int,
+    master_addr: str = "127.0.0.1",
+    master_port: int = 29500,
+) -> None:
+    r"""Train a `DQNAgent` with `world_size` local data-parallel ranks.
+
+    Args:
+        agent_kwargs: the keyword arguments of `DQNAgent`. `batch_size` is the
+            global batch size.
+        world_size: number of processes
+        master_addr: address of the rank 0 process
+        master_port: free port
+
+    """
+    launch(_train, world_size, (agent_kwargs,), master_addr, master_port)
+
+
+def _time_updates(
+    rank: int,
+    world_size: int,
+    agent_kwargs: dict,
+    num_updates: int,
+    queue: mp.Queue,
+) -> None:
+    from .dqn import DQNAgent
+    from .utils import update_model
+
+    agent = DQNAgent(**{**agent_kwargs, "distributed": True})
+    agent.fill_replay_buffer()
+    agent.dqn.train()
+
+    dist.barrier()
+    start = time.perf_counter()
+    for _ in range(num_updates):
+        update_model(
+            replay_buffer=agent.replay_buffer,
+            optimizer=agent.optimizer,
+            device=agent.device,
+            dqn=agent.dqn,
+            dqn_target=agent.dqn_target,
+            ddqn=agent.ddqn,
+            gamma=agent.gamma,
+            distributed=True,
+        )
+    dist.barrier()
+    elapsed = time.perf_counter() - start
+
+    if rank == 0:
+        queue.put(elapsed / num_updates)
+    agent.remove_results_from_disk()
+
+
+def measure_scaling_efficiency(
+    agent_kwargs: dict,
+    world_sizes: list[int] = [1, 2, 4, 8],
+    num_updates: int = 20,
+    master_addr: str = "127.0.0.1",
+    master_port: int = 29500,
+) -> dict[int, dict[str, float]]:
+    r"""Time `update_model` with a fixed global batch size, for every number of ranks
+    in `world_sizes`, and return the strong-scaling efficiency.
+
+    Args:
+        agent_kwargs: the keyword arguments of `DQNAgent`. `batch_size` is the
+            global batch size and has to be divisible by every world size.
+        world_sizes: the numbers of ranks to try
+        num_updates: the number of updates to time
+        master_addr: address of the rank 0 process
+        master_port: free port
+
+    Returns:
+        {world_size: {"seconds_per_update", "speedup", "efficiency"}}
+
+    """
+    ctx = mp.get_context("spawn")
+    results = {}
+    for world_size in world_sizes:
+        queue = ctx.Queue()
+        launch(
+            _time_updates,
+            world_size,
+            (agent_kwargs, num_updates, queue),
+            master_addr,
+            master_port,
+        )
+        results[world_size] = {"seconds_per_update": queue.get()}
+
+    baseline = results[world_sizes[0]]["seconds_per_update"] * world_sizes[0]
+    for world_size, result in results.items():
+        result["speedup"] = baseline / result["seconds_per_update"]
+        result["efficiency"] = result["speedup"] / world_size
+
+    return results
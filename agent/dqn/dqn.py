@@ -1,25 +1,67 @@
 """Agent that uses a GNN for its DQN, for the RoomEnv2 environment."""
 
 import datetime
+import hashlib
+import json
 import os
 import shutil
+import weakref
+from collections import deque
 from copy import deepcopy
 from typing import Literal
 
-import gymnasium as gym
 import numpy as np
 import torch
 import torch.optim as optim
 from humemai.memory import LongMemory, MemorySystems, ShortMemory
 from humemai.utils import is_running_notebook, write_yaml
 
-from ..policy import (answer_question, encode_all_observations, explore,
-                      manage_memory)
+from ..env_pool import get_env, put_env
+from ..eviction import EvictionIndex
+from ..policy import (
+    MM_ACTIONS,
+    HandcraftedMMPolicy,
+    answer_questions,
+    explore,
+    ingest_observations,
+    manage_all_memories,
+)
+from ..pretrain import pretrain_semantic
+from ..topology import RoomTopology
+from ..utils import get_rng_states, is_checked, seed_everything, set_rng_states
+from .checkpoints import CheckpointManager, read_index
+from .distributed import (
+    broadcast_buffers,
+    broadcast_object,
+    broadcast_parameters,
+    get_rank,
+    get_world_size,
+    shard_batch_size,
+)
+from .evaluation import (
+    gather_episodes,
+    make_executor,
+    snapshot_state_dict,
+    submit_episodes,
+)
+from .metrics import MetricSeries
 from .nn import GNN
-from .utils import (ReplayBuffer, plot_results, save_final_results,
-                    save_states_q_values_actions, save_validation,
-                    select_action, target_hard_update, update_epsilon,
-                    update_model)
+from .plotting import BackgroundPlotter
+from .shared_replay import SharedReplayBuffer
+from .timing import PhaseTimer
+from .utils import (
+    ReplayBuffer,
+    console,
+    gnn_vocab,
+    plot_results,
+    save_final_results,
+    save_states_q_values_actions,
+    save_validation,
+    select_action,
+    target_hard_update,
+    update_epsilon,
+    update_model,
+)
 
 
 class DQNAgent:
@@ -90,6 +132,18 @@ class DQNAgent:
             "random", "episodic", "semantic", "forget", "RL", "handcrafted"
         ] = "RL",
         scale_reward: bool = False,
+        shared_replay_buffer: bool = False,
+        distributed: bool = False,
+        async_validation: bool = False,
+        num_evaluation_workers: int = 1,
+        checkpoint_interval: int | None = None,
+        num_val_checkpoints: int = 1,
+        replay_cache_dir: str | None = None,
+        metrics_history_size: int = 10000,
+        metrics_flush_interval: int = 1000,
+        background_plotting: bool = True,
+        timing: bool = True,
+        profile_iterations: list[int] | None = None,
     ) -> None:
         r"""Initialization.
 
@@ -133,16 +187,70 @@ class DQNAgent:
             mm_policy: memory management policy. Choose one of "random", "episodic",
                 "semantic", "forget", "RL", or "handcrafted".
             scale_reward: whether to scale the reward
+            shared_replay_buffer: whether to keep the replay buffer in shared memory
+                (`SharedReplayBuffer`), so that other processes can write into it.
+            distributed: whether this is one rank of a data-parallel learner. The
+                `torch.distributed` process group has to be initialized already
+                (see `agent.dqn.distributed`). Every rank plays its own episodes
+                (seeded with train_seed + rank), samples batch_size / world_size
+                transitions, and averages the gradients with the others. Only rank 0
+                creates the result directory and validates, plots and tests. The
+                other ranks only write their checkpoints and profiles into it.
+            async_validation: whether to validate in background processes on a
+                snapshot of the weights, instead of pausing the training. The results
+                are saved when they arrive. They are all waited for before testing.
+            num_evaluation_workers: number of processes that play the val / test
+                episodes in parallel. Every worker has its own env and memory
+                systems. With 1 (and without `async_validation`), the episodes are
+                played in this process. Every episode is seeded on its own, so the
+                results are the same for any number of workers.
+            checkpoint_interval: every how many training episodes to save the full
+                training state into `default_root_dir/checkpoint`, so that an
+                interrupted training can be continued with `resume`. None is never.
+            num_val_checkpoints: the number of the best validation models to keep.
+                They are written in the background and listed, best first, in
+                `default_root_dir/checkpoints.json` (see `CheckpointManager`). The
+                best one is tested.
+            replay_cache_dir: a directory to cache the warm-start replay buffers in.
+                A run whose warm start is the same as a cached one (same env config,
+                capacity, seed, policies, etc.) loads it instead of filling it again.
+            metrics_history_size: the maximum number of values of every training
+                metric (losses, epsilons, q-values) to keep in memory. Older values
+                are decimated evenly. All of them are appended to the files in
+                `default_root_dir/metrics` (see `MetricSeries`).
+            metrics_flush_interval: every how many steps the metrics are read (e.g.,
+                from the device) and appended to the files.
+            background_plotting: whether to draw `plot.pdf` in a separate process
+                during training (see `BackgroundPlotter`), so that the training
+                doesn't wait for matplotlib. It's not used in a notebook, where the
+                plots are shown inline.
+            timing: whether to time the phases of the steps and the updates (see
+                `PhaseTimer`). Their summary, with the env steps and the updates per
+                second and the sizes of the graphs, is printed with the training
+                results and saved in `results.yaml`.
+            profile_iterations: [start, end] of the training iterations to run under
+                `torch.profiler`, e.g., [500, 520]. The chrome trace and the table of
+                the key averages are written to `default_root_dir/profile_trace.json`
+                and `default_root_dir/profile_key_averages.txt`. None is not to
+                profile.
 
         """
         params_to_save = deepcopy(locals())
         del params_to_save["self"]
+        self.init_params = deepcopy(params_to_save)
+        self.distributed = distributed
+        self.rank = get_rank() if self.distributed else 0
+        self.world_size = get_world_size() if self.distributed else 1
+
         self.default_root_dir = os.path.join(
             default_root_dir, str(datetime.datetime.now())
         )
-        self._create_directory(params_to_save)
+        if self.rank == 0:
+            self._create_directory(params_to_save)
+        if self.distributed:
+            self.default_root_dir = broadcast_object(self.default_root_dir)
 
-        self.train_seed = train_seed
+        self.train_seed = train_seed + self.rank
         self.test_seed = test_seed
         env_config["seed"] = self.train_seed
 
@@ -155,20 +263,20 @@ class DQNAgent:
         self.capacity = capacity
         self.pretrain_semantic = pretrain_semantic
         self.semantic_decay_factor = semantic_decay_factor
-        self.env = gym.make(self.env_str, **self.env_config)
+        self.check_out_env()
 
         self.device = torch.device(device)
         print(f"Running on {self.device}")
 
         self.intrinsic_explore_reward = intrinsic_explore_reward
         self.ddqn = ddqn
-        self.val_file_names = []
+        self.checkpoints = CheckpointManager(self.default_root_dir, num_val_checkpoints)
         self.is_notebook = is_running_notebook()
         self.num_iterations = num_iterations
         self.plotting_interval = plotting_interval
 
         self.replay_buffer_size = replay_buffer_size
-        self.batch_size = batch_size
+        self.batch_size = shard_batch_size(batch_size, self.world_size)
         self.epsilon = max_epsilon
         self.max_epsilon = max_epsilon
         self.min_epsilon = min_epsilon
@@ -182,8 +290,23 @@ class DQNAgent:
         self.explore_policy = explore_policy
         self.mm_policy = mm_policy
         self.scale_reward = scale_reward
-
-        self.action_mm2str = {0: "episodic", 1: "semantic", 2: "forget"}
+        self.shared_replay_buffer = shared_replay_buffer
+        self.async_validation = async_validation
+        self.num_evaluation_workers = num_evaluation_workers
+        self.evaluation_executor = None
+        self.pending_validations = deque()
+        self.checkpoint_interval = checkpoint_interval
+        self.replay_cache_dir = replay_cache_dir
+        self.metrics_history_size = metrics_history_size
+        self.metrics_flush_interval = metrics_flush_interval
+        self.background_plotting = background_plotting
+        self.plotter = None
+        self.timer = PhaseTimer(enabled=timing)
+        self.profile_iterations = profile_iterations
+        self.profiler = None
+        self.profiled = False
+
+        self.action_mm2str = dict(enumerate(MM_ACTIONS))
         self.action_mm2int = {v: k for k, v in self.action_mm2str.items()}
         self.action_explore2str = {
             0: "north",
@@ -198,22 +321,16 @@ class DQNAgent:
 
         self.dqn_params = dqn_params
         self.dqn_params["device"] = self.device
-        self.dqn_params["entities"] = [
-            e for entities in self.env.unwrapped.entities.values() for e in entities
-        ]
-        # We are gonna treat the real numbers 0, 1, ..., 100 as entities. This is
-        # very stupid, but it is what it is.
-        self.dqn_params["entities"] += [
-            str(i) for i in range(self.env.unwrapped.terminates_at + 2)
-        ]
-        # Main triple relations have "inv", while qualifier relations don't have "inv".
-        self.dqn_params["relations"] = (
-            self.env.unwrapped.relations
-            + [rel + "_inv" for rel in self.env.unwrapped.relations]
-            + self.memory_systems.qualifier_relations
+        self.dqn_params["entities"], self.dqn_params["relations"] = gnn_vocab(
+            self.env, self.memory_systems.qualifier_relations
         )
+        self.handcrafted_mm_policy = HandcraftedMMPolicy(self.dqn_params["entities"])
         self.dqn = GNN(**self.dqn_params)
         self.dqn_target = GNN(**self.dqn_params)
+        self.dqn.timer = self.timer
+        self.dqn_target.timer = self.timer
+        if self.distributed:
+            broadcast_parameters(self.dqn)
         self.dqn_target.load_state_dict(self.dqn.state_dict())
         self.dqn_target.eval()
 
@@ -221,9 +338,11 @@ class DQNAgent:
         self.optimizer = optim.Adam(list(self.dqn.parameters()), lr=self.learning_rate)
 
         self.q_values = {
-            "train": {"mm": [], "explore": []},
-            "val": {"mm": [], "explore": []},
-            "test": {"mm": [], "explore": []},
+            split: {
+                policy: self.make_metric(f"q_values_{split}_{policy}")
+                for policy in ["mm", "explore"]
+            }
+            for split in ["train", "val", "test"]
         }
         self._save_number_of_parameters()
 
@@ -239,6 +358,8 @@ class DQNAgent:
 
     def _save_number_of_parameters(self) -> None:
         r"""Save the number of parameters in the model."""
+        if self.rank != 0:
+            return
         write_yaml(
             {
                 "total": sum(p.numel() for p in self.dqn.parameters()),
@@ -253,9 +374,52 @@ class DQNAgent:
             os.path.join(self.default_root_dir, "num_params.yaml"),
         )
 
+    def make_metric(self, fname: str) -> MetricSeries:
+        r"""Make a metric series that is written to `default_root_dir/metrics`, on
+        rank 0 only.
+
+        Args:
+            fname: the file name. Use ".f64" for scalars.
+
+        """
+        return MetricSeries(
+            (
+                os.path.join(self.default_root_dir, "metrics", fname)
+                if self.rank == 0
+                else None
+            ),
+            history_size=self.metrics_history_size,
+            flush_interval=self.metrics_flush_interval,
+        )
+
+    def metric_series(self) -> list[MetricSeries]:
+        r"""All the metric series, i.e., the q-values, and the losses and epsilons
+        once the training has started."""
+        series = [series for val in self.q_values.values() for series in val.values()]
+        if hasattr(self, "training_loss"):
+            series += [self.epsilons, *self.training_loss.values()]
+        return series
+
+    def flush_metrics(self) -> None:
+        r"""Append the pending metric values to their files."""
+        for series in self.metric_series():
+            series.flush()
+
     def remove_results_from_disk(self) -> None:
-        r"""Remove the results from the disk."""
-        shutil.rmtree(self.default_root_dir)
+        r"""Remove the results from the disk. Only rank 0 has them."""
+        if self.rank == 0:
+            shutil.rmtree(self.default_root_dir)
+
+    def check_out_env(self) -> None:
+        r"""Check the env of `env_config` out of the `env_pool`. It's put back by
+        `release_env`, or when the agent is garbage collected."""
+        self.env = get_env(self.env_str, self.env_config)
+        self._env_finalizer = weakref.finalize(self, put_env, self.env)
+
+    def release_env(self) -> None:
+        r"""Put the env back into the `env_pool`. The agent can't play after this."""
+        self._env_finalizer()
+        self.env = None
 
     def init_memory_systems(self) -> None:
         r"""Initialize the agent's memory systems. This has nothing to do with the
@@ -276,9 +440,8 @@ class DQNAgent:
                 exclude_walls = True
             else:
                 exclude_walls = False
-            room_layout = self.env.unwrapped.return_room_layout(exclude_walls)
-
-            self.memory_systems.long.pretrain_semantic(semantic_knowledge=room_layout)
+            # Made once per room layout, and copied on every reset.
+            pretrain_semantic(self.memory_systems.long, self.env, exclude_walls)
 
             if self.pretrain_semantic == "include_walls":
                 assert self.memory_systems.long.size > 0
@@ -287,6 +450,8 @@ class DQNAgent:
             else:
                 assert self.memory_systems.long.size > 0
 
+        self.eviction_index = EvictionIndex(self.memory_systems.long)
+        self.topology = RoomTopology(self.eviction_index)
         self.num_semantic_decayed = 0
 
     def reset(self) -> None:
@@ -295,7 +460,9 @@ class DQNAgent:
         self.init_memory_systems()
         self.observations, info = self.env.reset()
         # 0. encode observations
-        encode_all_observations(self.memory_systems, self.observations["room"])
+        ingest_observations(
+            self.memory_systems, self.observations["room"], topology=self.topology
+        )
 
     def step(self, greedy: bool) -> tuple[
         dict,
@@ -319,90 +486,92 @@ class DQNAgent:
             done
 
         """
-        assert not self.memory_systems.short.is_empty, "encode all observations first"
+        if is_checked():
+            assert (
+                not self.memory_systems.short.is_empty
+            ), "encode all observations first"
         # 1. explore
-        if self.explore_policy.lower() == "rl":
-            a_explore, q_explore = select_action(
-                state=self.memory_systems.get_working_memory().to_list(),
-                greedy=greedy,
-                dqn=self.dqn,
-                epsilon=self.epsilon,
-                policy_type="explore",
-            )
-            if self.intrinsic_explore_reward > 0:
-                intrinsic_explore_reward = self.get_intrinsic_explore_reward(
-                    self.action_explore2str[a_explore.item()]
+        with self.timer.phase("step.explore"):
+            if self.explore_policy.lower() == "rl":
+                a_explore, q_explore = select_action(
+                    state=self.memory_systems.get_working_memory().to_list(),
+                    greedy=greedy,
+                    dqn=self.dqn,
+                    epsilon=self.epsilon,
+                    policy_type="explore",
                 )
+                if self.intrinsic_explore_reward > 0:
+                    intrinsic_explore_reward = self.get_intrinsic_explore_reward(
+                        self.action_explore2str[a_explore.item()]
+                    )
+                else:
+                    intrinsic_explore_reward = 0
+
             else:
+                a_explore = explore(
+                    self.memory_systems, self.explore_policy, topology=self.topology
+                )
+                a_explore = np.array(self.action_explore2int[a_explore])
+                # Create dummy Q-values
+                q_explore = np.zeros((1, len(self.action_explore2str)))
                 intrinsic_explore_reward = 0
 
-        else:
-            a_explore = explore(self.memory_systems, self.explore_policy)
-            a_explore = np.array(self.action_explore2int[a_explore])
-            # Create dummy Q-values
-            q_explore = np.zeros((1, len(self.action_explore2str)))
-            intrinsic_explore_reward = 0
-
         # 2. question answering
-        answers = [
-            answer_question(
-                self.memory_systems,
-                self.qa_function,
-                question,
+        with self.timer.phase("step.answer_question"):
+            answers = answer_questions(
+                self.memory_systems, self.qa_function, self.observations["questions"]
             )
-            for question in self.observations["questions"]
-        ]
 
         # 3. manage memory
-        if self.mm_policy.lower() == "rl":
-            a_mm, q_mm = select_action(
-                state=self.memory_systems.get_working_memory().to_list(),
-                greedy=greedy,
-                dqn=self.dqn,
-                epsilon=self.epsilon,
-                policy_type="mm",
-            )
-        else:
-            a_mm = []
-            if self.mm_policy == "handcrafted":
-                for mem_short in self.memory_systems.short:
-                    if mem_short[0] == "agent":
-                        a_mm.append(0)
-                    elif "ind" in mem_short[0] or "dep" in mem_short[0]:
-                        a_mm.append(0)
-                    elif "sta" in mem_short[0]:
-                        a_mm.append(1)
-                    elif "room" in mem_short[0] and "room" in mem_short[2]:
-                        a_mm.append(1)
-                    elif "wall" in mem_short[2]:
-                        a_mm.append(2)
-                    else:
-                        raise ValueError("something is wrong")
+        with self.timer.phase("step.select_mm_action"):
+            if self.mm_policy.lower() == "rl":
+                a_mm, q_mm = select_action(
+                    state=self.memory_systems.get_working_memory().to_list(),
+                    greedy=greedy,
+                    dqn=self.dqn,
+                    epsilon=self.epsilon,
+                    policy_type="mm",
+                )
             else:
-                raise NotImplementedError(f"{self.mm_policy} is not implemented.")
+                if self.mm_policy == "handcrafted":
+                    a_mm = self.handcrafted_mm_policy.actions(self.memory_systems.short)
+                else:
+                    raise NotImplementedError(f"{self.mm_policy} is not implemented.")
 
-            a_mm = np.array(a_mm)
-            # Create dummy Q-values
-            q_mm = np.zeros((len(self.memory_systems.short), len(self.action_mm2str)))
+                # Create dummy Q-values
+                q_mm = np.zeros(
+                    (len(self.memory_systems.short), len(self.action_mm2str))
+                )
 
-        assert len(a_mm) == self.memory_systems.short.size
+        if is_checked():
+            assert len(a_mm) == self.memory_systems.short.size
 
-        for a_mm_, mem_short in zip(a_mm, self.memory_systems.short):
-            manage_memory(self.memory_systems, self.action_mm2str[a_mm_], mem_short)
+        with self.timer.phase("step.manage_memory"):
+            manage_all_memories(
+                self.memory_systems,
+                [self.action_mm2str[a_mm_] for a_mm_ in a_mm],
+                eviction_index=self.eviction_index,
+                topology=self.topology,
+            )
 
-        (
-            self.observations,
-            reward,
-            done,
-            truncated,
-            info,
-        ) = self.env.step((answers, self.action_explore2str[a_explore.item()]))
-        self.memory_systems.long.decay()
+        with self.timer.phase("step.env_step"):
+            (
+                self.observations,
+                reward,
+                done,
+                truncated,
+                info,
+            ) = self.env.step((answers, self.action_explore2str[a_explore.item()]))
+        self.timer.count("env_steps")
+        self.eviction_index.decay()
         self.num_semantic_decayed += 1
         done = done or truncated
 
         # 4. encode observations
-        encode_all_observations(self.memory_systems, self.observations["room"])
+        with self.timer.phase("step.encode_all_observations"):
+            ingest_observations(
+                self.memory_systems, self.observations["room"], topology=self.topology
+            )
 
         return (
             a_explore,
@@ -426,30 +595,76 @@ class DQNAgent:
 
         """
         assert isinstance(a_explore, str)
-        assert not self.memory_systems.short.is_empty
-        intrinsic_explore_actions = []
-        for mem in self.memory_systems.get_working_memory():
-            if (
-                "room" in mem[0]
-                and mem[1] in ["north", "east", "south", "west"]
-                and "wall" not in mem[2]
-                and "current_time" in mem[3]
-            ):
-                intrinsic_explore_actions.append(mem[1])
-
-        assert len(intrinsic_explore_actions) > 0, "No intrinsic actions found."
+        if is_checked():
+            assert not self.memory_systems.short.is_empty
+        # The short-term memory's edges to other rooms, from the map of the rooms.
+        intrinsic_explore_actions = self.topology.open_directions()
+
+        if is_checked():
+            assert len(intrinsic_explore_actions) > 0, "No intrinsic actions found."
 
         if a_explore in intrinsic_explore_actions:
             return self.intrinsic_explore_reward
         else:
             return 0
 
+    def make_replay_buffer(self) -> None:
+        r"""Make an empty replay buffer."""
+        if self.shared_replay_buffer:
+            self.replay_buffer = SharedReplayBuffer(
+                self.replay_buffer_size,
+                self.batch_size,
+                max_memories=self.capacity["short"] + self.capacity["long"],
+                max_short=self.capacity["short"],
+                entities=self.dqn_params["entities"],
+                relations=self.dqn_params["relations"],
+            )
+        else:
+            self.replay_buffer = ReplayBuffer(self.replay_buffer_size, self.batch_size)
+
+    def replay_cache_key(self) -> str:
+        r"""The content address of the warm-start replay buffer, i.e., the hash of
+        everything that the filling depends on."""
+        settings = {
+            "env_str": self.env_str,
+            "env_config": self.env_config,
+            "capacity": self.capacity,
+            "seed": self.train_seed,
+            "pretrain_semantic": self.pretrain_semantic,
+            "semantic_decay_factor": self.semantic_decay_factor,
+            "replay_buffer_size": self.replay_buffer_size,
+            "warm_start": self.warm_start,
+            "max_epsilon": self.max_epsilon,
+            "explore_policy": self.explore_policy,
+            "mm_policy": self.mm_policy,
+            "qa_function": self.qa_function,
+            "scale_reward": self.scale_reward,
+            "intrinsic_explore_reward": self.intrinsic_explore_reward,
+            "shared_replay_buffer": self.shared_replay_buffer,
+            "format_version": ReplayBuffer.format_version,
+        }
+        return hashlib.sha256(
+            json.dumps(settings, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
     def fill_replay_buffer(self) -> None:
         r"""Make the replay buffer full in the beginning with the uniformly-sampled
         actions. The filling continues until it reaches the warm start size.
 
+        With `replay_cache_dir`, the filled buffer is loaded from the cache if it's
+        there, and saved into it otherwise. The random states after the filling are
+        cached with it, so that the training goes on as if it was filled here.
+
         """
-        self.replay_buffer = ReplayBuffer(self.replay_buffer_size, self.batch_size)
+        self.make_replay_buffer()
+
+        if self.replay_cache_dir is not None:
+            path = os.path.join(self.replay_cache_dir, self.replay_cache_key())
+            if os.path.isfile(path + ".npz"):
+                self.load_replay_buffer(path + ".npz")
+                set_rng_states(torch.load(path + ".pt"))
+                return
+
         done = True
 
         while len(self.replay_buffer) < self.warm_start:
@@ -488,25 +703,73 @@ class DQNAgent:
                     ]
                 )
 
+        if self.replay_cache_dir is not None:
+            os.makedirs(self.replay_cache_dir, exist_ok=True)
+            # The .npz is written last and renamed into place, so that its presence
+            # means that the entry is complete.
+            torch.save(get_rng_states(), path + ".pt")
+            self.save_replay_buffer(path + ".npz.tmp")
+            os.replace(path + ".npz.tmp", path + ".npz")
+
+    def save_replay_buffer(self, path: str) -> None:
+        r"""Save the replay buffer into an uncompressed `.npz` file.
+
+        Args:
+            path: the file to write
+
+        """
+        if self.shared_replay_buffer:
+            self.replay_buffer.save(path)
+        else:
+            self.replay_buffer.save(
+                path, self.dqn_params["entities"], self.dqn_params["relations"]
+            )
+
+    def load_replay_buffer(self, path: str) -> None:
+        r"""Load the replay buffer saved by `save_replay_buffer`, in place.
+
+        Args:
+            path: the file to read
+
+        """
+        if self.shared_replay_buffer:
+            self.replay_buffer.load(path)
+        else:
+            self.replay_buffer.load(
+                path, self.dqn_params["entities"], self.dqn_params["relations"]
+            )
+
     def train(self) -> None:
         r"""Train the agent."""
         self.fill_replay_buffer()  # fill up the buffer till warm start size
 
-        self.epsilons = []
-        self.training_loss = {"total": [], "mm": [], "explore": []}
+        self.epsilons = self.make_metric("epsilons.f64")
+        self.training_loss = {
+            key: self.make_metric(f"training_loss_{key}.f64")
+            for key in ["total", "mm", "explore"]
+        }
         self.scores = {"train": [], "val": [], "test": None}
+        self.iteration_idx = 0
+
+        self._train_loop()
 
+    def _train_loop(self) -> None:
+        r"""Train the agent from the beginning of an episode, until `num_iterations`,
+        and then test it."""
+        if self.background_plotting and not self.is_notebook and self.rank == 0:
+            self.plotter = BackgroundPlotter(self.default_root_dir)
         self.dqn.train()
+        self.timer.reset()
 
         done = True
         score = 0
-        self.iteration_idx = 0
 
         while True:
             if done:
                 self.reset()
                 done = False
             else:
+                self.update_profiler()
                 state = deepcopy(self.memory_systems.get_working_memory().to_list())
                 (
                     a_explore,
@@ -547,6 +810,7 @@ class DQNAgent:
                 assert self.num_semantic_decayed == self.env_config["terminates_at"] + 1
                 self.scores["train"].append(score)
                 score = 0
+                self.collect_validations()
 
                 if (
                     self.iteration_idx
@@ -555,10 +819,17 @@ class DQNAgent:
                         * (self.env_config["terminates_at"] + 1)
                     )
                     == 0
+                    and self.rank == 0
                 ):
                     with torch.no_grad():
                         self.validate()
 
+                if (
+                    self.checkpoint_interval is not None
+                    and len(self.scores["train"]) % self.checkpoint_interval == 0
+                ):
+                    self.save_checkpoint()
+
             else:
                 loss_mm, loss_explore, loss = update_model(
                     replay_buffer=self.replay_buffer,
@@ -568,6 +839,9 @@ class DQNAgent:
                     dqn_target=self.dqn_target,
                     ddqn=self.ddqn,
                     gamma=self.gamma,
+                    distributed=self.distributed,
+                    sync_losses=False,
+                    timer=self.timer,
                 )
 
                 self.training_loss["total"].append(loss)
@@ -585,102 +859,372 @@ class DQNAgent:
 
                 # if hard update is needed
                 if self.iteration_idx % self.target_update_interval == 0:
+                    if self.distributed:
+                        broadcast_buffers(self.dqn)
                     target_hard_update(dqn=self.dqn, dqn_target=self.dqn_target)
 
                 # plotting & show training results
                 if (
                     self.iteration_idx == self.num_iterations
                     or self.iteration_idx % self.plotting_interval == 0
-                ):
+                ) and self.rank == 0:
                     self.plot_results("all", save_fig=True)
 
                 if self.iteration_idx >= self.num_iterations:
                     break
 
-        with torch.no_grad():
-            self.test()
+        self.stop_profiler()
+        self.collect_validations(wait=True)
+
+        if self.rank == 0:
+            with torch.no_grad():
+                self.test()
+
+        if self.plotter is not None:
+            self.plotter.close()
+            self.plotter = None
+
+        if self.shared_replay_buffer:
+            self.replay_buffer.close()
+            self.replay_buffer.unlink()
+
+    def update_profiler(self) -> None:
+        r"""Start or stop the profiler, before the iteration `iteration_idx`, if it's
+        the start or the end of `profile_iterations`."""
+        if self.profile_iterations is None or self.profiled:
+            return
+
+        start, end = self.profile_iterations
+        if self.profiler is None and start <= self.iteration_idx < end:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if self.device.type == "cuda":
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self.profiler = torch.profiler.profile(
+                activities=activities, record_shapes=True, with_stack=True
+            )
+            self.profiler.start()
+        elif self.iteration_idx >= end:
+            self.stop_profiler()
+
+    def stop_profiler(self) -> None:
+        r"""Stop the profiler, if it's running, and export what it recorded. The
+        window is closed afterwards, so that it's profiled only once."""
+        if self.profiler is None:
+            return
+
+        self.profiler.stop()
+        suffix = f"_rank={self.rank}" if self.distributed else ""
+        os.makedirs(self.default_root_dir, exist_ok=True)
+        self.profiler.export_chrome_trace(
+            os.path.join(self.default_root_dir, f"profile_trace{suffix}.json")
+        )
+        sort_by = (
+            "self_cuda_time_total"
+            if self.device.type == "cuda"
+            else "self_cpu_time_total"
+        )
+        with open(
+            os.path.join(self.default_root_dir, f"profile_key_averages{suffix}.txt"),
+            "w",
+        ) as stream:
+            stream.write(
+                self.profiler.key_averages().table(sort_by=sort_by, row_limit=100)
+            )
+        self.profiler = None
+        self.profiled = True
+
+    def episode_seeds(self, val_or_test: str) -> list[int]:
+        r"""The seeds of the val / test episodes. They are the same at every
+        validation, so that the validation scores are comparable.
+
+        Args:
+            val_or_test: "val" or "test"
+
+        Returns:
+            one seed per episode
+
+        """
+        seed = self.test_seed if val_or_test == "test" else self.train_seed
+        return [seed + idx for idx in range(self.num_samples_for_results[val_or_test])]
+
+    def run_episode(self, seed: int, record: bool) -> tuple[float, list, list, list]:
+        r"""Play one greedy episode from the beginning, after seeding everything with
+        `seed`.
+
+        Args:
+            seed: seed of the episode
+            record: whether to record the memory states, q values and actions
+
+        Returns:
+            score: total episode rewards
+            states: memory states
+            q_values: q values
+            actions: greedy actions taken
+
+        """
+        seed_everything(seed)
+        states = []
+        q_values = []
+        actions = []
+
+        done = True
+        score = 0
+        while True:
+            if done:
+                self.reset()
+                done = False
+
+            else:
+                state = deepcopy(self.memory_systems.get_working_memory().to_list())
+                (
+                    a_explore,
+                    q_explore,
+                    a_mm,
+                    q_mm,
+                    reward,
+                    intrinsic_explore_reward,
+                    answers,
+                    done,
+                ) = self.step(greedy=True)
+                score += reward
+
+                if record:
+                    states.append(state)
+                    q_values.append({"explore": q_explore, "mm": q_mm})
+                    actions.append({"explore": a_explore, "mm": a_mm})
+
+            if done:
+                assert self.num_semantic_decayed == self.env_config["terminates_at"] + 1
+                break
+
+        return score, states, q_values, actions
+
+    def get_evaluation_executor(self):
+        r"""The process pool that plays the val / test episodes. It's None if they
+        are played in this process."""
+        if self.evaluation_executor is None and (
+            self.async_validation or self.num_evaluation_workers > 1
+        ):
+            self.evaluation_executor = make_executor(
+                self.init_params, max(1, self.num_evaluation_workers)
+            )
+        return self.evaluation_executor
+
+    def close_evaluation_executor(self) -> None:
+        r"""Shut down the evaluation workers, if any."""
+        if self.evaluation_executor is not None:
+            self.evaluation_executor.shutdown()
+            self.evaluation_executor = None
+
+    @property
+    def checkpoint_name(self) -> str:
+        r"""The name of the checkpoint directory of this rank."""
+        return f"checkpoint_rank={self.rank}" if self.rank != 0 else "checkpoint"
+
+    def save_checkpoint(self) -> None:
+        r"""Save the full training state into `default_root_dir/checkpoint`, or
+        `checkpoint_rank=<rank>` on the other ranks of a data-parallel learner.
+
+        This is called at the end of an episode, where the env and the memory systems
+        are reset next anyway. The checkpoint is first written to a temporary
+        directory and then renamed, so that a crash never leaves a half-written one.
+
+        """
+        self.collect_validations(wait=True)
+
+        path = os.path.join(self.default_root_dir, self.checkpoint_name)
+        shutil.rmtree(path + ".tmp", ignore_errors=True)
+        os.makedirs(path + ".tmp")
+
+        torch.save(
+            {
+                "dqn": self.dqn.state_dict(),
+                "dqn_target": self.dqn_target.state_dict(),
+                "optimizer": self.optimizer.state_dict(),
+                "epsilon": self.epsilon,
+                "iteration_idx": self.iteration_idx,
+                "epsilons": self.epsilons,
+                "training_loss": self.training_loss,
+                "scores": self.scores,
+                "q_values": self.q_values,
+                # The best validation models are kept too, since a validation after
+                # this checkpoint may remove them.
+                "val_models": [torch.load(fname) for fname in self.checkpoints.paths()],
+                "val_checkpoints": self.checkpoints.entries,
+                "rng_states": get_rng_states(),
+            },
+            os.path.join(path + ".tmp", "state.pt"),
+        )
+        self.save_replay_buffer(os.path.join(path + ".tmp", "replay_buffer.npz"))
+
+        if os.path.isdir(path):
+            shutil.rmtree(path + ".old", ignore_errors=True)
+            os.rename(path, path + ".old")
+        os.rename(path + ".tmp", path)
+        shutil.rmtree(path + ".old", ignore_errors=True)
+
+    def resume(self, path: str) -> None:
+        r"""Continue an interrupted training from its last checkpoint.
+
+        The agent has to be initialized with the same parameters as the interrupted
+        one. The results are written into the directory of the interrupted training,
+        instead of a new one.
+
+        Args:
+            path: the `default_root_dir` of the interrupted training, or its
+                `checkpoint` directory. Every rank of a data-parallel learner
+                continues from its own checkpoint in `default_root_dir`.
 
-        self.env.close()
+        """
+        path = os.path.normpath(path)
+        if not os.path.basename(path).startswith("checkpoint"):
+            path = os.path.join(path, self.checkpoint_name)
+        if not os.path.isdir(path) and os.path.isdir(path + ".old"):
+            path = path + ".old"  # crashed in between the two renames
+
+        self.remove_results_from_disk()
+        self.default_root_dir = os.path.dirname(path)
+
+        state = torch.load(os.path.join(path, "state.pt"))
+        self.dqn.load_state_dict(state["dqn"])
+        self.dqn_target.load_state_dict(state["dqn_target"])
+        self.optimizer.load_state_dict(state["optimizer"])
+        self.epsilon = state["epsilon"]
+        self.iteration_idx = state["iteration_idx"]
+        self.epsilons = state["epsilons"]
+        self.training_loss = state["training_loss"]
+        self.scores = state["scores"]
+        self.q_values = state["q_values"]
+        # The interrupted training may have written more metrics after the checkpoint.
+        for series in self.metric_series():
+            series.truncate()
+        self.checkpoints.directory = self.default_root_dir
+        self.checkpoints.restore(state["val_checkpoints"], state["val_models"])
+
+        self.make_replay_buffer()
+        self.load_replay_buffer(os.path.join(path, "replay_buffer.npz"))
+
+        set_rng_states(state["rng_states"])
+        self._train_loop()
 
     def validate_test_middle(self, val_or_test: str) -> tuple[list, list, list, list]:
         r"""A function shared by explore validation and test in the middle.
 
+        The episodes are played by the evaluation workers, if there are any.
+        Otherwise they are played in this process, and the random states are restored
+        afterwards, so that validating doesn't change the course of training.
+
         Args:
             val_or_test: "val" or "test"
 
         Returns:
             scores_local: a list of total episode rewards
-            states_local: memory states
-            q_values_local: q values
-            actions_local: greey actions taken
+            states_local: memory states of the last episode
+            q_values_local: q values of the last episode
+            actions_local: greey actions taken in the last episode
 
         """
-        scores_local = []
-        states_local = []
-        q_values_local = []
-        actions_local = []
-
-        for idx in range(self.num_samples_for_results[val_or_test]):
-            done = True
-            score = 0
-            while True:
-                if done:
-                    self.reset()
-                    done = False
+        seeds = self.episode_seeds(val_or_test)
+        executor = self.get_evaluation_executor()
 
-                else:
-                    state = deepcopy(self.memory_systems.get_working_memory().to_list())
-                    (
-                        a_explore,
-                        q_explore,
-                        a_mm,
-                        q_mm,
-                        reward,
-                        intrinsic_explore_reward,
-                        answers,
-                        done,
-                    ) = self.step(greedy=True)
-                    score += reward
-
-                    if idx == self.num_samples_for_results[val_or_test] - 1:
-                        states_local.append(state)
-                        q_values_local.append({"explore": q_explore, "mm": q_mm})
-                        actions_local.append({"explore": a_explore, "mm": a_mm})
-                        self.q_values[val_or_test]["explore"].append(q_explore)
-                        self.q_values[val_or_test]["mm"].append(q_mm)
-
-                if done:
-                    assert (
-                        self.num_semantic_decayed
-                        == self.env_config["terminates_at"] + 1
-                    )
-                    break
+        if executor is not None:
+            scores_local, states_local, q_values_local, actions_local = gather_episodes(
+                submit_episodes(executor, snapshot_state_dict(self.dqn), seeds)
+            )
+        else:
+            rng_states = get_rng_states()
+            scores_local = []
+            for idx, seed in enumerate(seeds):
+                score, states_local, q_values_local, actions_local = self.run_episode(
+                    seed, idx == len(seeds) - 1
+                )
+                scores_local.append(score)
+            set_rng_states(rng_states)
 
-            scores_local.append(score)
+        for q_values_ in q_values_local:
+            self.q_values[val_or_test]["explore"].append(q_values_["explore"])
+            self.q_values[val_or_test]["mm"].append(q_values_["mm"])
 
         return scores_local, states_local, q_values_local, actions_local
 
     def validate(self) -> None:
-        r"""Validate the agent."""
+        r"""Validate the agent.
+
+        With `async_validation`, this only submits a snapshot of the weights to the
+        validation workers and returns right away. `collect_validations` saves the
+        results when they arrive.
+
+        """
+        num_episodes = self.iteration_idx // (self.env_config["terminates_at"] + 1) - 1
+
+        if self.async_validation:
+            state_dict = snapshot_state_dict(self.dqn)
+            futures = submit_episodes(
+                self.get_evaluation_executor(), state_dict, self.episode_seeds("val")
+            )
+            self.pending_validations.append((num_episodes, state_dict, futures))
+            return
+
         self.dqn.eval()
         scores_temp, states, q_values, actions = self.validate_test_middle("val")
+        self.save_validation_results(
+            num_episodes, self.dqn, scores_temp, states, q_values, actions
+        )
+        self.dqn.train()
 
-        num_episodes = self.iteration_idx // (self.env_config["terminates_at"] + 1) - 1
+    def collect_validations(self, wait: bool = False) -> None:
+        r"""Save the results of the asynchronous validations that have finished.
+
+        The validations are collected in the order they were submitted, so that
+        `self.scores["val"]` stays in order.
+
+        Args:
+            wait: whether to wait for all the pending validations.
+
+        """
+        while self.pending_validations and (
+            wait or all(future.done() for future in self.pending_validations[0][2])
+        ):
+            num_episodes, state_dict, futures = self.pending_validations.popleft()
+            scores_temp, states, q_values, actions = gather_episodes(futures)
+            for q_values_ in q_values:
+                self.q_values["val"]["explore"].append(q_values_["explore"])
+                self.q_values["val"]["mm"].append(q_values_["mm"])
+            self.save_validation_results(
+                num_episodes, state_dict, scores_temp, states, q_values, actions
+            )
+
+    def save_validation_results(
+        self,
+        num_episodes: int,
+        dqn: torch.nn.Module | dict,
+        scores_temp: list,
+        states: list,
+        q_values: list,
+        actions: list,
+    ) -> None:
+        r"""Keep the best validation model and save the validation results.
 
+        Args:
+            num_episodes: number of episodes run so far, when validation started
+            dqn: the validated dqn model, or its state dict
+            scores_temp: a list of total episode rewards
+            states: memory states
+            q_values: q values
+            actions: greedy actions taken
+
+        """
         save_validation(
             scores_temp=scores_temp,
             scores=self.scores,
-            default_root_dir=self.default_root_dir,
             num_episodes=num_episodes,
             validation_interval=self.validation_interval,
-            val_file_names=self.val_file_names,
-            dqn=self.dqn,
+            checkpoints=self.checkpoints,
+            dqn=dqn,
         )
         save_states_q_values_actions(
             states, q_values, actions, self.default_root_dir, "val", num_episodes
         )
-        self.env.close()
-        self.dqn.train()
 
     def test(self, checkpoint: str | None = None) -> None:
         r"""Test the agent.
@@ -692,31 +1236,39 @@ class DQNAgent:
         self.dqn.eval()
 
         self.env_config["seed"] = self.test_seed
-        self.env = gym.make(self.env_str, **self.env_config)
+        self.release_env()
+        self.check_out_env()
 
-        assert len(self.val_file_names) == 1, f"{len(self.val_file_names)} should be 1"
+        timing = self.timer.summary() if self.timer.enabled else None
+        self.checkpoints.close()
+        entries = read_index(self.default_root_dir)
+        assert entries, "There is no validation model to test."
 
-        self.dqn.load_state_dict(torch.load(self.val_file_names[0]))
+        self.dqn.load_state_dict(
+            torch.load(os.path.join(self.default_root_dir, entries[0]["path"]))
+        )
 
         if checkpoint is not None:
             self.dqn.load_state_dict(torch.load(checkpoint))
 
         scores, states, q_values, actions = self.validate_test_middle("test")
         self.scores["test"] = scores
+        self.flush_metrics()
 
         save_final_results(
             self.scores,
             self.training_loss,
             self.default_root_dir,
-            self.q_values,
             self,
+            timing=timing,
         )
         save_states_q_values_actions(
             states, q_values, actions, self.default_root_dir, "test"
         )
 
         self.plot_results("all", save_fig=True)
-        self.env.close()
+        self.close_evaluation_executor()
+        self.release_env()
         self.dqn.train()
 
     def plot_results(self, to_plot: str = "all", save_fig: bool = False) -> None:
@@ -734,6 +1286,29 @@ class DQNAgent:
                 q_values_test
 
         """
+        if self.plotter is not None and to_plot == "all":
+            # The plotter reads what was flushed every `metrics_flush_interval`
+            # steps, and everything at the end.
+            if self.iteration_idx >= self.num_iterations:
+                self.flush_metrics()
+            self.plotter.submit(
+                scores=self.scores,
+                iteration_idx=self.iteration_idx,
+                num_iterations=self.num_iterations,
+                total_maximum_episode_rewards=(
+                    self.env.unwrapped.total_maximum_episode_rewards
+                ),
+            )
+            console(
+                self.scores,
+                self.training_loss,
+                self.iteration_idx,
+                self.num_iterations,
+                self.env.unwrapped.total_maximum_episode_rewards,
+                timing=self.timer.summary() if self.timer.enabled else None,
+            )
+            return
+
         plot_results(
             self.scores,
             self.training_loss,
@@ -747,4 +1322,5 @@ class DQNAgent:
             self.action_explore2str,
             to_plot,
             save_fig,
+            timing=self.timer.summary() if self.timer.enabled else None,
         )
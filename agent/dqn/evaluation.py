@@ -0,0 +1,127 @@
+"""Playing the val / test episodes of a `DQNAgent` in worker processes.
+
+Every worker builds its own `DQNAgent` once (and thereby its own memory systems, and
+the env that it checks out of its own `env_pool`) from the same keyword arguments as
+the learner's. A job is one episode: a snapshot of the weights and the seed of the
+episode. Since every episode is seeded on its own, the results don't depend on the
+number of workers or on which worker plays which episode.
+"""
+
+import multiprocessing as mp
+import shutil
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import torch
+
+# The worker-local agent. It's created by `_init_worker` in every worker process.
+_worker_agent = None
+
+
+def snapshot_state_dict(dqn: torch.nn.Module) -> dict[str, torch.Tensor]:
+    r"""Make a frozen copy of the weights, that can be sent to another process.
+
+    Args:
+        dqn: the dqn model
+
+    Returns:
+        a state dict whose tensors are detached CPU copies
+
+    """
+    return {key: val.detach().cpu().clone() for key, val in dqn.state_dict().items()}
+
+
+def _init_worker(agent_params: dict) -> None:
+    from .dqn import DQNAgent
+
+    global _worker_agent
+
+    # Every worker is single-threaded. Otherwise a few of them oversubscribe the CPU
+    # that the learner is also using.
+    torch.set_num_threads(1)
+    # The agent writes its parameters into a new directory in `default_root_dir`.
+    # Nothing of the worker's is kept.
+    root_dir = tempfile.mkdtemp()
+    _worker_agent = DQNAgent(
+        **{
+            **agent_params,
+            "default_root_dir": root_dir,
+            "async_validation": False,
+            "num_evaluation_workers": 1,
+            "shared_replay_buffer": False,
+            "distributed": False,
+        }
+    )
+    shutil.rmtree(root_dir)
+
+
+def _run_episode(
+    state_dict: dict[str, torch.Tensor], seed: int, record: bool
+) -> tuple[float, list, list, list]:
+    agent = _worker_agent
+    agent.dqn.load_state_dict(state_dict)
+    agent.dqn.eval()
+    with torch.no_grad():
+        return agent.run_episode(seed, record)
+
+
+def make_executor(agent_params: dict, num_workers: int) -> ProcessPoolExecutor:
+    r"""Make a process pool whose workers can play episodes with given weights.
+
+    Args:
+        agent_params: the keyword arguments of the learner's `DQNAgent`
+        num_workers: number of worker processes
+
+    Returns:
+        the process pool
+
+    """
+    return ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(agent_params,),
+    )
+
+
+def submit_episodes(
+    executor: ProcessPoolExecutor,
+    state_dict: dict[str, torch.Tensor],
+    seeds: list[int],
+) -> list[Future]:
+    r"""Play one greedy episode per seed in the workers. Only the last episode
+    records its states, q-values and actions, as in `DQNAgent.validate_test_middle`.
+
+    Args:
+        executor: the process pool made by `make_executor`
+        state_dict: the weights, e.g., from `snapshot_state_dict`
+        seeds: the seeds of the episodes
+
+    Returns:
+        one future of (score, states, q_values, actions) per episode
+
+    """
+    return [
+        executor.submit(_run_episode, state_dict, seed, idx == len(seeds) - 1)
+        for idx, seed in enumerate(seeds)
+    ]
+
+
+def gather_episodes(futures: list[Future]) -> tuple[list, list, list, list]:
+    r"""Wait for the episodes and put them together in the order of their seeds.
+
+    Args:
+        futures: the futures returned by `submit_episodes`
+
+    Returns:
+        scores: a list of total episode rewards
+        states: memory states of the last episode
+        q_values: q values of the last episode
+        actions: greedy actions taken in the last episode
+
+    """
+    results = [future.result() for future in futures]
+    scores = [score for score, _, _, _ in results]
+    _, states, q_values, actions = results[-1]
+
+    return scores, states, q_values, actions
@@ -0,0 +1,215 @@
+"""Bounded-memory metrics for long trainings.
+
+A `MetricSeries` takes one value per step (e.g., a loss, an epsilon, or the q-values of
+a step), but it only keeps
+
+1. the last `ring_size` values in a ring buffer,
+2. an evenly decimated history of at most `history_size` values, for plotting: every
+   time it's full, every other value is dropped and only every twice as many steps is
+   kept from then on, and
+3. nothing else. Every value is appended to disk instead, when the series is
+   flushed.
+
+Values can be appended as 0-dim torch tensors, e.g., losses that are still on the
+device. They are read back in one batch when the series is flushed, instead of one
+device-to-host sync per step.
+"""
+
+import os
+from collections import deque
+
+import numpy as np
+import torch
+
+from .artifacts import Artifact, ArtifactWriter
+
+
+class MetricSeries:
+    r"""A list-like series of metric values with bounded memory.
+
+    Reading it (`len`, indexing, iterating, `np.asarray`) reads the pending values
+    into memory, without writing them, and gives the decimated history, with the
+    latest value at the end. So it can be used where a
+    list of all the values was used before, e.g., `plt.plot(series)` or
+    `series[-1]`.
+
+    Attributes:
+        path (str | None): where all the values are appended to. A path that ends
+            with ".f64" is a file of raw float64s (for scalars, readable with
+            `np.fromfile`), anything else is an artifact (see `ArtifactWriter`) with
+            the column "value".
+        history_size (int): the maximum number of decimated values.
+        flush_interval (int): the series is flushed every this many appends.
+        stride (int): every this many steps is kept in the history.
+        num_steps (int): the number of values appended so far.
+
+    Example:
+    ```
+    from agent.dqn.metrics import MetricSeries
+
+    losses = MetricSeries("training-results/loss.f64", history_size=4)
+    for step in range(10):
+        losses.append(torch.tensor(float(step)))
+    ```
+    >>> list(losses)
+    [0.0, 4.0, 8.0, 9.0]
+    >>> losses.steps
+    [0, 4, 8, 9]
+    >>> np.fromfile("training-results/loss.f64").tolist()
+    [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0]
+
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        ring_size: int = 1000,
+        history_size: int = 10000,
+        flush_interval: int = 1000,
+    ) -> None:
+        """Initialize an empty series.
+
+        Args:
+            path: where to append all the values to. None is not to write them.
+            ring_size: the number of the last values to keep.
+            history_size: the maximum number of decimated values to keep. It has to
+                be even.
+            flush_interval: flush every this many appends.
+
+        """
+        assert history_size >= 2 and history_size % 2 == 0
+        self.path = path
+        self.history_size = history_size
+        self.flush_interval = flush_interval
+
+        self.recent = deque(maxlen=ring_size)
+        self.history = []
+        self.history_steps = []
+        self.stride = 1
+        self.num_steps = 0
+        self.file_size = 0
+        self._pending = []
+        self._unwritten = []
+        self._writer = None
+
+        if self.path is not None and self.path.endswith(".f64"):
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            open(self.path, "wb").close()
+        elif self.path is not None:
+            self._writer = ArtifactWriter(self.path)
+
+    def append(self, value: float | np.ndarray | torch.Tensor) -> None:
+        r"""Append the value of the next step.
+
+        Args:
+            value: a number, an array, or a (0-dim) tensor, which is read lazily.
+
+        """
+        self._pending.append(value)
+        if len(self._pending) + len(self._unwritten) >= self.flush_interval:
+            self.flush()
+
+    def _read(self) -> None:
+        # Read the pending values into the ring buffer and the history. They are
+        # written by the next `flush`.
+        if not self._pending:
+            return
+
+        if all(isinstance(value, torch.Tensor) for value in self._pending):
+            # One device-to-host copy for all of them.
+            values = torch.stack([value.detach() for value in self._pending])
+            values = values.cpu().tolist()
+        else:
+            values = [
+                (
+                    value.detach().cpu().numpy()
+                    if isinstance(value, torch.Tensor)
+                    else value
+                )
+                for value in self._pending
+            ]
+        self._pending = []
+        if self.path is not None:
+            self._unwritten.extend(values)
+
+        for value in values:
+            self.recent.append(value)
+            if self.num_steps % self.stride == 0:
+                self.history.append(value)
+                self.history_steps.append(self.num_steps)
+                if len(self.history) > self.history_size:
+                    self.history = self.history[::2]
+                    self.history_steps = self.history_steps[::2]
+                    self.stride *= 2
+            self.num_steps += 1
+
+    def flush(self) -> None:
+        r"""Read the pending values, put them into the ring buffer and the history,
+        and append them to the file."""
+        self._read()
+        if not self._unwritten:
+            return
+
+        if self._writer is not None:
+            for value in self._unwritten:
+                self._writer.append({"value": value})
+            self._writer.flush()
+        else:
+            with open(self.path, "ab") as stream:
+                np.asarray(self._unwritten, dtype=np.float64).tofile(stream)
+                self.file_size = stream.tell()
+        self._unwritten = []
+
+    def truncate(self) -> None:
+        r"""Cut the file back to where it was at the last flush, e.g., after loading
+        a pickled series whose run went on writing to the file."""
+        if self._writer is not None:
+            self._writer.truncate()
+        elif self.path is not None and os.path.isfile(self.path):
+            os.truncate(self.path, self.file_size)
+
+    def _view(self) -> tuple[list, list]:
+        self._read()
+        values, steps = self.history, self.history_steps
+        if steps and steps[-1] != self.num_steps - 1:
+            values, steps = values + [self.recent[-1]], steps + [self.num_steps - 1]
+        return values, steps
+
+    @property
+    def steps(self) -> list[int]:
+        """The steps of the values, as they are read."""
+        return self._view()[1]
+
+    def __len__(self) -> int:
+        return len(self._view()[0])
+
+    def __getitem__(self, idx: int | slice):
+        return self._view()[0][idx]
+
+    def __iter__(self):
+        return iter(self._view()[0])
+
+    def __array__(self, dtype=None) -> np.ndarray:
+        return np.asarray(self._view()[0], dtype=dtype)
+
+    def __getstate__(self) -> dict:
+        self.flush()
+        return self.__dict__.copy()
+
+    def __repr__(self) -> str:
+        return f"MetricSeries({self._view()[0]!r})"
+
+
+def read_metric(path: str) -> list:
+    r"""Read all the values that a `MetricSeries` has appended to disk.
+
+    Args:
+        path: the path of the series
+
+    Returns:
+        the values, as floats or as (memory-mapped) arrays
+
+    """
+    if path.endswith(".f64"):
+        return np.fromfile(path, dtype=np.float64).tolist()
+    return Artifact(path).column("value")
@@ -5,11 +5,14 @@ from typing import Literal
 import numpy as np
 import torch
 import torch.nn.functional as F
+from torch.profiler import record_function
 from torch_geometric.nn import GCNConv
 
+from ..shared_replay import EncodedState
+from ..timing import PhaseTimer
 from .mlp import MLP
 from .stare_conv import StarEConvLayer
-from .utils import process_graph
+from .utils import process_encoded_graph, process_graph
 
 
 class GNN(torch.nn.Module):
@@ -38,6 +41,8 @@ class GNN(torch.nn.Module):
         gcn_layers: The GCN layers
         mlp_mm: The MLP for memory management policy
         mlp_explore: The MLP for explore policy
+        timer: The timer of the phases of the forward pass (see `PhaseTimer`). It's
+            disabled, unless the agent sets its own.
 
     """
 
@@ -169,6 +174,7 @@ class GNN(torch.nn.Module):
             device=device,
             **mlp_params,
         )
+        self.timer = PhaseTimer(enabled=False)
 
     def process_batch(self, data: np.ndarray) -> tuple[
         torch.Tensor,
@@ -183,7 +189,8 @@ class GNN(torch.nn.Module):
 
         Args:
             data: The input data as a batch. This is the same as what the `forward`
-                method receives. We will make them in to a batched version of the
+                method receives. A sample is a list of quadruples or an
+                `EncodedState`. We will make them in to a batched version of the
                 entity embeddings, relation embeddings, edge index, edge type, and
                 qualifiers. StarE needs all of them, while vanilla-GCN only needs the
                 entity embeddings and edge index.
@@ -236,7 +243,11 @@ class GNN(torch.nn.Module):
                 quals_inv,
                 short_memory_idx,
                 agent_entity_idx,
-            ) = process_graph(sample)
+            ) = (
+                process_encoded_graph(*sample, self.entities, self.relations)
+                if isinstance(sample, EncodedState)
+                else process_graph(sample)
+            )
 
             for entity in entities:
                 entity_embeddings_batch.append(
@@ -361,78 +372,90 @@ class GNN(torch.nn.Module):
             in the sample.
 
         """
-        (
-            entity_embeddings,
-            relation_embeddings,
-            edge_idx,
-            edge_type,
-            quals,
-            short_memory_idx,
-            num_short_memories,
-            agent_entity_idx,
-        ) = self.process_batch(data)
-
-        for layer_ in self.gcn_layers:
-            if "stare" in self.gcn_type:
-                entity_embeddings, relation_embeddings = layer_(
-                    entity_embeddings=entity_embeddings,
-                    relation_embeddings=relation_embeddings,
-                    edge_idx=edge_idx,
-                    edge_type=edge_type,
-                    quals=quals,
-                )
-            elif "vanilla" in self.gcn_type:
-                entity_embeddings = layer_(entity_embeddings, edge_idx)
-            else:
-                raise ValueError(f"{self.gcn_type} is not a valid GNN type.")
-
-            if self.dropout_between_gcn_layers:
-                entity_embeddings = self.drop(entity_embeddings)
-            if self.relu_between_gcn_layers:
-                entity_embeddings = F.relu(entity_embeddings)
-
-        if policy_type == "mm":
-            assert num_short_memories.sum() == short_memory_idx.size(0)
-            triple = []
-            for idx in short_memory_idx:
-                triple_ = torch.cat(
-                    [
-                        entity_embeddings[edge_idx[0, idx]],
-                        relation_embeddings[edge_type[idx]],
-                        entity_embeddings[edge_idx[1, idx]],
-                    ],
-                    dim=0,
-                )
-                triple.append(triple_)
+        with self.timer.phase("gnn.process_batch"), record_function(
+            "gnn.process_batch"
+        ):
+            (
+                entity_embeddings,
+                relation_embeddings,
+                edge_idx,
+                edge_type,
+                quals,
+                short_memory_idx,
+                num_short_memories,
+                agent_entity_idx,
+            ) = self.process_batch(data)
+        # The graph has every edge twice, once inverted.
+        self.timer.observe("nodes", entity_embeddings.size(0) // 2)
+        self.timer.observe("edges", edge_idx.size(1) // 2)
+        self.timer.observe("qualifiers", quals.size(1) // 2)
+
+        with self.timer.phase("gnn.layers"):
+            for layer_idx, layer_ in enumerate(self.gcn_layers):
+                with record_function(f"gnn.{self.gcn_type}_layer_{layer_idx}"):
+                    if "stare" in self.gcn_type:
+                        entity_embeddings, relation_embeddings = layer_(
+                            entity_embeddings=entity_embeddings,
+                            relation_embeddings=relation_embeddings,
+                            edge_idx=edge_idx,
+                            edge_type=edge_type,
+                            quals=quals,
+                        )
+                    elif "vanilla" in self.gcn_type:
+                        entity_embeddings = layer_(entity_embeddings, edge_idx)
+                    else:
+                        raise ValueError(f"{self.gcn_type} is not a valid GNN type.")
+
+                if self.dropout_between_gcn_layers:
+                    entity_embeddings = self.drop(entity_embeddings)
+                if self.relu_between_gcn_layers:
+                    entity_embeddings = F.relu(entity_embeddings)
+
+        with self.timer.phase(f"gnn.{policy_type}_head"):
+            if policy_type == "mm":
+                assert num_short_memories.sum() == short_memory_idx.size(0)
+                triple = []
+                for idx in short_memory_idx:
+                    triple_ = torch.cat(
+                        [
+                            entity_embeddings[edge_idx[0, idx]],
+                            relation_embeddings[edge_type[idx]],
+                            entity_embeddings[edge_idx[1, idx]],
+                        ],
+                        dim=0,
+                    )
+                    triple.append(triple_)
 
-            triple = torch.stack(triple, dim=0)
+                triple = torch.stack(triple, dim=0)
 
-            q_mm_ = self.mlp_mm(triple)
+                with record_function("gnn.mlp_mm"):
+                    q_mm_ = self.mlp_mm(triple)
 
-            q_mm = [
-                q_mm_[start : start + num]
-                for start, num in zip(
-                    num_short_memories.cumsum(0).roll(1), num_short_memories
-                )
-            ]
+                q_mm = [
+                    q_mm_[start : start + num]
+                    for start, num in zip(
+                        num_short_memories.cumsum(0).roll(1), num_short_memories
+                    )
+                ]
 
-            q_mm[0] = q_mm_[: num_short_memories[0]]
+                q_mm[0] = q_mm_[: num_short_memories[0]]
 
-            return q_mm
+                return q_mm
 
-        elif policy_type == "explore":
-            node = []
-            for idx in agent_entity_idx:
-                node_ = entity_embeddings[idx]
-                node.append(node_)
+            elif policy_type == "explore":
+                node = []
+                for idx in agent_entity_idx:
+                    node_ = entity_embeddings[idx]
+                    node.append(node_)
 
-            node = torch.stack(node, dim=0)
+                node = torch.stack(node, dim=0)
 
-            q_explore = self.mlp_explore(node)
+                with record_function("gnn.mlp_explore"):
+                    q_explore = self.mlp_explore(node)
 
-            q_explore = [row.unsqueeze(0) for row in list(q_explore.unbind(dim=0))]
+                q_explore = [row.unsqueeze(0) for row in list(q_explore.unbind(dim=0))]
 
-            return q_explore
+                return q_explore
 
-        else:
-            raise ValueError(f"{policy_type} is not a valid policy type.")
+            else:
+                raise ValueError(f"{policy_type} is not a valid policy type.")
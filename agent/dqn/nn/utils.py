@@ -1,9 +1,12 @@
 """A lot copied from https://github.com/migalkin/StarE"""
 
+import numpy as np
 import torch
 import torch_scatter
 from torch_scatter import scatter_add, scatter_max
 
+from ..shared_replay import QUALIFIER_COLUMNS
+
 
 def maybe_num_nodes(index, num_nodes=None):
     return index.max().item() + 1 if num_nodes is None else num_nodes
@@ -256,3 +259,104 @@ def process_graph(
         torch.tensor(short_memory_idx),
         agent_entity_idx,
     )
+
+
+def process_encoded_graph(
+    triples: np.ndarray,
+    quals: np.ndarray,
+    num_memories: int,
+    entities: list[str],
+    relations: list[str],
+) -> tuple[
+    list,
+    list,
+    torch.Tensor,
+    torch.Tensor,
+    torch.Tensor,
+    torch.Tensor,
+    torch.Tensor,
+    torch.Tensor,
+    torch.Tensor,
+    int,
+]:
+    r"""`process_graph` of a sample encoded by `encode_state`, without decoding it
+    into quadruples first. The outputs are the same as those of
+    `process_graph(decode_state(triples, quals, num_memories, entities, relations))`.
+
+    Args:
+        triples: [max_memories, 3] (head, relation, tail) ids
+        quals: [max_memories, 3] qualifiers, in the order of `QUALIFIER_COLUMNS`
+        num_memories: the number of valid rows
+        entities: the entities that the ids index, e.g., `GNN.entities`
+        relations: the relations that the ids index, e.g., `GNN.relations`
+
+    Returns:
+        the same as `process_graph`
+
+    """
+    triples = triples[:num_memories].tolist()
+    quals = quals[:num_memories]
+    present = ~np.isnan(quals)
+    # Python's round() and np.rint() both round half to even.
+    values = np.rint(np.where(present, quals, 0)).astype(np.int64).tolist()
+    present = present.tolist()
+
+    rows = []
+    entities_, relations_ = set(), set()
+    for (head, relation, tail), row_present, row_values in zip(
+        triples, present, values
+    ):
+        head, relation, tail = entities[head], relations[relation], entities[tail]
+        qualifiers = [
+            (key, str(value))
+            for key, is_present, value in zip(
+                QUALIFIER_COLUMNS, row_present, row_values
+            )
+            if is_present
+        ]
+        rows.append((head, relation, tail, qualifiers))
+        entities_.update([head, tail])
+        relations_.update([relation, relation + "_inv"])
+        for q_rel, q_entity in qualifiers:
+            relations_.add(q_rel)
+            entities_.add(q_entity)
+
+    entities_ = sorted(entities_, reverse=True)
+    relations_ = sorted(relations_, reverse=True)
+    entity_to_idx = {entity: idx for idx, entity in enumerate(entities_)}
+    relation_to_idx = {relation: idx for idx, relation in enumerate(relations_)}
+
+    edge_idx, edge_type, quals_ = [], [], []
+    edge_idx_inv, edge_type_inv = [], []
+    short_memory_idx = []
+    agent_entity_idx = None
+    for i, (head, relation, tail, qualifiers) in enumerate(rows):
+        if head == "agent":
+            agent_entity_idx = entity_to_idx[head]
+        if tail == "agent":
+            agent_entity_idx = entity_to_idx[tail]
+
+        edge_idx.append([entity_to_idx[head], entity_to_idx[tail]])
+        edge_type.append(relation_to_idx[relation])
+        edge_idx_inv.append([entity_to_idx[tail], entity_to_idx[head]])
+        edge_type_inv.append(relation_to_idx[relation + "_inv"])
+
+        for q_rel, q_entity in qualifiers:
+            if q_rel == "current_time":
+                short_memory_idx.append(i)
+            quals_.append([relation_to_idx[q_rel], entity_to_idx[q_entity], i])
+
+    if agent_entity_idx is None:
+        raise ValueError("No agent entity found in the sample")
+    return (
+        entities_,
+        relations_,
+        torch.tensor(edge_idx).T,
+        torch.tensor(edge_type),
+        torch.tensor(quals_).T,
+        torch.tensor(edge_idx_inv).T,
+        torch.tensor(edge_type_inv),
+        torch.tensor(quals_).T,
+        torch.tensor(short_memory_idx),
+        agent_entity_idx,
+    )
@@ -0,0 +1,279 @@
+"""Plotting the training of a `DQNAgent` off the learner.
+
+The learner only flushes its metrics to `default_root_dir/metrics` (see
+`MetricSeries`) and sends the (small) scores to a `BackgroundPlotter`. The plotter is a
+separate process that reads only what was appended to the metrics since its last
+render, keeps a decimated copy of every series, and redraws `plot.pdf` from that. If
+it's still busy with a render, newer requests replace the waiting one, so the learner
+never waits for matplotlib.
+
+The same plot can be made from the files of a (running or finished) training with
+
+    python -m agent.dqn.plotting <default_root_dir>
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import queue
+
+import numpy as np
+from matplotlib.figure import Figure
+
+from .artifacts import Artifact
+from .metrics import MetricSeries
+
+ACTION_MM2STR = {0: "episodic", 1: "semantic", 2: "forget"}
+ACTION_EXPLORE2STR = {0: "north", 1: "east", 2: "south", 3: "west", 4: "stay"}
+
+
+class MetricsReader:
+    r"""Read the metrics of a training incrementally.
+
+    Every call to `update` reads only the bytes (of the ".f64" files) and the rows
+    (of the artifacts) that were appended since the last one.
+    The values are kept in decimated `MetricSeries`, so the memory is bounded however
+    long the training is.
+
+    Attributes:
+        metrics_dir (str): the directory of the metrics
+        series (dict[str, MetricSeries]): the decimated series, by file name. The
+            q-values are split into one series per action, e.g.,
+            "q_values_train_mm/1", and the mm q-values of all the short-term
+            memories of a step are appended one after another.
+
+    """
+
+    def __init__(self, metrics_dir: str, history_size: int = 10000) -> None:
+        """Initialize the reader.
+
+        Args:
+            metrics_dir: the directory of the metrics
+            history_size: the maximum number of values to keep per series
+
+        """
+        self.metrics_dir = metrics_dir
+        self.history_size = history_size
+        self.series = {}
+        self.offsets = {}
+
+    def _series(self, name: str) -> MetricSeries:
+        if name not in self.series:
+            self.series[name] = MetricSeries(
+                history_size=self.history_size, flush_interval=np.inf
+            )
+        return self.series[name]
+
+    def update(self) -> None:
+        r"""Read what was appended to the metrics since the last update."""
+        if not os.path.isdir(self.metrics_dir):
+            return
+
+        for fname in sorted(os.listdir(self.metrics_dir)):
+            path = os.path.join(self.metrics_dir, fname)
+            offset = self.offsets.get(fname, 0)
+
+            if fname.endswith(".f64"):
+                with open(path, "rb") as stream:
+                    stream.seek(offset)
+                    data = stream.read()
+                data = data[: len(data) // 8 * 8]
+                self.offsets[fname] = offset + len(data)
+                for value in np.frombuffer(data, dtype=np.float64).tolist():
+                    self._series(fname).append(value)
+                self._series(fname).flush()
+
+            elif os.path.isfile(os.path.join(path, "manifest.json")):
+                # Here the offset is the number of rows read so far.
+                artifact = Artifact(path)
+                for q_values in artifact.column("value", start=offset):
+                    self._append_q_values(fname, q_values)
+                self.offsets[fname] = artifact.num_rows
+                for name, series in self.series.items():
+                    if name.startswith(fname + "/"):
+                        series.flush()
+
+    def _append_q_values(self, fname: str, q_values: np.ndarray) -> None:
+        q_values = q_values.reshape(-1, q_values.shape[-1]) if q_values.size else []
+        if fname.endswith("_explore"):
+            q_values = q_values[:1]
+        for row in q_values:
+            for action_number, q_value in enumerate(row):
+                self._series(f"{fname}/{action_number}").append(float(q_value))
+
+    def get(self, name: str) -> tuple[list[int], list[float]]:
+        r"""The decimated steps and values of a series. Empty if there is none yet.
+
+        Args:
+            name: e.g., "epsilons.f64" or "q_values_val_explore/4"
+
+        """
+        if name not in self.series:
+            return [], []
+        return self.series[name].steps, list(self.series[name])
+
+
+def render(
+    reader: MetricsReader,
+    path: str,
+    scores: dict | None = None,
+    iteration_idx: int | None = None,
+    num_iterations: int | None = None,
+    total_maximum_episode_rewards: int | None = None,
+) -> None:
+    r"""Draw the nine-panel figure of `plot_results` from a `MetricsReader`, and save
+    it atomically.
+
+    Args:
+        reader: the reader, already updated
+        path: the file to save the figure to, e.g., "plot.pdf"
+        scores: {"train": [...], "val": [[...], ...], "test": [...] or None}
+        iteration_idx: the current iteration index.
+        num_iterations: the total number of iterations.
+        total_maximum_episode_rewards: the total maximum episode rewards.
+
+    """
+    fig = Figure(figsize=(20, 20))
+    axes = fig.subplots(3, 3)
+
+    ax = axes[0, 0]
+    ax.set_title("training td loss (log scale)")
+    for key in ["total", "mm", "explore"]:
+        ax.plot(*reader.get(f"training_loss_{key}.f64"), label=key)
+    ax.set_yscale("log")
+    ax.set_xlabel("update counts")
+    ax.legend(loc="best")
+
+    ax = axes[0, 1]
+    ax.set_title("epsilons")
+    ax.plot(*reader.get("epsilons.f64"))
+    ax.set_xlabel("update counts")
+
+    ax = axes[0, 2]
+    scores = scores or {}
+    if scores.get("train"):
+        ax.set_title(
+            f"iteration {iteration_idx} out of {num_iterations}. "
+            f"training score: {scores['train'][-1]} out of "
+            f"{total_maximum_episode_rewards}"
+        )
+        ax.plot(scores["train"], label="Training score")
+    if scores.get("val"):
+        val_means = [round(np.mean(scores_).item()) for scores_ in scores["val"]]
+        ax.set_title(
+            f"validation score: {val_means[-1]} out of "
+            f"{total_maximum_episode_rewards}"
+        )
+        ax.plot(val_means, label="Validation score")
+    if scores.get("test"):
+        ax.set_title(
+            f"test score: {np.mean(scores['test'])} out of "
+            f"{total_maximum_episode_rewards}"
+        )
+        ax.plot(
+            [round(np.mean(scores["test"]).item(), 2)] * len(scores.get("train", [])),
+            label="Test score",
+        )
+    ax.set_xlabel("episode")
+    if scores:
+        ax.legend(loc="best")
+
+    for row, (policy, action2str) in enumerate(
+        [("mm", ACTION_MM2STR), ("explore", ACTION_EXPLORE2STR)], start=1
+    ):
+        for ax, split in zip(axes[row], ["train", "val", "test"]):
+            ax.set_title(f"Q-values ({policy}), {split}")
+            for action_number, action in action2str.items():
+                ax.plot(
+                    *reader.get(f"q_values_{split}_{policy}/{action_number}"),
+                    label=action,
+                )
+            ax.legend(loc="best")
+            ax.set_xlabel("number of actions")
+
+    fig.subplots_adjust(hspace=0.5)
+    # The extension tells matplotlib the format, so it stays at the end.
+    root, ext = os.path.splitext(path)
+    fig.savefig(root + ".tmp" + ext)
+    os.replace(root + ".tmp" + ext, path)
+
+
+def _plot_forever(default_root_dir: str, requests: mp.Queue) -> None:
+    reader = MetricsReader(os.path.join(default_root_dir, "metrics"))
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        reader.update()
+        render(reader, os.path.join(default_root_dir, "plot.pdf"), **request)
+
+
+class BackgroundPlotter:
+    r"""A process that redraws `plot.pdf` of a training whenever it's asked to.
+
+    Example:
+    ```
+    plotter = BackgroundPlotter(agent.default_root_dir)
+    ...
+    plotter.submit(scores=agent.scores, iteration_idx=agent.iteration_idx)
+    ...
+    plotter.close()
+    ```
+
+    """
+
+    def __init__(self, default_root_dir: str) -> None:
+        """Start the process.
+
+        Args:
+            default_root_dir: the directory of the training, with its "metrics"
+
+        """
+        ctx = mp.get_context("spawn")
+        self.requests = ctx.Queue(maxsize=1)
+        self.process = ctx.Process(
+            target=_plot_forever, args=(default_root_dir, self.requests), daemon=True
+        )
+        self.process.start()
+
+    def submit(self, **request) -> None:
+        r"""Ask for a new render, without waiting for it. The metric files have to be
+        flushed already. If there is an older request that the process hasn't started
+        yet, it's dropped.
+
+        Args:
+            **request: the keyword arguments of `render`, except for the reader and
+                the path.
+
+        """
+        while True:
+            try:
+                self.requests.put_nowait(request)
+                return
+            except queue.Full:
+                try:
+                    self.requests.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def close(self) -> None:
+        r"""Wait for the requested renders, and stop the process."""
+        self.requests.put(None)
+        self.process.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Plot a DQN training from its metric files."
+    )
+    parser.add_argument("default_root_dir", help="the directory of the training")
+    args = parser.parse_args()
+
+    reader = MetricsReader(os.path.join(args.default_root_dir, "metrics"))
+    reader.update()
+    render(reader, os.path.join(args.default_root_dir, "plot.pdf"))
+    print(os.path.join(args.default_root_dir, "plot.pdf"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""A replay buffer that lives in shared memory, so that several processes can write
+transitions into it and one learner can sample from it."""
+
+from multiprocessing import Lock, resource_tracker, shared_memory
+from typing import NamedTuple
+
+import numpy as np
+
+# The qualifiers that the GNN reads. `timestamp` is stored as its maximum only,
+# since `process_graph` only ever looks at `max(timestamp)`.
+QUALIFIER_COLUMNS = ("current_time", "timestamp", "strength")
+
+# Slots of the int64 header.
+_PTR, _SIZE = 0, 1
+
+
+class EncodedState(NamedTuple):
+    r"""A state encoded by `encode_state`. `GNN` reads it as it is, like a list of
+    quadruples, without decoding it."""
+
+    triples: np.ndarray
+    quals: np.ndarray
+    num_memories: int
+
+
+def encode_state(
+    state: list[list],
+    entity_to_idx: dict[str, int],
+    relation_to_idx: dict[str, int],
+    max_memories: int,
+) -> tuple[np.ndarray, np.ndarray, int]:
+    r"""Encode a working-memory state (a list of quadruples) into fixed-size arrays.
+
+    Args:
+        state: a list of quadruples, e.g.,
+            [["agent", "atlocation", "room_000", {"current_time": 2, "strength": 1}]]
+        entity_to_idx: mapping from entities to indices
+        relation_to_idx: mapping from relations to indices
+        max_memories: the number of rows to allocate
+
+    Returns:
+        triples: [max_memories, 3] int32 array of (head, relation, tail) ids. The
+            padded rows are -1.
+        quals: [max_memories, 3] float64 array of the qualifiers in the order of
+            `QUALIFIER_COLUMNS`. A missing qualifier is NaN.
+        num_memories: the number of valid rows.
+
+    """
+    if len(state) > max_memories:
+        raise ValueError(
+            f"The state has {len(state)} memories, but max_memories is {max_memories}"
+        )
+    triples = np.full((max_memories, 3), -1, dtype=np.int32)
+    quals = np.full((max_memories, len(QUALIFIER_COLUMNS)), np.nan, dtype=np.float64)
+
+    for i, (head, relation, tail, qualifiers) in enumerate(state):
+        triples[i] = (
+            entity_to_idx[head],
+            relation_to_idx[relation],
+            entity_to_idx[tail],
+        )
+        for j, key in enumerate(QUALIFIER_COLUMNS):
+            if key in qualifiers:
+                val = qualifiers[key]
+                quals[i, j] = max(val) if isinstance(val, list) else val
+
+    return triples, quals, len(state)
+
+
+def decode_state(
+    triples: np.ndarray,
+    quals: np.ndarray,
+    num_memories: int,
+    entities: list[str],
+    relations: list[str],
+) -> list[list]:
+    r"""Decode the arrays made by `encode_state` back into a list of quadruples.
+
+    `timestamp` comes back as a one-element list with its maximum, which is all that
+    the GNN uses.
+
+    Args:
+        triples: [max_memories, 3] (head, relation, tail) ids
+        quals: [max_memories, 3] qualifiers
+        num_memories: the number of valid rows
+        entities: list of entities
+        relations: list of relations
+
+    Returns:
+        state: a list of quadruples
+
+    """
+    state = []
+    for (head, relation, tail), row in zip(
+        triples[:num_memories].tolist(), quals[:num_memories].tolist()
+    ):
+        qualifiers = {}
+        for key, val in zip(QUALIFIER_COLUMNS, row):
+            if val != val:  # NaN
+                continue
+            if key == "current_time":
+                qualifiers[key] = int(val)
+            elif key == "timestamp":
+                qualifiers[key] = [int(val)]
+            else:
+                qualifiers[key] = val
+        state.append([entities[head], relations[relation], entities[tail], qualifiers])
+
+    return state
+
+
+class SharedReplayBuffer:
+    r"""A ring-buffer replay buffer backed by `multiprocessing.shared_memory`.
+
+    It has the same `store`, `sample_batch` and `__len__` interface as `ReplayBuffer`,
+    so it can be a drop-in replacement for it. The difference is that the transitions
+    are kept as compact, fixed-size numeric arrays in one shared-memory block. The
+    buffer can be passed to other processes (e.g., as an argument of
+    `multiprocessing.Process`), where it attaches to the same block. Several
+    producers can then `store` into it while a learner calls `sample_batch`, without
+    pickling the states through pipes.
+
+    Writes are fine-grained locked: the lock is only held to reserve a slot and to
+    commit it, not while the payload is being copied. Every slot has a sequence number
+    that is odd while it is being written. `sample_batch` copies the sampled rows
+    into a batch and re-samples if any of them was torn by a concurrent write.
+
+    Attributes:
+        max_size (int): Maximum size of the buffer.
+        batch_size (int): Batch size for sampling from the buffer.
+        max_memories (int): Maximum number of quadruples in a state.
+        max_short (int): Maximum number of short-term memories, i.e., mm actions.
+        entities (list[str]): Entity vocabulary used for encoding.
+        relations (list[str]): Relation vocabulary used for encoding.
+
+    Example:
+    ```
+    from agent.dqn.shared_replay import SharedReplayBuffer
+
+    buffer = SharedReplayBuffer(
+        size=1000,
+        batch_size=32,
+        max_memories=27,
+        max_short=15,
+        entities=agent.dqn_params["entities"],
+        relations=agent.dqn_params["relations"],
+    )
+    workers = [mp.Process(target=collect, args=(buffer,)) for _ in range(4)]
+    ...
+    batch = buffer.sample_batch()
+    ...
+    buffer.close()
+    buffer.unlink()
+    ```
+
+    """
+
+    def __init__(
+        self,
+        size: int,
+        batch_size: int,
+        max_memories: int,
+        max_short: int,
+        entities: list[str],
+        relations: list[str],
+    ) -> None:
+        """Create the buffer and its shared-memory block.
+
+        Args:
+            size: size of the buffer
+            batch_size: batch size to sample
+            max_memories: maximum number of quadruples in a (next) state. This is
+                normally capacity["short"] + capacity["long"].
+            max_short: maximum number of short-term memories, i.e., capacity["short"]
+            entities: entity vocabulary, e.g., `agent.dqn_params["entities"]`
+            relations: relation vocabulary, e.g., `agent.dqn_params["relations"]`
+
+        Raises:
+            ValueError: If batch_size is greater than size.
+
+        """
+        if batch_size > size:
+            raise ValueError("batch_size must be smaller than size")
+
+        self.max_size = size
+        self.batch_size = batch_size
+        self.max_memories = max_memories
+        self.max_short = max_short
+        self.entities = list(entities)
+        self.relations = list(relations)
+
+        self._shm = shared_memory.SharedMemory(create=True, size=self._nbytes())
+        self._owner = True
+        self._lock = Lock()
+        self._map_arrays()
+        self._header[:] = 0
+        self._seq[:] = 0
+
+    def _layout(self) -> list[tuple[str, tuple, np.dtype]]:
+        """Name, shape and dtype of every array in the shared-memory block."""
+        n, m, q = self.max_size, self.max_memories, len(QUALIFIER_COLUMNS)
+        return [
+            ("_header", (2,), np.int64),
+            ("_seq", (n,), np.int64),
+            ("obs_triples", (n, m, 3), np.int32),
+            ("obs_quals", (n, m, q), np.float64),
+            ("obs_len", (n,), np.int32),
+            ("next_obs_triples", (n, m, 3), np.int32),
+            ("next_obs_quals", (n, m, q), np.float64),
+            ("next_obs_len", (n,), np.int32),
+            ("acts_explore_buf", (n,), np.int64),
+            ("acts_mm_buf", (n, self.max_short), np.int64),
+            ("acts_mm_len", (n,), np.int32),
+            ("rews_explore_buf", (n,), np.float32),
+            ("rews_mm_buf", (n,), np.float32),
+            ("done_buf", (n,), np.float32),
+        ]
+
+    @staticmethod
+    def _aligned(nbytes: int) -> int:
+        return (nbytes + 7) // 8 * 8
+
+    def _nbytes(self) -> int:
+        return sum(
+            self._aligned(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            for _, shape, dtype in self._layout()
+        )
+
+    def _map_arrays(self) -> None:
+        """Create the numpy views on the shared-memory block."""
+        offset = 0
+        for name, shape, dtype in self._layout():
+            array = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=offset)
+            setattr(self, name, array)
+            offset += self._aligned(array.nbytes)
+
+    def __getstate__(self) -> dict:
+        state = {
+            key: val
+            for key, val in self.__dict__.items()
+            if key not in [name for name, _, _ in self._layout()] + ["_shm", "_owner"]
+        }
+        state["_shm_name"] = self._shm.name
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        shm_name = state.pop("_shm_name")
+        self.__dict__.update(state)
+        self._shm = shared_memory.SharedMemory(name=shm_name)
+        # Only the creator is responsible for unlinking the block. Without this, the
+        # resource tracker of an attaching process would unlink it on exit.
+        resource_tracker.unregister(self._shm._name, "shared_memory")
+        self._owner = False
+        self._map_arrays()
+
+    @property
+    def entity_to_idx(self) -> dict[str, int]:
+        if not hasattr(self, "_entity_to_idx"):
+            self._entity_to_idx = {e: i for i, e in enumerate(self.entities)}
+        return self._entity_to_idx
+
+    @property
+    def relation_to_idx(self) -> dict[str, int]:
+        if not hasattr(self, "_relation_to_idx"):
+            self._relation_to_idx = {r: i for i, r in enumerate(self.relations)}
+        return self._relation_to_idx
+
+    def store(
+        self,
+        obs: list[list],
+        act_explore: np.ndarray,
+        act_mm: np.ndarray,
+        rew_explore: float,
+        rew_mm: float,
+        next_obs: list[list],
+        done: bool,
+    ) -> None:
+        r"""Store the data in the buffer. This can be called from several processes
+        at the same time.
+
+        Args:
+            obs: observation, i.e., working memory as a list of quadruples
+            act_explore: explore action
+            act_mm: memory management actions
+            rew_explore: reward for explore
+            rew_mm: reward for memory management
+            next_obs: next observation
+            done: done
+
+        """
+        act_mm = np.asarray(act_mm).reshape(-1)
+        if len(act_mm) > self.max_short:
+            raise ValueError(
+                f"There are {len(act_mm)} mm actions, but max_short is "
+                f"{self.max_short}"
+            )
+        # Encode outside of the lock.
+        obs_triples, obs_quals, obs_len = encode_state(
+            obs, self.entity_to_idx, self.relation_to_idx, self.max_memories
+        )
+        next_triples, next_quals, next_len = encode_state(
+            next_obs, self.entity_to_idx, self.relation_to_idx, self.max_memories
+        )
+
+        with self._lock:
+            idx = int(self._header[_PTR])
+            self._header[_PTR] = (idx + 1) % self.max_size
+            self._seq[idx] += 1  # odd: being written
+
+        self.obs_triples[idx] = obs_triples
+        self.obs_quals[idx] = obs_quals
+        self.obs_len[idx] = obs_len
+        self.next_obs_triples[idx] = next_triples
+        self.next_obs_quals[idx] = next_quals
+        self.next_obs_len[idx] = next_len
+        self.acts_explore_buf[idx] = int(np.asarray(act_explore).item())
+        self.acts_mm_buf[idx, : len(act_mm)] = act_mm
+        self.acts_mm_len[idx] = len(act_mm)
+        self.rews_explore_buf[idx] = rew_explore
+        self.rews_mm_buf[idx] = rew_mm
+        self.done_buf[idx] = done
+
+        with self._lock:
+            self._seq[idx] += 1  # even: committed
+            self._header[_SIZE] = min(int(self._header[_SIZE]) + 1, self.max_size)
+
+    def sample_batch_encoded(self, max_retries: int = 100) -> dict[str, np.ndarray]:
+        r"""Sample a batch of data from the buffer, without decoding the states.
+
+        The sampled rows are copied out of the shared-memory block, i.e., this is
+        copy-on-sample, not zero-copy: the rows are random, so they can't be views of
+        one contiguous block, and the copy is what is checked against concurrent
+        writes. The copy is one fancy-indexing per array, with no Python objects.
+
+        Args:
+            max_retries: how many times to re-sample if a sampled slot was being
+                written at the same time.
+
+        Returns:
+            A dictionary of numpy arrays, keyed by the names of the buffer arrays.
+
+        """
+        for _ in range(max_retries):
+            idxs = np.random.choice(len(self), size=self.batch_size, replace=False)
+            seq_before = self._seq[idxs].copy()
+            batch = {
+                name: getattr(self, name)[idxs]
+                for name, _, _ in self._layout()
+                if not name.startswith("_")
+            }
+            seq_after = self._seq[idxs]
+            if (
+                (seq_before == seq_after).all()
+                and (seq_before % 2 == 0).all()
+                and (seq_before > 0).all()
+            ):
+                return batch
+
+        raise RuntimeError("Could not sample a consistent batch from the buffer.")
+
+    def sample_batch(self) -> dict[str, np.ndarray]:
+        r"""Sample a batch of data from the buffer. The format is the same as that of
+        `ReplayBuffer.sample_batch`, except that the states are `EncodedState`s, views
+        of the sampled arrays, which `GNN` reads without decoding them. Use
+        `decode_state(*state, entities, relations)` to get the quadruples.
+
+        Returns:
+            A dictionary of samples from the replay buffer.
+                obs: np.ndarray of `EncodedState`,
+                next_obs: np.ndarray of `EncodedState`,
+                acts_explore: np.ndarray,
+                acts_mm: np.ndarray,
+                rews_explore: np.ndarray,
+                rews_mm: np.ndarray,
+                done: np.ndarray
+
+        """
+        batch = self.sample_batch_encoded()
+
+        obs = np.array([None] * self.batch_size, dtype=object)
+        next_obs = np.array([None] * self.batch_size, dtype=object)
+        acts_mm = np.array([None] * self.batch_size, dtype=object)
+        for i in range(self.batch_size):
+            obs[i] = EncodedState(
+                batch["obs_triples"][i], batch["obs_quals"][i], batch["obs_len"][i]
+            )
+            next_obs[i] = EncodedState(
+                batch["next_obs_triples"][i],
+                batch["next_obs_quals"][i],
+                batch["next_obs_len"][i],
+            )
+            acts_mm[i] = batch["acts_mm_buf"][i, : batch["acts_mm_len"][i]]
+
+        return dict(
+            obs=obs,
+            next_obs=next_obs,
+            acts_explore=batch["acts_explore_buf"],
+            acts_mm=acts_mm,
+            rews_explore=batch["rews_explore_buf"],
+            rews_mm=batch["rews_mm_buf"],
+            done=batch["done_buf"],
+        )
+
+    def save(self, path: str) -> None:
+        r"""Save the buffer into one uncompressed `.npz` file. The arrays are written
+        as they are, i.e., already encoded. Nothing should `store` meanwhile.
+
+        Args:
+            path: the file to write
+
+        """
+        arrays = {
+            name: getattr(self, name) for name, _, _ in self._layout() if name != "_seq"
+        }
+        with open(path, "wb") as stream:
+            np.savez(stream, **arrays)
+
+    def load(self, path: str) -> None:
+        r"""Load the buffer saved by `save`, in place.
+
+        Args:
+            path: the file to read
+
+        Raises:
+            ValueError: If the saved buffer has a different layout.
+
+        """
+        with np.load(path) as arrays:
+            for name, shape, _ in self._layout():
+                if name == "_seq":
+                    continue
+                if arrays[name].shape != shape:
+                    raise ValueError(
+                        f"{name} has shape {arrays[name].shape} in the saved buffer, "
+                        f"but {shape} in this one"
+                    )
+                getattr(self, name)[:] = arrays[name]
+        # The loaded slots are committed, i.e., even and not 0, like after a `store`.
+        self._seq[:] = 0
+        self._seq[: len(self)] = 2
+
+    def __len__(self) -> int:
+        return int(self._header[_SIZE])
+
+    @property
+    def size(self) -> int:
+        return len(self)
+
+    @property
+    def ptr(self) -> int:
+        return int(self._header[_PTR])
+
+    def close(self) -> None:
+        """Detach from the shared-memory block. Call this in every process."""
+        for name, _, _ in self._layout():
+            if hasattr(self, name):
+                delattr(self, name)
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """Free the shared-memory block. Only the creator should call this."""
+        if self._owner:
+            self._shm.unlink()
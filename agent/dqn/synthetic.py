@@ -0,0 +1,150 @@
+"""Synthetic working memories, for testing the GNN at scale.
+
+The largest working memories that RoomEnv-v2 makes are a few hundred quadruples. The
+ones made here can have any size, and look like the real ones:
+
+- The short-term memories are what the agent observes in its room: the "agent"
+  node, the room's edges to its neighbors and walls, and the objects in the room.
+  Their qualifier is "current_time".
+- The long-term memories are episodic, with a "timestamp" list, or semantic, with a
+  "strength". They are about objects in rooms, the edges of the room layout, and
+  where the agent was.
+
+The entities and the relations are the same as `DQNAgent`'s (`gnn_vocab`), and the
+layout is the env's, so the memories can be given to a `GNN` of a `DQNAgent` of the
+same room size. The numbers that the qualifiers become as entities never exceed
+terminates_at + 1.
+
+```
+vocab = make_vocab()
+gnn = GNN(entities=vocab["entities"], relations=vocab["relations"], ...)
+state = generate_working_memory(10_000, vocab, seed=0)
+gnn(np.array([state], dtype=object), policy_type="mm")
+```
+"""
+
+import random
+from functools import lru_cache
+
+import gymnasium as gym
+
+from .shared_replay import QUALIFIER_COLUMNS
+from .utils import gnn_vocab
+
+ENV_STR = "room_env:RoomEnv-v2"
+ROOM_SIZE = "xl-different-prob"
+TERMINATES_AT = 99
+
+
+@lru_cache(maxsize=None)
+def make_vocab(
+    env_str: str = ENV_STR,
+    room_size: str = ROOM_SIZE,
+    terminates_at: int = TERMINATES_AT,
+) -> dict:
+    r"""The vocabulary and the room layout of an env.
+
+    Args:
+        env_str: the env
+        room_size: the room size of the env
+        terminates_at: the last step of an episode
+
+    Returns:
+        entities, relations: what `gnn_vocab` returns, like in `DQNAgent`
+        rooms, objects: the room and the object entities
+        room_layout: [room, direction, room or "wall"] of every room and direction
+        terminates_at: the last step of an episode
+
+    """
+    env = gym.make(env_str, room_size=room_size, terminates_at=terminates_at)
+    entities, relations = gnn_vocab(env, QUALIFIER_COLUMNS)
+    vocab = {
+        "entities": entities,
+        "relations": relations,
+        "rooms": list(env.unwrapped.entities["room"]),
+        "objects": [
+            entity
+            for kind in ["static", "independent", "dependent"]
+            for entity in env.unwrapped.entities[kind]
+        ],
+        "room_layout": env.unwrapped.return_room_layout(False),
+        "terminates_at": env.unwrapped.terminates_at,
+    }
+    env.close()
+
+    return vocab
+
+
+def _observations(
+    vocab: dict, room: str, num: int, rng: random.Random
+) -> list[list[str]]:
+    # What the agent sees in `room`: itself, the room's edges, and some objects.
+    triples = [["agent", "atlocation", room]]
+    triples += [triple for triple in vocab["room_layout"] if triple[0] == room]
+    while len(triples) < num:
+        triples.append([rng.choice(vocab["objects"]), "atlocation", room])
+    return triples[:num]
+
+
+def _long_term_triple(vocab: dict, episodic: bool, rng: random.Random) -> list[str]:
+    draw = rng.random()
+    if draw < 0.5:
+        return [rng.choice(vocab["objects"]), "atlocation", rng.choice(vocab["rooms"])]
+    if draw < 0.9 or not episodic:
+        return list(rng.choice(vocab["room_layout"]))
+    # Only the episodic memory remembers where the agent was.
+    return ["agent", "atlocation", rng.choice(vocab["rooms"])]
+
+
+def generate_working_memory(
+    num_quadruples: int,
+    vocab: dict | None = None,
+    num_short: int = 15,
+    episodic_ratio: float = 0.5,
+    current_time: int | None = None,
+    seed: int | random.Random | None = None,
+) -> list[list]:
+    r"""Make a synthetic working memory.
+
+    Args:
+        num_quadruples: the number of quadruples, at least 1
+        vocab: what `make_vocab` returns. None is `make_vocab()`.
+        num_short: the number of short-term memories. It's capped by
+            `num_quadruples`, and the rest are long-term memories.
+        episodic_ratio: the fraction of the long-term memories that are episodic
+        current_time: the time of the short-term memories. None is a random time.
+        seed: the seed, or a random number generator to draw from
+
+    Returns:
+        [head, relation, tail, qualifiers] quadruples, the short-term memories
+        first. The first one is ["agent", "atlocation", room, {"current_time": ...}].
+
+    """
+    assert num_quadruples >= 1
+    vocab = vocab or make_vocab()
+    rng = seed if isinstance(seed, random.Random) else random.Random(seed)
+    terminates_at = vocab["terminates_at"]
+    if current_time is None:
+        current_time = rng.randint(0, terminates_at)
+    assert 0 <= current_time <= terminates_at
+
+    num_short = min(max(num_short, 1), num_quadruples)
+    room = rng.choice(vocab["rooms"])
+    state = [
+        triple + [{"current_time": current_time}]
+        for triple in _observations(vocab, room, num_short, rng)
+    ]
+
+    for _ in range(num_quadruples - num_short):
+        episodic = rng.random() < episodic_ratio
+        triple = _long_term_triple(vocab, episodic, rng)
+        if episodic:
+            num_timestamps = min(rng.randint(1, 3), current_time + 1)
+            timestamps = sorted(rng.sample(range(current_time + 1), num_timestamps))
+            state.append(triple + [{"timestamp": timestamps}])
+        else:
+            # A memory is strengthened at most once per step.
+            strength = round(rng.uniform(1, current_time + 1), 2)
+            state.append(triple + [{"strength": strength}])
+
+    return state
@@ -0,0 +1,196 @@
+"""Low-overhead timing of the phases of a `DQNAgent`.
+
+A `PhaseTimer` adds up the wall-clock time spent in named phases (e.g., "step.env_step",
+"gnn.process_batch", "update.backward"), counts events (e.g., env steps and updates),
+and keeps power-of-two histograms of sizes (e.g., the number of nodes of a batched
+graph). All of it is a handful of numbers per name, so the memory doesn't grow with
+the length of the training.
+
+Phases can be nested, e.g., "gnn.layers" inside "step.explore", and the time of a phase
+includes its nested phases. On CUDA, the kernels run asynchronously, so a phase only
+measures the time to launch them, unless the timer is made with `cuda_sync=True`.
+"""
+
+import time
+from contextlib import nullcontext
+
+import torch
+
+
+class _Phase:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer: "PhaseTimer", name: str) -> None:
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        if self.timer.cuda_sync:
+            torch.cuda.synchronize()
+        self.timer.add(self.name, time.perf_counter() - self.start)
+
+
+class PhaseTimer:
+    r"""Accumulate the time of phases, counts and size histograms.
+
+    Attributes:
+        enabled (bool): whether to time anything. A disabled timer costs one
+            attribute lookup per phase.
+        cuda_sync (bool): whether to wait for the CUDA kernels at the end of every
+            phase, so that they are timed too.
+        totals (dict[str, float]): the total seconds per phase
+        calls (dict[str, int]): the number of times per phase
+        counts (dict[str, int]): the counters
+        histograms (dict[str, dict[int, int]]): {name: {bucket: count}}. The bucket
+            of a size is the largest power of two that is not larger than it (0 for
+            0).
+        size_stats (dict[str, list[int]]): {name: [number, sum, min, max]} of the
+            sizes.
+
+    Example:
+    ```
+    timer = PhaseTimer()
+    with timer.phase("env_step"):
+        env.step(action)
+    timer.count("env_steps")
+    timer.observe("nodes", 42)
+    timer.summary()
+    ```
+
+    """
+
+    def __init__(self, enabled: bool = True, cuda_sync: bool = False) -> None:
+        """Initialize the timer. Its clock starts now.
+
+        Args:
+            enabled: whether to time anything
+            cuda_sync: whether to wait for the CUDA kernels at the end of every phase
+
+        """
+        self.enabled = enabled
+        self.cuda_sync = cuda_sync and torch.cuda.is_available()
+        self.reset()
+
+    def reset(self) -> None:
+        r"""Forget everything, and restart the clock."""
+        self.totals = {}
+        self.calls = {}
+        self.counts = {}
+        self.histograms = {}
+        self.size_stats = {}
+        self.start_time = time.perf_counter()
+
+    def phase(self, name: str):
+        r"""A context manager that times one phase.
+
+        Args:
+            name: the name of the phase
+
+        """
+        if not self.enabled:
+            return nullcontext()
+        return _Phase(self, name)
+
+    def add(self, name: str, seconds: float) -> None:
+        r"""Add the time of one call of a phase.
+
+        Args:
+            name: the name of the phase
+            seconds: the time it took
+
+        """
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name: str, num: int = 1) -> None:
+        r"""Increment a counter.
+
+        Args:
+            name: the name of the counter, e.g., "env_steps"
+            num: how much to add
+
+        """
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + num
+
+    def observe(self, name: str, size: int) -> None:
+        r"""Add a size to its histogram.
+
+        Args:
+            name: the name of the histogram, e.g., "nodes"
+            size: a non-negative integer
+
+        """
+        if not self.enabled:
+            return
+        size = int(size)
+        bucket = 1 << (size.bit_length() - 1) if size > 0 else 0
+        histogram = self.histograms.setdefault(name, {})
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+
+        stats = self.size_stats.setdefault(name, [0, 0, size, size])
+        stats[0] += 1
+        stats[1] += size
+        stats[2] = min(stats[2], size)
+        stats[3] = max(stats[3], size)
+
+    def summary(self) -> dict:
+        r"""Summarize what was timed so far, e.g., for `results.yaml`.
+
+        Returns:
+            elapsed_s: the wall-clock seconds since the clock was started
+            rates: {counter: per second of the wall clock}, e.g., "env_steps"
+            phases: {phase: {"total_s", "calls", "mean_ms", "fraction"}}, where the
+                fraction is of the wall clock, sorted by the total time
+            sizes: {histogram: {"mean", "min", "max", "histogram"}}
+
+        """
+        elapsed = time.perf_counter() - self.start_time
+        phases = {
+            name: {
+                "total_s": round(total, 4),
+                "calls": self.calls[name],
+                "mean_ms": round(1000 * total / self.calls[name], 4),
+                "fraction": round(total / elapsed, 4) if elapsed > 0 else 0.0,
+            }
+            for name, total in sorted(
+                self.totals.items(), key=lambda item: item[1], reverse=True
+            )
+        }
+        sizes = {
+            name: {
+                "mean": round(stats[1] / stats[0], 2),
+                "min": stats[2],
+                "max": stats[3],
+                "histogram": dict(sorted(self.histograms[name].items())),
+            }
+            for name, stats in self.size_stats.items()
+        }
+        return {
+            "elapsed_s": round(elapsed, 4),
+            "rates": {
+                name: round(num / elapsed, 2) if elapsed > 0 else 0.0
+                for name, num in self.counts.items()
+            },
+            "phases": phases,
+            "sizes": sizes,
+        }
+
+
+def format_summary(summary: dict, num_phases: int = 5) -> str:
+    r"""Put a timing summary in a line or two, for the console.
+
+    Args:
+        summary: what `PhaseTimer.summary` returns
+        num_phases: the number of the slowest phases to show
+
+    """
+    rates = ", ".join(f"{name}/s: {rate}" for name, rate in summary["rates"].items())
+    phases = ", ".join(
+        f"{name} {round(100 * phase['fraction'], 1)}%"
+        for name, phase in list(summary["phases"].items())[:num_phases]
+    )
+    return f"{rates}\ntime spent in: {phases}"
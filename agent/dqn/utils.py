@@ -1,23 +1,24 @@
 """Utility functions for DQN."""
 
 import os
-import random
 from typing import Literal
 
+import gymnasium as gym
 import matplotlib.pyplot as plt
 import numpy as np
 import torch
 import torch.nn.functional as F
-from humemai.utils import (
-    argmax,
-    is_running_notebook,
-    list_duplicates_of,
-    write_pickle,
-    write_yaml,
-)
+from humemai.utils import is_running_notebook, write_pickle, write_yaml
 from IPython.display import clear_output
+from torch.profiler import record_function
 from tqdm.auto import tqdm
 
+from .artifacts import ArtifactWriter
+from .checkpoints import CheckpointManager
+from .distributed import all_reduce_gradients
+from .evaluation import snapshot_state_dict
+from .timing import PhaseTimer, format_summary
+
 
 class ReplayBuffer:
     r"""A simple numpy replay buffer.
@@ -96,6 +97,9 @@ class ReplayBuffer:
 
     """
 
+    # The version of the file format of `save`.
+    format_version = 2
+
     def __init__(
         self,
         size: int,
@@ -196,6 +200,203 @@ class ReplayBuffer:
     def __len__(self) -> int:
         return self.size
 
+    def save(self, path: str, entities: list[str], relations: list[str]) -> None:
+        r"""Save the buffer into one uncompressed `.npz` file.
+
+        The states are packed losslessly into flat numeric arrays with `pack_states`,
+        and the mm actions are padded, so that nothing is pickled. A buffer loaded
+        with `load` samples exactly the same transitions.
+
+        Args:
+            path: the file to write
+            entities: entity vocabulary, e.g., `agent.dqn_params["entities"]`
+            relations: relation vocabulary, e.g., `agent.dqn_params["relations"]`
+
+        """
+        entity_to_idx = {e: i for i, e in enumerate(entities)}
+        relation_to_idx = {r: i for i, r in enumerate(relations)}
+        num = self.size
+
+        arrays = {
+            "format_version": np.array(self.format_version),
+            "max_size": np.array(self.max_size),
+            "ptr": np.array(self.ptr),
+            "size": np.array(self.size),
+            "acts_explore": self.acts_explore_buf[:num],
+            "rews_explore": self.rews_explore_buf[:num],
+            "rews_mm": self.rews_mm_buf[:num],
+            "done": self.done_buf[:num],
+        }
+        for key, buf in [("obs", self.obs_buf), ("next_obs", self.next_obs_buf)]:
+            packed = pack_states(buf[:num], entity_to_idx, relation_to_idx)
+            arrays.update({f"{key}_{name}": val for name, val in packed.items()})
+
+        acts_mm = [np.asarray(acts).reshape(-1) for acts in self.acts_mm_buf[:num]]
+        arrays["acts_mm_len"] = np.array([len(acts) for acts in acts_mm], dtype=int)
+        arrays["acts_mm"] = np.zeros(
+            (num, max([len(acts) for acts in acts_mm] + [0])), dtype=np.int64
+        )
+        for idx, acts in enumerate(acts_mm):
+            arrays["acts_mm"][idx, : len(acts)] = acts
+
+        with open(path, "wb") as stream:
+            np.savez(stream, **arrays)
+
+    def load(self, path: str, entities: list[str], relations: list[str]) -> None:
+        r"""Load the buffer saved by `save`, in place.
+
+        Args:
+            path: the file to read
+            entities: entity vocabulary used for saving
+            relations: relation vocabulary used for saving
+
+        Raises:
+            ValueError: If the saved buffer has a different format or size.
+
+        """
+        with np.load(path) as arrays:
+            if "format_version" not in arrays or (
+                int(arrays["format_version"]) != self.format_version
+            ):
+                raise ValueError(f"{path} is not in the current format of the buffer")
+            if int(arrays["max_size"]) != self.max_size:
+                raise ValueError(
+                    f"The saved buffer has size {int(arrays['max_size'])}, but this "
+                    f"one has size {self.max_size}"
+                )
+            num = int(arrays["size"])
+            self.ptr, self.size = int(arrays["ptr"]), num
+
+            self.acts_explore_buf[:num] = arrays["acts_explore"]
+            self.rews_explore_buf[:num] = arrays["rews_explore"]
+            self.rews_mm_buf[:num] = arrays["rews_mm"]
+            self.done_buf[:num] = arrays["done"]
+
+            for key, buf in [("obs", self.obs_buf), ("next_obs", self.next_obs_buf)]:
+                packed = {name: arrays[f"{key}_{name}"] for name in PACKED_STATE_ARRAYS}
+                for idx, state in enumerate(unpack_states(packed, entities, relations)):
+                    buf[idx] = state
+
+            acts_mm = arrays["acts_mm"]
+            for idx, length in enumerate(arrays["acts_mm_len"]):
+                self.acts_mm_buf[idx] = acts_mm[idx, :length].copy()
+
+
+# The arrays of `pack_states`.
+PACKED_STATE_ARRAYS = (
+    "state_len",
+    "triples",
+    "qual_len",
+    "qual_key",
+    "qual_names",
+    "qual_is_list",
+    "value_len",
+    "value",
+    "value_is_int",
+)
+
+
+def pack_states(
+    states: list[list[list]],
+    entity_to_idx: dict[str, int],
+    relation_to_idx: dict[str, int],
+) -> dict[str, np.ndarray]:
+    r"""Pack states (lists of quadruples) losslessly into flat numeric arrays.
+
+    Unlike `encode_state`, which keeps only what the GNN reads, every qualifier is
+    kept, in its order, with all of its timestamps, and ints stay ints. The arrays
+    are concatenated over the states, memories, qualifiers and values, with the
+    number of items of each in the `*_len` arrays.
+
+    Args:
+        states: the states
+        entity_to_idx: mapping from entities to indices
+        relation_to_idx: mapping from relations to indices
+
+    Returns:
+        the arrays named in `PACKED_STATE_ARRAYS`
+
+    """
+    state_len, triples = [], []
+    qual_len, qual_key, qual_is_list = [], [], []
+    value_len, value, value_is_int = [], [], []
+    qual_names = {}
+    for state in states:
+        state_len.append(len(state))
+        for head, relation, tail, qualifiers in state:
+            triples.append(
+                (entity_to_idx[head], relation_to_idx[relation], entity_to_idx[tail])
+            )
+            qual_len.append(len(qualifiers))
+            for key, val in qualifiers.items():
+                qual_key.append(qual_names.setdefault(key, len(qual_names)))
+                qual_is_list.append(isinstance(val, list))
+                vals = val if isinstance(val, list) else [val]
+                value_len.append(len(vals))
+                value.extend(vals)
+                value_is_int.extend(isinstance(v, (int, np.integer)) for v in vals)
+
+    return {
+        "state_len": np.array(state_len, dtype=np.int64),
+        "triples": np.array(triples, dtype=np.int32).reshape(-1, 3),
+        "qual_len": np.array(qual_len, dtype=np.int64),
+        "qual_key": np.array(qual_key, dtype=np.int64),
+        "qual_names": np.array(list(qual_names), dtype=str),
+        "qual_is_list": np.array(qual_is_list, dtype=bool),
+        "value_len": np.array(value_len, dtype=np.int64),
+        "value": np.array(value, dtype=np.float64),
+        "value_is_int": np.array(value_is_int, dtype=bool),
+    }
+
+
+def unpack_states(
+    arrays: dict[str, np.ndarray], entities: list[str], relations: list[str]
+) -> list[list[list]]:
+    r"""Unpack the states packed by `pack_states`.
+
+    Args:
+        arrays: the arrays returned by `pack_states`
+        entities: entity vocabulary used for packing
+        relations: relation vocabulary used for packing
+
+    Returns:
+        states: the states, equal to the packed ones
+
+    """
+    triples = arrays["triples"].tolist()
+    qual_len = arrays["qual_len"].tolist()
+    qual_key = arrays["qual_key"].tolist()
+    qual_names = arrays["qual_names"].tolist()
+    qual_is_list = arrays["qual_is_list"].tolist()
+    value_len = arrays["value_len"].tolist()
+    value = [
+        int(val) if is_int else val
+        for val, is_int in zip(
+            arrays["value"].tolist(), arrays["value_is_int"].tolist()
+        )
+    ]
+
+    states = []
+    mem_idx = qual_idx = value_idx = 0
+    for num_memories in arrays["state_len"].tolist():
+        state = []
+        for head, relation, tail in triples[mem_idx : mem_idx + num_memories]:
+            qualifiers = {}
+            for _ in range(qual_len[mem_idx]):
+                vals = value[value_idx : value_idx + value_len[qual_idx]]
+                qualifiers[qual_names[qual_key[qual_idx]]] = (
+                    vals if qual_is_list[qual_idx] else vals[0]
+                )
+                value_idx += value_len[qual_idx]
+                qual_idx += 1
+            state.append(
+                [entities[head], relations[relation], entities[tail], qualifiers]
+            )
+            mem_idx += 1
+        states.append(state)
+
+    return states
+
 
 def plot_results(
     scores: dict[str, list[float]],
@@ -210,6 +411,7 @@ def plot_results(
     action_explore2str,
     to_plot: str = "all",
     save_fig: bool = False,
+    timing: dict | None = None,
 ) -> None:
     r"""Plot things for DQN training.
 
@@ -233,6 +435,7 @@ def plot_results(
             "q_value_val": plot q_values for validation
             "q_value_test": plot q_values for test
         save_fig: whether to save the figure or not
+        timing: the summary of a `PhaseTimer`, to print to the console, if any.
 
     """
     is_notebook = is_running_notebook()
@@ -415,9 +618,10 @@ def console(
     iteration_idx: int,
     num_iterations: int,
     total_maximum_episode_rewards: int,
+    timing: dict | None = None,
     **kwargs,
 ) -> None:
-    r"""Print the dqn training to the console."""
+    r"""Print the dqn training to the console. `timing` is a `PhaseTimer.summary`."""
     if scores["train"]:
         tqdm.write(
             f"iteration {iteration_idx} out of {num_iterations}.\n"
@@ -439,6 +643,8 @@ def console(
         )
 
     tqdm.write(f"training loss (all): {training_loss['total'][-1]}\n")
+    if timing is not None:
+        tqdm.write(format_summary(timing) + "\n")
     print()
 
 
@@ -446,20 +652,21 @@ def save_final_results(
     scores: dict[str, list[float]],
     training_loss: dict[str, list[float]],
     default_root_dir: str,
-    q_values: dict[str, dict[str, list[float]]],
     self: object,
     save_the_agent: bool = False,
+    timing: dict | None = None,
 ) -> None:
-    r"""Save dqn train / val / test results.
+    r"""Save dqn train / val / test results. The q-values are not saved here, since
+    their `MetricSeries` already wrote them to `default_root_dir/metrics`.
 
     Args:
         scores: a dictionary of scores for train, validation, and test.
         training_loss: a dict of training losses for all, mm, and explore.
         training_loss_explore: a list of training losses for explore.
         default_root_dir: the root directory where the results are saved.
-        q_values: a dictionary of q_values for train, validation, and test.
         self: the agent object.
         save_the_agent: whether to save the agent or not.
+        timing: the summary of a `PhaseTimer`, if any.
 
     """
     results = {
@@ -475,16 +682,12 @@ def save_final_results(
             "mean": round(np.mean(scores["test"]).item(), 2),
             "std": round(np.std(scores["test"]).item(), 2),
         },
-        "training_loss": training_loss,
+        "training_loss": {key: list(val) for key, val in training_loss.items()},
     }
+    if timing is not None:
+        results["timing"] = timing
     write_yaml(results, os.path.join(default_root_dir, "results.yaml"))
 
-    q_values_list = {
-        key: {key_: [val__.tolist() for val__ in val_] for key_, val_ in val.items()}
-        for key, val in q_values.items()
-    }
-
-    write_yaml(q_values_list, os.path.join(default_root_dir, "q_values.yaml"))
     if save_the_agent:
         write_pickle(self, os.path.join(default_root_dir, "agent.pkl"))
 
@@ -705,7 +908,10 @@ def update_model(
     dqn_target: torch.nn.Module,
     ddqn: str,
     gamma: dict[str, float],
-) -> tuple[float, float, float]:
+    distributed: bool = False,
+    sync_losses: bool = True,
+    timer: PhaseTimer | None = None,
+) -> tuple[float, float, float] | tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
     r"""Update the model by gradient descent.
 
     Args:
@@ -716,13 +922,24 @@ def update_model(
         dqn_target: dqn target model
         ddqn: whether to use double dqn or not
         gamma: discount factor
+        distributed: whether to average the gradients across the ranks of the
+            `torch.distributed` process group before the optimizer step. The
+            returned losses are the local ones.
+        sync_losses: whether to return the losses as floats. Otherwise they are
+            returned as detached 0-dim tensors, so that they can be read later in a
+            batch (e.g., by `MetricSeries`), without waiting for the device here.
+        timer: the timer of the phases of the update. None is not to time them.
 
     Returns:
         loss_mm, loss_explore, loss_combined: TD losses for memory management,
             explore and combined
 
     """
-    batch = replay_buffer.sample_batch()
+    if timer is None:
+        timer = PhaseTimer(enabled=False)
+
+    with timer.phase("update.sample_batch"), record_function("update.sample_batch"):
+        batch = replay_buffer.sample_batch()
     batch_mm = {
         "obs": batch["obs"],
         "acts": batch["acts_mm"],
@@ -738,21 +955,32 @@ def update_model(
         "done": batch["done"],
     }
 
-    loss_mm = compute_loss_mm(batch_mm, device, dqn, dqn_target, ddqn, gamma["mm"])
-    loss_explore = compute_loss_explore(
-        batch_explore,
-        device,
-        dqn,
-        dqn_target,
-        ddqn,
-        gamma["explore"],
-    )
+    with timer.phase("update.loss_mm"), record_function("update.loss_mm"):
+        loss_mm = compute_loss_mm(batch_mm, device, dqn, dqn_target, ddqn, gamma["mm"])
+    with timer.phase("update.loss_explore"), record_function("update.loss_explore"):
+        loss_explore = compute_loss_explore(
+            batch_explore,
+            device,
+            dqn,
+            dqn_target,
+            ddqn,
+            gamma["explore"],
+        )
 
     loss = loss_mm + loss_explore
 
     optimizer.zero_grad()
-    loss.backward()
-    optimizer.step()
+    with timer.phase("update.backward"), record_function("update.backward"):
+        loss.backward()
+    if distributed:
+        with timer.phase("update.all_reduce"):
+            all_reduce_gradients(dqn)
+    with timer.phase("update.optimizer_step"), record_function("update.optimizer_step"):
+        optimizer.step()
+    timer.count("updates")
+
+    if not sync_losses:
+        return loss_mm.detach(), loss_explore.detach(), loss.detach()
 
     loss_mm = loss_mm.detach().cpu().numpy().item()
     loss_explore = loss_explore.detach().cpu().numpy().item()
@@ -803,50 +1031,34 @@ def select_action(
 def save_validation(
     scores_temp: list,
     scores: dict,
-    default_root_dir: str,
     num_episodes: int,
     validation_interval: int,
-    val_file_names: list,
-    dqn: torch.nn.Module,
+    checkpoints: CheckpointManager,
+    dqn: torch.nn.Module | dict,
 ) -> None:
-    r"""Keep the best validation model.
+    r"""Keep the best validation model. It's written in the background.
 
     Args:
         policy: "mm", "explore", or None.
         scores_temp: a list of validation scores for the current validation episode.
         scores: a dictionary of scores for train, validation, and test.
-        default_root_dir: the root directory where the results are saved.
         num_episodes: number of episodes run so far
         validation_interval: the interval to validate the model.
-        val_file_names: a list of dirnames for the validation models.
-        dqn: the dqn model.
+        checkpoints: the manager of the best validation models.
+        dqn: the dqn model, or its state dict (e.g., a snapshot taken when the
+            validation started).
 
     """
     mean_score = round(np.mean(scores_temp).item())
-
-    filename = os.path.join(
-        default_root_dir, f"episode={num_episodes}_val-score={mean_score}.pt"
+    checkpoints.save(
+        dqn if isinstance(dqn, dict) else snapshot_state_dict(dqn),
+        episode=num_episodes,
+        score=mean_score,
     )
-    torch.save(dqn.state_dict(), filename)
-
-    val_file_names.append(filename)
 
     for _ in range(validation_interval):
         scores["val"].append(scores_temp)
 
-    scores_to_compare = []
-    for fn in val_file_names:
-        score = int(fn.split("val-score=")[-1].split(".pt")[0])
-        scores_to_compare.append(score)
-
-    indexes = list_duplicates_of(scores_to_compare, max(scores_to_compare))
-    file_to_keep = val_file_names[indexes[-1]]
-
-    for fn in val_file_names:
-        if fn != file_to_keep:
-            os.remove(fn)
-            val_file_names.remove(fn)
-
 
 def save_states_q_values_actions(
     states: list[list[list]],
@@ -856,7 +1068,8 @@ def save_states_q_values_actions(
     val_or_test: str,
     num_episodes: int | None = None,
 ) -> None:
-    r"""Save states, q_values, and actions.
+    r"""Save states, q_values, and actions, as an artifact with one row per step
+    (see `ArtifactWriter`).
 
     Args:
         states: a list of states.
@@ -868,25 +1081,26 @@ def save_states_q_values_actions(
 
     """
     filename_template = (
-        f"states_q_values_actions_val_episode={num_episodes}.yaml"
+        f"states_q_values_actions_val_episode={num_episodes}"
         if val_or_test.lower() == "val"
-        else "states_q_values_actions_test.yaml"
+        else "states_q_values_actions_test"
     )
 
     filename = os.path.join(default_root_dir, filename_template)
 
     assert len(states) == len(q_values) == len(actions)
-    to_save = [
-        {
-            "state": s,
-            "q_values_explore": q["explore"].tolist(),
-            "action_explore": a["explore"].tolist(),
-            "q_values_mm": q["mm"].tolist(),
-            "action_mm": a["mm"].tolist(),
-        }
-        for s, q, a in zip(states, q_values, actions)
-    ]
-    write_yaml(to_save, filename)
+    writer = ArtifactWriter(filename)
+    for s, q, a in zip(states, q_values, actions):
+        writer.append(
+            {
+                "state": s,
+                "q_values_explore": np.asarray(q["explore"]),
+                "action_explore": np.asarray(a["explore"]),
+                "q_values_mm": np.asarray(q["mm"]),
+                "action_mm": np.asarray(a["mm"]),
+            }
+        )
+    writer.close()
 
 
 def target_hard_update(
@@ -922,3 +1136,32 @@ def update_epsilon(
     )
 
     return epsilon
+
+
+def gnn_vocab(
+    env: gym.Env, qualifier_relations: list[str]
+) -> tuple[list[str], list[str]]:
+    r"""The entities and the relations that the GNN embeds.
+
+    Args:
+        env: a RoomEnv-v2
+        qualifier_relations: the qualifier relations of the memory systems
+
+    Returns:
+        entities: the entities of the env, and the numbers 0 to terminates_at + 1
+        relations: the relations of the env, their inverses, and the qualifier
+            relations
+
+    """
+    entities = [e for entities in env.unwrapped.entities.values() for e in entities]
+    # We are gonna treat the real numbers 0, 1, ..., 100 as entities. This is
+    # very stupid, but it is what it is.
+    entities += [str(i) for i in range(env.unwrapped.terminates_at + 2)]
+    # Main triple relations have "inv", while qualifier relations don't have "inv".
+    relations = (
+        env.unwrapped.relations
+        + [rel + "_inv" for rel in env.unwrapped.relations]
+        + list(qualifier_relations)
+    )
+
+    return entities, relations
@@ -0,0 +1,148 @@
+"""A pool of envs, so that an env config is made once per process.
+
+Making a RoomEnv-v2 builds its rooms and objects from its config, and an agent used to
+make a new env for every run, and for its test. `get_env` checks out a free env that
+was already made for the same env string and config, whatever the seed, and reseeds it
+like a new env with the seed would be:
+
+- RoomEnv-v2 seeds the global random number generators when it's made, draws its
+  objects, and its `reset()` draws from them again. So they are seeded again, with
+  `seed_everything`, and the objects are drawn again.
+- An env with its own random number generator, `rng`, like `LocalRoomEnv`, has it
+  seeded.
+
+The history that RoomEnv-v2 accumulates over its episodes, e.g., `observations_all`,
+is emptied too. An env is handed out to one user at a time: it's checked out until
+it's put back with `put_env`, and a new env is made if all the envs of a config are
+checked out. An agent puts its env back at the end of its `test()`, or when it's
+garbage collected. The envs of the pool are never closed by the agents, only by
+`EnvPool.close_all`. Every process has its own pool, e.g., every evaluation worker.
+
+```
+env = get_env("room_env:RoomEnv-v2", {**env_config, "seed": 0})
+...
+put_env(env)
+```
+"""
+
+import json
+import random
+
+import gymnasium as gym
+
+from .utils import seed_everything
+
+
+class EnvPool:
+    r"""Envs by (env string, env config without the seed).
+
+    Attributes:
+        free (dict[tuple[str, str], list[gym.Env]]): the envs that can be checked out
+        checked_out (dict[int, tuple[tuple[str, str], gym.Env]]): {id(env): (key,
+            env)} of the envs that are checked out
+
+    """
+
+    def __init__(self) -> None:
+        self.free = {}
+        self.checked_out = {}
+
+    @staticmethod
+    def key(env_str: str, env_config: dict) -> tuple[str, str]:
+        r"""The key of an env, which doesn't depend on the seed."""
+        config = {key: val for key, val in env_config.items() if key != "seed"}
+        return env_str, json.dumps(config, sort_keys=True)
+
+    def get(self, env_str: str, env_config: dict) -> gym.Env:
+        r"""Check out an env of a config. A free one is reseeded and its history is
+        emptied, and one is made if there is none.
+
+        Args:
+            env_str: the env, e.g., "room_env:RoomEnv-v2"
+            env_config: the keyword arguments of the env, with or without the seed
+
+        Returns:
+            env: the env, which must not be closed, only put back with `put`
+
+        """
+        key = self.key(env_str, env_config)
+        free = self.free.get(key)
+        if free:
+            env = free.pop()
+            clear_history(env)
+            if "seed" in env_config:
+                reseed(env, env_config["seed"])
+        else:
+            env = gym.make(env_str, **env_config)
+        self.checked_out[id(env)] = (key, env)
+
+        return env
+
+    def put(self, env: gym.Env) -> None:
+        r"""Put back an env that was checked out with `get`.
+
+        Args:
+            env: the env
+
+        """
+        if id(env) not in self.checked_out:
+            raise ValueError("The env is not checked out of the pool.")
+        key, env = self.checked_out.pop(id(env))
+        self.free.setdefault(key, []).append(env)
+
+    def close_all(self) -> None:
+        r"""Close all the envs, free or checked out, and empty the pool."""
+        for envs in self.free.values():
+            for env in envs:
+                env.close()
+        for _, env in self.checked_out.values():
+            env.close()
+        self.free.clear()
+        self.checked_out.clear()
+
+    def __len__(self) -> int:
+        return sum(map(len, self.free.values())) + len(self.checked_out)
+
+
+def reseed(env: gym.Env, seed: int) -> None:
+    r"""Seed an env that was already made, like a new one with `seed` would be.
+
+    Args:
+        env: the env
+        seed: the seed
+
+    """
+    unwrapped = env.unwrapped
+    unwrapped.seed = seed
+    if isinstance(getattr(unwrapped, "rng", None), random.Random):
+        unwrapped.rng.seed(seed)
+    else:
+        seed_everything(seed)
+        if hasattr(unwrapped, "_create_objects"):
+            unwrapped._create_objects()
+
+
+# What RoomEnv-v2 appends to on every reset and step.
+HISTORY = ["hidden_global_states_all", "observations_all", "answers_all", "info_all"]
+
+
+def clear_history(env: gym.Env) -> None:
+    r"""Empty the history that an env accumulated over its episodes, if it has one."""
+    unwrapped = env.unwrapped
+    for name in HISTORY:
+        if hasattr(unwrapped, name):
+            setattr(unwrapped, name, [])
+
+
+# The pool of this process.
+env_pool = EnvPool()
+
+
+def get_env(env_str: str, env_config: dict) -> gym.Env:
+    r"""`env_pool.get(env_str, env_config)`, which is checked out until `put_env`."""
+    return env_pool.get(env_str, env_config)
+
+
+def put_env(env: gym.Env) -> None:
+    r"""`env_pool.put(env)`."""
+    env_pool.put(env)
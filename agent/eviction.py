@@ -0,0 +1,215 @@
+"""An index of the long-term memory for choosing what to forget when it's full.
+
+`LongMemory.count_memories` and `LongMemory.forget_by_selection` scan the whole
+long-term memory, and `manage_memory` calls both every time that it moves a short-term
+memory into a full long-term memory. `EvictionIndex` keeps the counts and two min-heaps
+instead, one on the timestamps and one on the strengths, so that the same choices cost
+O(log n).
+
+The heaps use lazy deletion: an item is left in its heap when its memory is forgotten
+or changes, and it's dropped when it reaches the top and no longer matches the
+memory. The index is told about every add and forget by `manage_memory`, and the
+long-term memory is decayed through `EvictionIndex.decay`, which changes all the
+strengths at once. A decay scales them all by the same factor, which keeps their
+order, so the strength heap is updated in place, and it's only heapified again when
+clamping strengths to the minimum strength makes ties.
+
+The choices are the ones of `forget_by_selection`:
+- "oldest" is the memory whose earliest timestamp is the smallest.
+- "weakest" is the memory whose strength is the smallest.
+Ties are broken by the order of the memories in `LongMemory.entries`.
+"""
+
+import heapq
+from typing import Literal
+
+from humemai.memory import LongMemory
+
+
+class EvictionIndex:
+    r"""Counts and min-heaps of the long-term memory.
+
+    Attributes:
+        long (LongMemory): the long-term memory that is indexed
+        num_timestamps (int): the number of memories that have timestamps
+        num_strengths (int): the number of memories that have a strength
+
+    Example:
+    ```
+    index = EvictionIndex(memory_systems.long)
+    manage_memory(memory_systems, "episodic", mem_short, eviction_index=index)
+    index.decay()  # instead of memory_systems.long.decay()
+    ```
+
+    """
+
+    def __init__(self, long: LongMemory) -> None:
+        """Index a long-term memory.
+
+        Args:
+            long: the long-term memory, e.g., `memory_systems.long`
+
+        """
+        self.long = long
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        r"""Index the long-term memory from scratch, e.g., after it decayed."""
+        self._seq = {}  # {triple: its order in the entries}
+        self._mems = {}  # {triple: the memory in the entries}
+        self._keys = {}  # {triple: (earliest timestamp, strength)}
+        self._oldest = []  # [(earliest timestamp, seq, triple)]
+        self._weakest = []  # [(strength, seq, triple)]
+        self._next_seq = 0
+        self.num_timestamps = 0
+        self.num_strengths = 0
+        for mem in self.long.entries:
+            self._track(mem)
+
+    def _track(self, mem: list) -> None:
+        triple = tuple(mem[:3])
+        if triple not in self._seq:
+            self._seq[triple] = self._next_seq
+            self._next_seq += 1
+        seq = self._seq[triple]
+        self._mems[triple] = mem
+
+        qualifiers = mem[3]
+        oldest = min(qualifiers["timestamp"]) if "timestamp" in qualifiers else None
+        strength = qualifiers.get("strength")
+        old_oldest, old_strength = self._keys.get(triple, (None, None))
+        self._keys[triple] = (oldest, strength)
+
+        self.num_timestamps += (oldest is not None) - (old_oldest is not None)
+        self.num_strengths += (strength is not None) - (old_strength is not None)
+        if oldest is not None and oldest != old_oldest:
+            heapq.heappush(self._oldest, (oldest, seq, triple))
+        if strength is not None and strength != old_strength:
+            heapq.heappush(self._weakest, (strength, seq, triple))
+
+    def add(self, mem: list) -> None:
+        r"""Index a memory right after it was added to the long-term memory.
+
+        The memory is looked up in the long-term memory, since it may have been merged
+        with one of the same triple there.
+
+        Args:
+            mem: the memory that was added
+
+        """
+        triple = tuple(mem[:3])
+        entries = self.long.entries
+        known = self._mems.get(triple)
+        if known is not None and all(key in known[3] for key in mem[3]):
+            # Merged into the memory of the same triple, which is updated in place.
+            self._track(known)
+            return
+        if entries and tuple(entries[-1][:3]) == triple:
+            self._track(entries[-1])
+            return
+        for entry in entries:
+            if tuple(entry[:3]) == triple:
+                self._track(entry)
+                return
+        raise ValueError(f"{mem} is not in the long-term memory.")
+
+    def forget(self, mem: list) -> None:
+        r"""Drop a memory right after it was forgotten from the long-term memory.
+
+        Args:
+            mem: the memory that was forgotten
+
+        """
+        triple = tuple(mem[:3])
+        oldest, strength = self._keys.pop(triple)
+        del self._seq[triple], self._mems[triple]
+        self.num_timestamps -= oldest is not None
+        self.num_strengths -= strength is not None
+
+    def __contains__(self, triple: tuple) -> bool:
+        r"""Whether the long-term memory has a memory of a (head, relation, tail)."""
+        return triple in self._seq
+
+    def count_memories(self) -> tuple[int, int]:
+        r"""Like `LongMemory.count_memories`.
+
+        Returns:
+            num_timestamps, num_strengths
+
+        """
+        return self.num_timestamps, self.num_strengths
+
+    def _top(self, heap: list, slot: int) -> tuple | None:
+        # The top valid item of a heap, after dropping the stale ones above it.
+        while heap:
+            key, seq, triple = heap[0]
+            if self._seq.get(triple) == seq and self._keys[triple][slot] == key:
+                return triple
+            heapq.heappop(heap)
+        return None
+
+    def select(self, selection: Literal["oldest", "weakest"]) -> list:
+        r"""The memory that `forget_by_selection(selection)` would forget.
+
+        Args:
+            selection: "oldest" or "weakest"
+
+        Returns:
+            mem: the memory, as it's in the long-term memory
+
+        """
+        if selection == "oldest":
+            triple = self._top(self._oldest, 0)
+        elif selection == "weakest":
+            triple = self._top(self._weakest, 1)
+        else:
+            raise ValueError(f"Unknown selection: {selection}")
+        if triple is None:
+            raise ValueError(f"There is no memory to select as the {selection}.")
+
+        return self._mems[triple]
+
+    def forget_by_selection(self, selection: Literal["oldest", "weakest"]) -> None:
+        r"""Like `LongMemory.forget_by_selection`, but in O(log n) to select.
+
+        Args:
+            selection: "oldest" or "weakest"
+
+        """
+        mem = self.select(selection)
+        self.long.forget(mem)
+        self.forget(mem)
+
+    def decay(self) -> None:
+        r"""Decay the long-term memory, like `long.decay()`, and update the index.
+
+        Nothing is done when the decay doesn't change any strength, i.e., when the
+        decay factor is 1 and no strength is under the minimum strength.
+
+        """
+        factor = self.long.semantic_decay_factor
+        min_strength = self.long.min_strength
+        weakest = self._top(self._weakest, 1)
+        if factor == 1 and (weakest is None or self._keys[weakest][1] >= min_strength):
+            return
+
+        self.long.decay()
+        decayed = {
+            triple: self._mems[triple][3]["strength"]
+            for triple, (_, strength) in self._keys.items()
+            if strength is not None
+        }
+        ties = False
+        for i, (strength, seq, triple) in enumerate(self._weakest):
+            if self._seq.get(triple) == seq and self._keys[triple][1] == strength:
+                new = decayed[triple]
+            else:
+                # A stale item, which stays stale or becomes a copy of the valid one.
+                new = max(strength * factor, min_strength)
+            # Only the strengths clamped to the minimum can make ties.
+            ties = ties or new != strength * factor
+            self._weakest[i] = (new, seq, triple)
+        for triple, strength in decayed.items():
+            self._keys[triple] = (self._keys[triple][0], strength)
+        if ties:
+            heapq.heapify(self._weakest)
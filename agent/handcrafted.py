@@ -3,6 +3,7 @@
 import datetime
 import os
 import shutil
+import weakref
 from copy import deepcopy
 from typing import Literal
 
@@ -11,8 +12,12 @@ import numpy as np
 from humemai.memory import LongMemory, MemorySystems, ShortMemory
 from humemai.utils import write_yaml
 
-from .policy import (answer_question, encode_all_observations, explore,
-                     manage_memory)
+from .env_pool import get_env, put_env
+from .eviction import EvictionIndex
+from .policy import (answer_questions, explore, ingest_observations,
+                     manage_all_memories)
+from .pretrain import pretrain_semantic
+from .topology import RoomTopology
 
 
 class HandcraftedAgent:
@@ -50,6 +55,7 @@ class HandcraftedAgent:
         pretrain_semantic: Literal[False, "include_walls", "exclude_walls"] = False,
         semantic_decay_factor: float = 1.0,
         default_root_dir: str = "./training-results/",
+        env: gym.Env | None = None,
     ) -> None:
         """Initialize the agent.
 
@@ -67,9 +73,11 @@ class HandcraftedAgent:
             pretrain_semantic: Whether or not to pretrain the semantic memory system.
             semantic_decay_factor: The decay factor for the semantic memory system.
             default_root_dir: default root directory to store the results.
+            env: an already made env with `env_config`, to use instead of the one
+                of the `env_pool`.
 
         """
-        params_to_save = deepcopy(locals())
+        params_to_save = deepcopy({k: v for k, v in locals().items() if k != "env"})
         del params_to_save["self"]
 
         self.env_str = env_str
@@ -97,7 +105,14 @@ class HandcraftedAgent:
         self.capacity = capacity
         self.pretrain_semantic = pretrain_semantic
         self.semantic_decay_factor = semantic_decay_factor
-        self.env = gym.make(self.env_str, **self.env_config)
+        if env is None:
+            self.env = get_env(self.env_str, self.env_config)
+            # Put back into the pool by `release_env`, or when the agent is garbage
+            # collected.
+            self._env_finalizer = weakref.finalize(self, put_env, self.env)
+        else:
+            self.env = env
+            self._env_finalizer = None
         self.default_root_dir = os.path.join(
             default_root_dir, str(datetime.datetime.now())
         )
@@ -112,6 +127,13 @@ class HandcraftedAgent:
         """Remove the results from the disk."""
         shutil.rmtree(self.default_root_dir)
 
+    def release_env(self) -> None:
+        """Put the env back into the `env_pool`, if it's from there. The agent can't
+        play after this."""
+        if self._env_finalizer is not None:
+            self._env_finalizer()
+        self.env = None
+
     def init_memory_systems(self, reset_semantic_decay: bool = True) -> None:
         """Initialize the agent's memory systems. This has nothing to do with the
         replay buffer.
@@ -136,9 +158,8 @@ class HandcraftedAgent:
                 exclude_walls = True
             else:
                 exclude_walls = False
-            room_layout = self.env.unwrapped.return_room_layout(exclude_walls)
-
-            self.memory_systems.long.pretrain_semantic(semantic_knowledge=room_layout)
+            # Made once per room layout, and copied on every reset.
+            pretrain_semantic(self.memory_systems.long, self.env, exclude_walls)
 
             if self.pretrain_semantic == "include_walls":
                 assert self.memory_systems.long.size > 0
@@ -147,70 +168,83 @@ class HandcraftedAgent:
             else:
                 assert self.memory_systems.long.size > 0
 
+        self.eviction_index = EvictionIndex(self.memory_systems.long)
+        self.topology = RoomTopology(self.eviction_index)
         if reset_semantic_decay:
             self.num_semantic_decayed = 0
 
-    def test(self):
-        """Test the agent. There is no training for this agent, since it is
-        handcrafted."""
-        self.scores = []
-
-        for _ in range(self.num_samples_for_results):
-            score = 0
-            env_started = False
-            action_pair = ([], None)
-            done = False
-            self.init_memory_systems(reset_semantic_decay=True)
-
-            while not done:
-                if env_started:
-                    (
-                        observations,
-                        reward,
-                        done,
-                        truncated,
-                        info,
-                    ) = self.env.step(action_pair)
-                    self.memory_systems.long.decay()
-                    self.num_semantic_decayed += 1
-
-                    score += reward
-
-                    if done:
-                        assert (
-                            self.num_semantic_decayed
-                            == self.env_config["terminates_at"] + 1
-                        )
-                        break
-
-                else:
-                    observations, info = self.env.reset()
-                    env_started = True
-
-                # 0. Encode the observations as short-term memory
-                encode_all_observations(self.memory_systems, observations["room"])
-
-                # 1. explore the room
-                action_explore = explore(self.memory_systems, self.explore_policy)
-
-                # 2. Answer the questions
-                answers = [
-                    str(
-                        answer_question(
-                            self.memory_systems,
-                            self.qa_function,
-                            question,
-                        )
+    def run_episode(self) -> float:
+        """Play one episode from the beginning.
+
+        Returns:
+            score: total episode rewards
+
+        """
+        score = 0
+        env_started = False
+        action_pair = ([], None)
+        done = False
+        self.init_memory_systems(reset_semantic_decay=True)
+
+        while not done:
+            if env_started:
+                (
+                    observations,
+                    reward,
+                    done,
+                    truncated,
+                    info,
+                ) = self.env.step(action_pair)
+                self.eviction_index.decay()
+                self.num_semantic_decayed += 1
+
+                score += reward
+
+                if done:
+                    assert (
+                        self.num_semantic_decayed
+                        == self.env_config["terminates_at"] + 1
                     )
-                    for question in observations["questions"]
-                ]
+                    break
 
-                # 3. Manage the memory
-                for mem_short in self.memory_systems.short:
-                    manage_memory(self.memory_systems, self.mm_policy, mem_short)
+            else:
+                observations, info = self.env.reset()
+                env_started = True
+
+            # 0. Encode the observations as short-term memory
+            ingest_observations(
+                self.memory_systems, observations["room"], topology=self.topology
+            )
+
+            # 1. explore the room
+            action_explore = explore(
+                self.memory_systems, self.explore_policy, topology=self.topology
+            )
+
+            # 2. Answer the questions
+            answers = [
+                str(answer)
+                for answer in answer_questions(
+                    self.memory_systems, self.qa_function, observations["questions"]
+                )
+            ]
+
+            # 3. Manage the memory
+            manage_all_memories(
+                self.memory_systems,
+                [self.mm_policy] * self.memory_systems.short.size,
+                eviction_index=self.eviction_index,
+                topology=self.topology,
+            )
+
+            action_pair = (answers, action_explore)
+
+        return score
 
-                action_pair = (answers, action_explore)
-            self.scores.append(score)
+    def test(self):
+        """Test the agent. There is no training for this agent, since it is
+        handcrafted."""
+        self.scores = [self.run_episode() for _ in range(self.num_samples_for_results)]
 
         self.scores = {
             "test_score": {
@@ -223,3 +257,4 @@ class HandcraftedAgent:
             self.memory_systems.get_working_memory().to_list(),
             os.path.join(self.default_root_dir, "last_memory_state.yaml"),
         )
+        self.release_env()
@@ -0,0 +1,333 @@
+"""A local stand-in for RoomEnv-v2, for benchmarks and profiling.
+
+`LocalRoomEnv` has the same contract as `room_env:RoomEnv-v2`: the same arguments,
+observations {"room": [...], "questions": [...]}, (answers, explore_action) actions,
+rewards and attributes (`entities`, `relations`, `return_room_layout`,
+`num_questions_step`, `total_maximum_episode_rewards`, ...). But its dynamics are
+simple and cheap, and it has its own random number generator, so what an agent does
+can be timed without the cost and the randomness of the real env. `step_time` adds a
+fixed cost to every step, to mimic an env of a known speed.
+
+Importing this module registers it, so that it can be given to the agents as
+`env_str`:
+
+```
+agent = HandcraftedAgent(env_str=LOCAL_ENV_STR, env_config={...})
+```
+
+The rooms are on a grid, row by row. Static objects stay where they are,
+independent ones move to a random neighboring room with a probability of 0.5 (or
+always to the first one, if `deterministic_objects`), and a dependent object moves
+with the independent object of the same index, when they are in the same room.
+"""
+
+import math
+import random
+import time
+from typing import Literal
+
+import gymnasium as gym
+from gymnasium.envs.registration import register
+
+LOCAL_ENV_STR = "agent.local_env:LocalRoomEnv-v2"
+DIRECTIONS = ["north", "east", "south", "west"]
+
+# {room_size: (number of rooms, number of static, independent and dependent
+# objects)}, like the room configs of RoomEnv-v2.
+ROOM_SIZES = {
+    "xxs": (1, 1, 0, 0),
+    "xs": (2, 1, 1, 1),
+    "s": (4, 1, 1, 1),
+    "m": (8, 2, 2, 2),
+    "l": (16, 4, 4, 4),
+    "xl": (32, 8, 8, 8),
+    "xxl": (64, 16, 16, 16),
+}
+
+register(id="LocalRoomEnv-v2", entry_point="agent.local_env:LocalRoomEnv")
+
+
+class LocalRoomEnv(gym.Env):
+    r"""A cheap env with the contract of RoomEnv-v2.
+
+    Attributes:
+        entities (dict[str, list[str]]): {"static", "independent", "dependent",
+            "agent", "room", "others"}, like RoomEnv-v2's
+        relations (list[str]): the four directions and "atlocation"
+        locations (dict[str, str]): {object: room} of the agent and the objects
+        previous_locations (dict[str, str | None]): {object: the last room that is
+            not its current one}
+
+    """
+
+    def __init__(
+        self,
+        question_prob: int = 1.0,
+        seed: int = 42,
+        terminates_at: int = 99,
+        randomize_observations: Literal[
+            "all", "objects", "none", "objects_middle"
+        ] = "all",
+        room_size: str | dict = "xl-different-prob",
+        rewards: dict = {"correct": 1, "wrong": 0, "partial": 0},
+        make_everything_static: bool = False,
+        num_total_questions: int = 1000,
+        question_interval: int = 1,
+        include_walls_in_observations: bool = True,
+        deterministic_objects: bool = False,
+        step_time: float = 0.0,
+    ) -> None:
+        """
+        Args:
+            question_prob: The probability of a question being asked at every
+                observation.
+            seed: the seed of the env's own random number generator
+            terminates_at: the environment terminates at this time step.
+            randomize_observations: like RoomEnv-v2's
+            room_size: one of `ROOM_SIZES`, with or without "-different-prob", or
+                {"num_rooms": int, "num_objects": int}, where the number of objects
+                is of every kind
+            rewards: rewards for correct, wrong, and partial answers.
+            make_everything_static: If True, all objects are static.
+            num_total_questions: The total number of questions to ask.
+            question_interval: The interval between questions.
+            include_walls_in_observations: whether to include walls in the observations.
+            deterministic_objects: whether the objects move deterministically
+            step_time: the seconds that every step takes at least. It's spent busy
+                waiting, which is more precise than sleeping.
+
+        """
+        super().__init__()
+        if isinstance(room_size, str):
+            num_rooms, *num_objects = ROOM_SIZES[room_size.split("-")[0]]
+        else:
+            num_rooms = room_size["num_rooms"]
+            num_objects = [room_size["num_objects"]] * 3
+
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.question_prob = question_prob
+        self.terminates_at = terminates_at
+        self.randomize_observations = randomize_observations
+        self.rewards = rewards
+        self.make_everything_static = make_everything_static
+        self.num_total_questions = num_total_questions
+        self.question_interval = question_interval
+        self.include_walls_in_observations = include_walls_in_observations
+        self.deterministic_objects = deterministic_objects
+        self.step_time = step_time
+
+        assert self.num_total_questions % (self.terminates_at + 1) == 0
+        assert (self.terminates_at + 1) % self.question_interval == 0
+        self.num_questions_step = (
+            self.num_total_questions
+            // (self.terminates_at + 1)
+            * self.question_interval
+        )
+        self.total_maximum_episode_rewards = num_total_questions
+
+        num_static, num_independent, num_dependent = num_objects
+        self.entities = {
+            "static": [f"sta_{i:03d}" for i in range(num_static)],
+            "independent": [f"ind_{i:03d}" for i in range(num_independent)],
+            "dependent": [f"dep_{i:03d}" for i in range(num_dependent)],
+            "agent": ["agent"],
+            "room": [f"room_{i:03d}" for i in range(num_rooms)],
+            "others": ["wall"],
+        }
+        self.relations = DIRECTIONS + ["atlocation"]
+        self.objects = [
+            obj
+            for kind in ["agent", "static", "independent", "dependent"]
+            for obj in self.entities[kind]
+        ]
+        self._make_room_layout(num_rooms)
+
+        # Our state / action spaces are not tensors, like in RoomEnv-v2.
+        self.observation_space = gym.spaces.Discrete(1)
+        self.action_space = gym.spaces.Discrete(1)
+
+    def _make_room_layout(self, num_rooms: int) -> None:
+        width = math.ceil(math.sqrt(num_rooms))
+        rooms = self.entities["room"]
+
+        def neighbor(idx: int, direction: str) -> str:
+            row, col = divmod(idx, width)
+            row += {"north": -1, "south": 1}.get(direction, 0)
+            col += {"west": -1, "east": 1}.get(direction, 0)
+            if 0 <= row and 0 <= col < width and row * width + col < num_rooms:
+                return rooms[row * width + col]
+            return "wall"
+
+        self.room_map = {
+            room: {direction: neighbor(idx, direction) for direction in DIRECTIONS}
+            for idx, room in enumerate(rooms)
+        }
+        self.room_layout = [
+            [room, direction, self.room_map[room][direction]]
+            for room in rooms
+            for direction in DIRECTIONS
+        ]
+
+    def return_room_layout(self, exclude_walls: bool = False) -> list[list[str]]:
+        r"""Return the room layout for semantic knowledge.
+
+        Args:
+            exclude_walls: whether to exclude walls from the room layout.
+
+        """
+        return [
+            list(triple)
+            for triple in self.room_layout
+            if not (exclude_walls and triple[2] == "wall")
+        ]
+
+    def _move(self, obj: str, direction: str) -> None:
+        self._move_to(obj, self.room_map[self.locations[obj]][direction])
+
+    def _move_to(self, obj: str, destination: str) -> None:
+        if destination not in ["wall", self.locations[obj]]:
+            self.previous_locations[obj] = self.locations[obj]
+            self.locations[obj] = destination
+
+    def _move_objects(self) -> None:
+        before = {obj: self.locations[obj] for obj in self.entities["independent"]}
+        for obj in self.entities["independent"]:
+            directions = [
+                direction
+                for direction in DIRECTIONS
+                if self.room_map[self.locations[obj]][direction] != "wall"
+            ]
+            if not directions:
+                continue
+            if self.deterministic_objects:
+                self._move(obj, directions[0])
+            elif self.rng.random() < 0.5:
+                self._move(obj, self.rng.choice(directions))
+
+        for dependent, independent in zip(
+            self.entities["dependent"], self.entities["independent"]
+        ):
+            if self.locations[dependent] == before[independent]:
+                self._move_to(dependent, self.locations[independent])
+
+    def _observe(self, generate_questions: bool) -> dict:
+        t = self.current_time
+        agent_location = self.locations["agent"]
+        objects = [
+            [obj, "atlocation", agent_location, t]
+            for obj in self.objects
+            if obj != "agent" and self.locations[obj] == agent_location
+        ]
+        walls = [
+            [agent_location, direction, tail, t]
+            for direction, tail in self.room_map[agent_location].items()
+            if self.include_walls_in_observations or tail != "wall"
+        ]
+        agent = [["agent", "atlocation", agent_location, t]]
+
+        # In the same orders as RoomEnv-v2's.
+        if self.randomize_observations == "all":
+            room = walls + agent + objects
+            self.rng.shuffle(room)
+        elif self.randomize_observations == "objects":
+            self.rng.shuffle(objects)
+            room = walls + agent + objects
+        elif self.randomize_observations == "objects_middle":
+            self.rng.shuffle(objects)
+            room = walls + objects + agent
+        elif self.randomize_observations == "none":
+            room = walls + agent + objects
+        else:
+            raise ValueError("Unknown randomize_observations value.")
+
+        self.questions = []
+        self.answers = []
+        if generate_questions:
+            for obj in self.rng.choices(self.objects, k=self.num_questions_step):
+                if self.rng.random() > self.question_prob:
+                    self.questions.append(None)
+                    self.answers.append(None)
+                else:
+                    self.questions.append([obj, "atlocation", "?", t])
+                    self.answers.append(
+                        {
+                            "current": self.locations[obj],
+                            "previous": self.previous_locations[obj],
+                        }
+                    )
+
+        # Like RoomEnv-v2, a question that isn't asked is None.
+        questions = [None if q is None else list(q) for q in self.questions]
+        return {"room": room, "questions": questions}
+
+    def _generate_questions(self) -> bool:
+        return (self.current_time + 1) % self.question_interval == 0
+
+    def reset(self, seed: int | None = None, options: dict | None = None) -> tuple:
+        r"""Reset the environment.
+
+        Args:
+            seed: reseeds the env's random number generator, if given
+            options: not used
+
+        Returns:
+            observations, info
+
+        """
+        if seed is not None:
+            self.rng.seed(seed)
+        self.current_time = 0
+        rooms = self.entities["room"]
+        self.locations = {obj: self.rng.choice(rooms) for obj in self.objects}
+        self.previous_locations = {obj: None for obj in self.objects}
+
+        return self._observe(self._generate_questions()), {}
+
+    def step(
+        self, actions: tuple[list[str], str]
+    ) -> tuple[dict, int, bool, bool, dict]:
+        r"""An agent takes a set of actions.
+
+        Args:
+            actions:
+                actions_qa: Answers to the questions.
+                action_explore: north, east, south, west, or stay.
+
+        Returns:
+            observations, reward, done, truncated, info
+
+        """
+        start = time.perf_counter()
+        actions_qa, action_explore = actions
+        assert isinstance(actions_qa, list), "actions_qa must be a list."
+        assert isinstance(action_explore, str), "action_explore must be a string."
+        assert len(actions_qa) == len(
+            self.answers
+        ), "You should answer all the questions."
+
+        reward = 0
+        for action_qa, answer in zip(actions_qa, self.answers):
+            if answer is None:
+                continue
+            if action_qa == answer["current"]:
+                reward += self.rewards["correct"]
+            elif action_qa == answer["previous"]:
+                reward += self.rewards["partial"]
+            else:
+                reward += self.rewards["wrong"]
+
+        if not self.make_everything_static:
+            self._move_objects()
+        if action_explore != "stay":
+            self._move("agent", action_explore)
+
+        done = self.current_time == self.terminates_at
+        info = {"answers": self.answers, "timestamp": self.current_time}
+        self.current_time += 1
+        observations = self._observe(self._generate_questions())
+
+        while time.perf_counter() - start < self.step_time:
+            pass
+
+        return observations, reward, done, False, info
@@ -4,10 +4,15 @@ The trained neural network policies are not implemented yet.
 """
 
 import random
-from typing import Literal
+from typing import Iterable, Literal
 
+import numpy as np
 from humemai.memory import MemorySystems, ShortMemory
 
+from .eviction import EvictionIndex
+from .topology import DIRECTIONS, RoomTopology
+from .utils import is_checked
+
 
 def encode_observation(memory_systems: MemorySystems, obs: list[str | int]) -> None:
     """Non RL policy of encoding an observation into a short-term memory.
@@ -40,24 +45,81 @@ def encode_all_observations(
 
     """
     assert isinstance(obs_multiple, list), "`obs_multi1ple` should be a list."
-    assert memory_systems.short.is_empty
+    if is_checked():
+        assert memory_systems.short.is_empty
     for obs in obs_multiple:
         encode_observation(memory_systems, obs)
 
 
-def find_agent_location(memory_systems: MemorySystems) -> str | None:
+def ingest_observations(
+    memory_systems: MemorySystems,
+    obs_multiple: list[list[str | int]],
+    topology: RoomTopology | None = None,
+) -> None:
+    """Encode all observations into short-term memories at once.
+
+    Unlike `encode_all_observations`, the observations are checked together, before
+    any of them is added: if they don't fit, a `ValueError` is raised and nothing is
+    added, where `encode_all_observations` raises after adding the ones that fit.
+
+    An observation that is the same as an earlier one is dropped without an error,
+    since the short-term memory keeps only one memory of it with
+    `encode_all_observations` too. Only the observations left count towards the
+    capacity.
+
+    Args:
+        MemorySystems
+        obs_multiple: a list of observations
+        topology: the map of the rooms, which takes in the observations too
+
+    """
+    assert isinstance(obs_multiple, list), "`obs_multiple` should be a list."
+    if is_checked():
+        assert memory_systems.short.is_empty
+
+    seen = set()
+    mems_short = []
+    for obs in obs_multiple:
+        key = tuple(obs)
+        if key not in seen:
+            seen.add(key)
+            mems_short.append(ShortMemory.ob2short(obs))
+
+    if len(mems_short) > memory_systems.short.capacity:
+        raise ValueError("The memory system is full!")
+
+    for mem_short in mems_short:
+        memory_systems.short.add(mem_short)
+
+    if topology is not None:
+        topology.observe(obs_multiple)
+
+
+def find_agent_location(
+    memory_systems: MemorySystems, topology: RoomTopology | None = None
+) -> str | None:
     """Find the current location of the agent. This uses the agent's short-term memory.
 
     Args:
         MemorySystems
+        topology: the map of the rooms. If given, the location is looked up there,
+            instead of in the working memory.
 
     Returns:
         agent_current_location: str | None
 
     """
-    for mem in memory_systems.get_working_memory():
-        if mem[0] == "agent" and mem[1] == "atlocation" and "current_time" in mem[3]:
-            return mem[2]
+    if topology is not None:
+        if topology.agent_location is not None:
+            return topology.agent_location
+    else:
+        for mem in memory_systems.get_working_memory():
+            if (
+                mem[0] == "agent"
+                and mem[1] == "atlocation"
+                and "current_time" in mem[3]
+            ):
+                return mem[2]
 
     raise ValueError(
         "Make sure that the agent's short-term memory has the current location."
@@ -67,6 +129,7 @@ def find_agent_location(memory_systems: MemorySystems) -> str | None:
 def explore(
     memory_systems: MemorySystems,
     policy: Literal["random", "avoid_walls"],
+    topology: RoomTopology | None = None,
 ) -> str:
     """Explore the room (sub-graph).
 
@@ -78,6 +141,8 @@ def explore(
     Args:
         memory_systems: MemorySystems
         policy: "random" or "avoid_walls"
+        topology: the map of the rooms. If given, the location and the walls are
+            looked up there, instead of in the working memory.
 
     Returns:
         action: The exploration action to take.
@@ -86,30 +151,35 @@ def explore(
     if policy == "random":
         action = random.choice(["north", "east", "south", "west", "stay"])
     elif policy == "avoid_walls":
-        agent_current_location = find_agent_location(memory_systems)
+        agent_current_location = find_agent_location(memory_systems, topology)
 
-        # Get all the memories related to the current location
-        mems_map = []
+        if topology is not None:
+            if is_checked():
+                assert topology.has_edges(agent_current_location), (
+                    "No memories about the map. Make sure that the agent's short-term "
+                    "memory has the map."
+                )
+            walls = topology.walls(agent_current_location)
+            to_take = [direction for direction in DIRECTIONS if direction not in walls]
 
-        for mem in memory_systems.get_working_memory():
-            if mem[0] == agent_current_location and mem[1] in [
-                "north",
-                "east",
-                "south",
-                "west",
-            ]:
-                mems_map.append(mem)
-
-        assert len(mems_map) > 0, (
-            "No memories about the map. Make sure that the agent's short-term memory "
-            "has the map."
-        )
+        else:
+            # Get all the memories related to the current location
+            mems_map = []
 
-        to_take = ["north", "east", "south", "west"]
+            for mem in memory_systems.get_working_memory():
+                if mem[0] == agent_current_location and mem[1] in DIRECTIONS:
+                    mems_map.append(mem)
 
-        for mem in mems_map:
-            if mem[2] == "wall" and mem[1] in to_take:
-                to_take.remove(mem[1])
+            assert len(mems_map) > 0, (
+                "No memories about the map. Make sure that the agent's short-term "
+                "memory has the map."
+            )
+
+            to_take = ["north", "east", "south", "west"]
+
+            for mem in mems_map:
+                if mem[2] == "wall" and mem[1] in to_take:
+                    to_take.remove(mem[1])
 
         if len(to_take) == 0:  # This is a very special case where there only one room.
             action = "stay"
@@ -124,63 +194,144 @@ def explore(
     return action
 
 
-def manage_memory(
-    memory_systems: MemorySystems,
-    policy: Literal["episodic", "semantic", "random", "forget", "handcrafted"],
-    mem_short: list,
-) -> None:
-    """Non RL memory management policy. This function directly manages the long-term
-    memory. It tries to balance the number of episodic and semantic memories. Balancing
-    is done by trying to keep the equal number of timestamps and strengths.
+# The actions of the memory management, with the ids of `DQNAgent.action_mm2str`
+MM_ACTIONS = ["episodic", "semantic", "forget"]
 
-    Args:
-        MemorySystems
-        policy: "episodic", "semantic", "random", "forget", or "handcrafted"
-        mem_short: a short-term memory to be moved into a long-term memory.
+# The rules of the "handcrafted" memory management policy, by the types of the head
+# and the tail of a short-term memory. The head is "episodic" ("agent", or one with
+# "ind" or "dep"), "semantic" (with "sta"), "room" or "other", in this order, and the
+# tail has "room" and / or "wall", or neither. -1 means that there is no rule.
+HEAD_TYPES = ["episodic", "semantic", "room", "other"]
+TAIL_TYPES = ["neither", "room", "wall", "room_and_wall"]
+HANDCRAFTED_MM_RULES = np.array(
+    [
+        [0, 0, 0, 0],  # episodic
+        [1, 1, 1, 1],  # semantic
+        [-1, 1, 2, 1],  # room: "room" -> "room" first, then walls
+        [-1, -1, 2, 2],  # other: walls only
+    ]
+)
+
+
+class HandcraftedMMPolicy:
+    r"""The "handcrafted" memory management policy, compiled to a table.
+
+    Every entity is classified once, by substrings, into a head and a tail type
+    (`HEAD_TYPES`, `TAIL_TYPES`), and the action of a short-term memory is then the
+    entry of its types in `HANDCRAFTED_MM_RULES`. `manage_memory` and `DQNAgent.step`
+    share it.
+
+    Attributes:
+        head_types (dict[str, int]): {entity: its head type}
+        tail_types (dict[str, int]): {entity: its tail type}
 
     """
-    assert policy.lower() in ["episodic", "semantic", "random", "forget", "handcrafted"]
-    assert memory_systems.short.has_memory(mem_short)
-    assert not memory_systems.short.is_empty
+
+    def __init__(self, entities: Iterable[str] = ()) -> None:
+        """Compile the rules.
+
+        Args:
+            entities: the entities to classify up front, e.g., the env's. The others
+                are classified when they are first seen.
+
+        """
+        self.head_types = {}
+        self.tail_types = {}
+        for entity in entities:
+            self._classify(entity)
+
+    def _classify(self, entity: str) -> None:
+        if entity == "agent" or "ind" in entity or "dep" in entity:
+            self.head_types[entity] = 0
+        elif "sta" in entity:
+            self.head_types[entity] = 1
+        elif "room" in entity:
+            self.head_types[entity] = 2
+        else:
+            self.head_types[entity] = 3
+        self.tail_types[entity] = ("room" in entity) + 2 * ("wall" in entity)
+
+    def _ids(self, mem_short: list) -> tuple[int, int]:
+        head, tail = mem_short[0], mem_short[2]
+        if head not in self.head_types:
+            self._classify(head)
+        if tail not in self.tail_types:
+            self._classify(tail)
+        return self.head_types[head], self.tail_types[tail]
+
+    def actions(self, mems_short: Iterable[list]) -> np.ndarray:
+        r"""The actions of short-term memories.
+
+        Args:
+            mems_short: short-term memories
+
+        Returns:
+            actions: the ids of `MM_ACTIONS`
+
+        """
+        ids = np.array([self._ids(mem_short) for mem_short in mems_short], dtype=int)
+        if len(ids) == 0:
+            return np.zeros(0, dtype=int)
+        actions = HANDCRAFTED_MM_RULES[ids[:, 0], ids[:, 1]]
+        if (actions < 0).any():
+            raise ValueError("something is wrong")
+
+        return actions
+
+    def action(self, mem_short: list) -> str:
+        r"""The action of a short-term memory, one of `MM_ACTIONS`."""
+        action = HANDCRAFTED_MM_RULES[self._ids(mem_short)]
+        if action < 0:
+            raise ValueError("something is wrong")
+
+        return MM_ACTIONS[action]
+
+
+handcrafted_mm_policy = HandcraftedMMPolicy()
+
+
+def _move_to_long(
+    memory_systems: MemorySystems,
+    policy: str,
+    mem_short: list,
+    eviction_index: EvictionIndex | None,
+) -> None:
+    # What `manage_memory` does, except for forgetting the short-term memory.
+    long = memory_systems.long if eviction_index is None else eviction_index
 
     def forget_long_when_full(memory_systems: MemorySystems):
-        num_timestamps, num_strengths = memory_systems.long.count_memories()
+        num_timestamps, num_strengths = long.count_memories()
 
         if num_timestamps > num_strengths:
-            memory_systems.long.forget_by_selection("oldest")
+            long.forget_by_selection("oldest")
 
         elif num_timestamps < num_strengths:
-            memory_systems.long.forget_by_selection("weakest")
+            long.forget_by_selection("weakest")
 
         else:
             if "oldest" == random.choice(["oldest", "weakest"]):
-                memory_systems.long.forget_by_selection("oldest")
+                long.forget_by_selection("oldest")
             else:
-                memory_systems.long.forget_by_selection("weakest")
+                long.forget_by_selection("weakest")
 
-    def move_to_episodic(memory_systems: MemorySystems, mem_short: list) -> None:
-        mem_epi = ShortMemory.short2epi(mem_short)
-        check, error_msg = memory_systems.long.can_be_added(mem_epi)
+    def add_to_long(memory_systems: MemorySystems, mem: list) -> None:
+        check, error_msg = memory_systems.long.can_be_added(mem)
         if check:
-            memory_systems.long.add(mem_epi)
+            memory_systems.long.add(mem)
         else:
             if error_msg == "The memory system is full!":
                 forget_long_when_full(memory_systems)
-                memory_systems.long.add(mem_epi)
+                memory_systems.long.add(mem)
             else:
                 raise ValueError(error_msg)
+        if eviction_index is not None:
+            eviction_index.add(mem)
+
+    def move_to_episodic(memory_systems: MemorySystems, mem_short: list) -> None:
+        add_to_long(memory_systems, ShortMemory.short2epi(mem_short))
 
     def move_to_semantic(memory_systems: MemorySystems, mem_short: list) -> None:
-        mem_sem = ShortMemory.short2sem(mem_short)
-        check, error_msg = memory_systems.long.can_be_added(mem_sem)
-        if check:
-            memory_systems.long.add(mem_sem)
-        else:
-            if error_msg == "The memory system is full!":
-                forget_long_when_full(memory_systems)
-                memory_systems.long.add(mem_sem)
-            else:
-                raise ValueError(error_msg)
+        add_to_long(memory_systems, ShortMemory.short2sem(mem_short))
 
     if policy.lower() == "episodic":
         move_to_episodic(memory_systems, mem_short)
@@ -195,18 +346,11 @@ def manage_memory(
             move_to_semantic(memory_systems, mem_short)
 
     elif policy.lower() == "handcrafted":
-        if mem_short[0] == "agent":
+        action = handcrafted_mm_policy.action(mem_short)
+        if action == "episodic":
             move_to_episodic(memory_systems, mem_short)
-        elif "ind" in mem_short[0] or "dep" in mem_short[0]:
-            move_to_episodic(memory_systems, mem_short)
-        elif "sta" in mem_short[0]:
-            move_to_semantic(memory_systems, mem_short)
-        elif "room" in mem_short[0] and "room" in mem_short[2]:
+        elif action == "semantic":
             move_to_semantic(memory_systems, mem_short)
-        elif "wall" in mem_short[2]:
-            pass
-        else:
-            raise ValueError("something is wrong")
 
     elif policy.lower() == "forget":
         pass
@@ -214,9 +358,68 @@ def manage_memory(
     else:
         raise ValueError
 
+
+def manage_memory(
+    memory_systems: MemorySystems,
+    policy: Literal["episodic", "semantic", "random", "forget", "handcrafted"],
+    mem_short: list,
+    eviction_index: EvictionIndex | None = None,
+) -> None:
+    """Non RL memory management policy. This function directly manages the long-term
+    memory. It tries to balance the number of episodic and semantic memories. Balancing
+    is done by trying to keep the equal number of timestamps and strengths.
+
+    Args:
+        MemorySystems
+        policy: "episodic", "semantic", "random", "forget", or "handcrafted"
+        mem_short: a short-term memory to be moved into a long-term memory.
+        eviction_index: an index of `memory_systems.long`. If given, it's used to
+            choose what to forget when the long-term memory is full, and it's kept
+            up to date.
+
+    """
+    assert policy.lower() in ["episodic", "semantic", "random", "forget", "handcrafted"]
+    if is_checked():
+        assert memory_systems.short.has_memory(mem_short)
+        assert not memory_systems.short.is_empty
+
+    _move_to_long(memory_systems, policy, mem_short, eviction_index)
     memory_systems.short.forget(mem_short)  # don't forget to forget the short memory!
 
 
+def manage_all_memories(
+    memory_systems: MemorySystems,
+    policies: list[Literal["episodic", "semantic", "random", "forget", "handcrafted"]],
+    eviction_index: EvictionIndex | None = None,
+    topology: RoomTopology | None = None,
+) -> None:
+    """Apply `manage_memory` to all the short-term memories at once, and empty the
+    short-term memory.
+
+    The memories are moved in their order in the short-term memory, as one by one, but
+    the short-term memory is checked once and emptied at the end, instead of per
+    memory.
+
+    Args:
+        MemorySystems
+        policies: a policy per short-term memory, in their order
+        eviction_index: see `manage_memory`
+        topology: the map of the rooms, which forgets the short-term memories too
+
+    """
+    mems_short = list(memory_systems.short)
+    assert len(policies) == len(mems_short)
+
+    for policy, mem_short in zip(policies, mems_short):
+        _move_to_long(memory_systems, policy, mem_short, eviction_index)
+
+    for mem_short in mems_short:
+        memory_systems.short.forget(mem_short)
+
+    if topology is not None:
+        topology.forget_observations()
+
+
 def answer_question(
     memory_systems: MemorySystems,
     qa_function: Literal["latest_strongest", "latest", "strongest", "random"],
@@ -293,3 +496,106 @@ def answer_question(
 
     else:
         raise ValueError("Unknown policy.")
+
+
+def _update_max(entry: list, slot: int, value: int | float, answer: str) -> None:
+    # Keep the first answer of the largest value, like `max`.
+    if entry[slot] is None or value > entry[slot][0]:
+        entry[slot] = (value, answer)
+
+
+def index_working_memory(memory_systems: MemorySystems) -> dict[tuple, list]:
+    """Index the working memory for one-hop questions.
+
+    Every memory [head, relation, tail, qualifiers] is indexed under the keys
+    (head, relation, "?") and ("?", relation, tail). Per key, the index keeps the
+    aggregates that `answer_question` looks for.
+
+    Args:
+        MemorySystems
+
+    Returns:
+        index: {key: [latest_current_time, latest_timestamp, strongest, answers]},
+            where the first three are (value, answer) or None, and answers are the
+            answers of all the memories of the key.
+
+    """
+    index = {}
+    for head, relation, tail, qualifiers in memory_systems.get_working_memory():
+        for key, answer in [
+            ((head, relation, "?"), tail),
+            (("?", relation, tail), head),
+        ]:
+            entry = index.get(key)
+            if entry is None:
+                entry = index[key] = [None, None, None, []]
+            entry[3].append(answer)
+            if "current_time" in qualifiers:
+                _update_max(entry, 0, qualifiers["current_time"], answer)
+            if "timestamp" in qualifiers:
+                _update_max(entry, 1, max(qualifiers["timestamp"]), answer)
+            if "strength" in qualifiers:
+                _update_max(entry, 2, qualifiers["strength"], answer)
+
+    return index
+
+
+def answer_questions(
+    memory_systems: MemorySystems,
+    qa_function: Literal["latest_strongest", "latest", "strongest", "random"],
+    questions: list[list[str | int] | None],
+) -> list[None | str | int]:
+    """Answer all the questions of a step, like `answer_question` does one by one.
+
+    The working memory is made and indexed once (`index_working_memory`), and then
+    every question is answered by a lookup, instead of a scan of the working memory
+    per question.
+
+    Args:
+        MemorySystems: MemorySystems
+        qa_function: "latest_strongest", "latest", "strongest", "strongest_latest",
+            or "random"
+        questions: quadruples given by RoomEnv-v2, e.g., [laptop, atlocation, ?,
+            current_time]. A question can also be None, which is answered with None.
+
+    Returns:
+        preds: the predictions, in the order of the questions
+
+    """
+    qa_function = qa_function.lower()
+    if qa_function not in [
+        "latest_strongest",
+        "strongest_latest",
+        "latest",
+        "strongest",
+        "random",
+    ]:
+        raise ValueError("Unknown policy.")
+
+    index = index_working_memory(memory_systems)
+    preds = []
+    for question in questions:
+        if question is None:
+            preds.append(None)
+            continue
+        entry = index.get(tuple(question[:3]))
+        if entry is None:
+            preds.append(None)
+            continue
+        if qa_function == "random":
+            preds.append(random.choice(entry[3]))
+            continue
+
+        latest = entry[0] or entry[1]
+        strongest = entry[2]
+        if qa_function == "latest_strongest":
+            found = latest or strongest
+        elif qa_function == "strongest_latest":
+            found = strongest or latest
+        elif qa_function == "latest":
+            found = latest
+        else:
+            found = strongest
+        preds.append(None if found is None else found[1])
+
+    return preds
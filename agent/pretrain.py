@@ -0,0 +1,98 @@
+"""Pretrained semantic memories, made once per room layout.
+
+The agents make new memory systems on every reset, and with `pretrain_semantic` they
+used to ask the env for its room layout and pretrain the long-term memory with it
+every time, though the layout of an env never changes. `pretrain_semantic` here does
+it once per env and per layout: the room layout is cached per env, and the entries of
+the pretrained long-term memory per layout and memory configuration, and a reset only
+adds copies of the entries to its new long-term memory.
+
+```
+long = LongMemory(capacity=12, semantic_decay_factor=1.0, min_strength=1)
+pretrain_semantic(long, env, exclude_walls=True)
+```
+"""
+
+import hashlib
+import json
+import weakref
+
+import gymnasium as gym
+from humemai.memory import LongMemory
+
+# {env.unwrapped: {exclude_walls: (room layout, its hash)}}
+_room_layouts = weakref.WeakKeyDictionary()
+
+# {(layout hash, capacity, semantic_decay_factor, min_strength): entries}
+_pretrained = {}
+
+
+def room_layout(env: gym.Env, exclude_walls: bool) -> list[list[str]]:
+    r"""The room layout of an env, asked from the env once.
+
+    Args:
+        env: the env
+        exclude_walls: whether to exclude walls from the room layout
+
+    """
+    return _room_layout(env, exclude_walls)[0]
+
+
+def _room_layout(env: gym.Env, exclude_walls: bool) -> tuple[list[list[str]], str]:
+    layouts = _room_layouts.setdefault(env.unwrapped, {})
+    if exclude_walls not in layouts:
+        layout = env.unwrapped.return_room_layout(exclude_walls)
+        layouts[exclude_walls] = layout, layout_hash(layout)
+
+    return layouts[exclude_walls]
+
+
+def layout_hash(layout: list[list[str]]) -> str:
+    r"""A hash of a room layout."""
+    return hashlib.sha1(json.dumps(layout).encode()).hexdigest()
+
+
+def _copy_entries(entries: list[list]) -> list[list]:
+    # The qualifiers are the only mutable parts of a memory.
+    return [
+        [
+            head,
+            relation,
+            tail,
+            {
+                key: list(value) if isinstance(value, list) else value
+                for key, value in qualifiers.items()
+            },
+        ]
+        for head, relation, tail, qualifiers in entries
+    ]
+
+
+def pretrain_semantic(long: LongMemory, env: gym.Env, exclude_walls: bool) -> None:
+    r"""Pretrain an empty long-term memory with the room layout of an env, like
+    `long.pretrain_semantic(semantic_knowledge=room_layout)`.
+
+    The first time for a layout and a memory configuration, the memory is pretrained,
+    and its entries are kept. After that, copies of them are added to the memory with
+    `long.add`, like the pretraining adds them.
+
+    Args:
+        long: an empty long-term memory
+        env: the env
+        exclude_walls: whether to exclude walls from the room layout
+
+    """
+    layout, hash_ = _room_layout(env, exclude_walls)
+    key = (
+        hash_,
+        long.capacity,
+        getattr(long, "semantic_decay_factor", None),
+        getattr(long, "min_strength", None),
+    )
+    if key not in _pretrained:
+        long.pretrain_semantic(semantic_knowledge=layout)
+        _pretrained[key] = _copy_entries(long.entries)
+        return
+
+    for mem in _copy_entries(_pretrained[key]):
+        long.add(mem)
@@ -0,0 +1,467 @@
+"""A memory store of numpy columns, with the behavior of humemai's memory systems.
+
+`MemorySystems` keeps every memory as a list of strings and a dict of qualifiers, so
+`decay()`, the eviction and the queries loop over Python objects, and
+`get_working_memory().to_list()` makes new nested lists for the GNN every step.
+`MemoryStore` keeps the short-term and the long-term memories in preallocated
+columns instead:
+
+- `triples`: the (head, relation, tail) ids, by the `entities` and `relations`
+- `quals`: current_time, the latest timestamp and strength, in the order of
+  `QUALIFIER_COLUMNS`, NaN if missing, i.e., the arrays of `encode_state`
+- `earliest`: the earliest timestamp, which the eviction of the oldest memory needs
+- `kind`: `FREE`, `SHORT` or `LONG`
+
+The rows [0, short) are the short-term memory, which is kept right-aligned, and the
+rows [short, short + long) are the long-term memory, kept left-aligned. Both are in
+the order in which their memories were added, so the working memory, short-term then
+long-term, is always one contiguous block, and `working_memory` returns views of it.
+
+The long-term memory has one row per triple, like `LongMemory`: an episodic memory of
+a triple that is already there adds its timestamp, and a semantic one adds its
+strength. Of the timestamps, only the earliest and the latest ones are kept, which is
+all that the GNN, the question answering and the eviction look at.
+
+`working_memory` returns numpy views, and `gnn_input` the input tensors of the GNN
+made from them, without the quadruples of `process_graph`. So far, only
+`agent.benchmark` uses the store; the agents still use `MemorySystems`.
+
+```
+store = MemoryStore(entities, relations, {"short": 15, "long": 96})
+store.add_observations(observations["room"])
+store.manage(["episodic"] * store.num_short)
+triples, quals = store.working_memory()
+```
+"""
+
+import random
+from typing import Literal
+
+import numpy as np
+
+from .dqn.shared_replay import QUALIFIER_COLUMNS
+
+FREE, SHORT, LONG = 0, 1, 2
+_CURRENT_TIME, _TIMESTAMP, _STRENGTH = range(len(QUALIFIER_COLUMNS))
+
+
+class MemoryStore:
+    r"""Short-term and long-term memories as numpy columns.
+
+    Attributes:
+        entity_to_idx (dict[str, int]): {entity: id}
+        relation_to_idx (dict[str, int]): {relation: id}
+        capacity (dict[str, int]): {"short": int, "long": int}
+        semantic_decay_factor (float): what `decay` multiplies the strengths by
+        min_strength (float): the strength that `decay` doesn't go below
+        triples (np.ndarray): [short + long, 3] int32 ids, -1 in the free rows
+        quals (np.ndarray): [short + long, 3] float64, see `QUALIFIER_COLUMNS`
+        earliest (np.ndarray): [short + long] float64 earliest timestamps
+        kind (np.ndarray): [short + long] int8, `FREE`, `SHORT` or `LONG`
+        seq (np.ndarray): [short + long] int64, the order in which the long-term
+            memories were added
+        num_short (int): the number of short-term memories
+        num_long (int): the number of long-term memories
+
+    """
+
+    def __init__(
+        self,
+        entities: list[str],
+        relations: list[str],
+        capacity: dict[str, int],
+        semantic_decay_factor: float = 1.0,
+        min_strength: float = 1,
+    ) -> None:
+        """Allocate the columns.
+
+        Args:
+            entities: the entities, e.g., from `gnn_vocab`
+            relations: the relations, e.g., from `gnn_vocab`
+            capacity: {"short": int, "long": int}
+            semantic_decay_factor: like `LongMemory`'s
+            min_strength: like `LongMemory`'s
+
+        """
+        self.entities = list(entities)
+        self.relations = list(relations)
+        self.entity_to_idx = {entity: i for i, entity in enumerate(self.entities)}
+        self.relation_to_idx = {relation: i for i, relation in enumerate(relations)}
+        self.capacity = dict(capacity)
+        self.semantic_decay_factor = semantic_decay_factor
+        self.min_strength = min_strength
+
+        size = self.capacity["short"] + self.capacity["long"]
+        self.triples = np.full((size, 3), -1, dtype=np.int32)
+        self.quals = np.full((size, len(QUALIFIER_COLUMNS)), np.nan, dtype=np.float64)
+        self.earliest = np.full(size, np.nan, dtype=np.float64)
+        self.kind = np.full(size, FREE, dtype=np.int8)
+        self.num_short = 0
+        self.num_long = 0
+        # The long-term memories are in the order of their seqs, so that the row of
+        # a triple is found by a binary search, even after the rows were shifted.
+        self.seq = np.zeros(size, dtype=np.int64)
+        self._long_seqs = {}  # {(head, relation, tail) ids: seq}
+        self._next_seq = 0
+
+    @property
+    def _short(self) -> slice:
+        return slice(self.capacity["short"] - self.num_short, self.capacity["short"])
+
+    @property
+    def _long(self) -> slice:
+        start = self.capacity["short"]
+        return slice(start, start + self.num_long)
+
+    def _encode(self, mem: list) -> tuple[int, int, int]:
+        return (
+            self.entity_to_idx[mem[0]],
+            self.relation_to_idx[mem[1]],
+            self.entity_to_idx[mem[2]],
+        )
+
+    def _long_row(self, triple: tuple[int, int, int]) -> int | None:
+        seq = self._long_seqs.get(triple)
+        if seq is None:
+            return None
+        return self.capacity["short"] + int(np.searchsorted(self.seq[self._long], seq))
+
+    def _clear(self, rows: slice) -> None:
+        self.triples[rows] = -1
+        self.quals[rows] = np.nan
+        self.earliest[rows] = np.nan
+        self.kind[rows] = FREE
+
+    # The short-term memory.
+
+    def add_observations(self, obs_multiple: list[list[str | int]]) -> None:
+        r"""Add observations as short-term memories, like `ShortMemory.ob2short`.
+
+        Args:
+            obs_multiple: [head, relation, tail, current_time] observations
+
+        """
+        if self.num_short + len(obs_multiple) > self.capacity["short"]:
+            raise ValueError("The memory system is full!")
+        if not obs_multiple:
+            return
+
+        # Shift the short-term memories to the left, to keep them right-aligned.
+        end = self.capacity["short"]
+        start = end - self.num_short
+        new_start = start - len(obs_multiple)
+        for column in [self.triples, self.quals, self.earliest, self.kind]:
+            column[new_start : end - len(obs_multiple)] = column[start:end]
+
+        rows = slice(end - len(obs_multiple), end)
+        self.triples[rows] = [self._encode(obs) for obs in obs_multiple]
+        self.quals[rows] = np.nan
+        self.quals[rows, _CURRENT_TIME] = [obs[3] for obs in obs_multiple]
+        self.earliest[rows] = np.nan
+        self.kind[rows] = SHORT
+        self.num_short += len(obs_multiple)
+
+    def forget_short(self) -> None:
+        r"""Forget all the short-term memories."""
+        self._clear(self._short)
+        self.num_short = 0
+
+    # The long-term memory.
+
+    def _add_long(
+        self, triple: tuple[int, int, int], timestamp: float | None, strength: float
+    ) -> None:
+        # Add an episodic (with a timestamp) or a semantic memory of a triple.
+        row = self._long_row(triple)
+        if row is None:
+            if self.num_long == self.capacity["long"]:
+                raise ValueError("The memory system is full!")
+            row = self.capacity["short"] + self.num_long
+            self.num_long += 1
+            self._long_seqs[triple] = self.seq[row] = self._next_seq
+            self._next_seq += 1
+            self.triples[row] = triple
+            self.quals[row] = np.nan
+            self.earliest[row] = np.nan
+            self.kind[row] = LONG
+
+        quals = self.quals[row]
+        if timestamp is not None:
+            quals[_TIMESTAMP] = np.fmax(quals[_TIMESTAMP], timestamp)
+            self.earliest[row] = np.fmin(self.earliest[row], timestamp)
+        else:
+            quals[_STRENGTH] = np.nansum([quals[_STRENGTH], strength])
+
+    def can_be_added(self, mem: list) -> bool:
+        r"""Whether a memory can be added to the long-term memory without forgetting,
+        i.e., it's not full or it has the triple already."""
+        return (
+            self.num_long < self.capacity["long"]
+            or self._encode(mem) in self._long_seqs
+        )
+
+    def add_long(self, mem: list) -> None:
+        r"""Add a long-term memory, like `LongMemory.add`.
+
+        Args:
+            mem: [head, relation, tail, {"timestamp": [...]}] or
+                [head, relation, tail, {"strength": ...}], or with both
+
+        """
+        triple = self._encode(mem)
+        qualifiers = mem[3]
+        for timestamp in qualifiers.get("timestamp", []):
+            self._add_long(triple, timestamp, 0)
+        if "strength" in qualifiers:
+            self._add_long(triple, None, qualifiers["strength"])
+
+    def pretrain_semantic(self, semantic_knowledge: list[list[str]]) -> None:
+        r"""Add triples as semantic memories of strength 1, until the long-term memory
+        is full, like `LongMemory.pretrain_semantic`.
+
+        Args:
+            semantic_knowledge: [head, relation, tail] triples
+
+        """
+        for triple in semantic_knowledge:
+            mem = list(triple) + [{"strength": 1}]
+            if not self.can_be_added(mem):
+                break
+            self.add_long(mem)
+
+    def _forget_long_row(self, row: int) -> None:
+        # Shift the long-term memories after the row to the left, to keep the order.
+        end = self.capacity["short"] + self.num_long
+        del self._long_seqs[tuple(self.triples[row].tolist())]
+        for column in [self.triples, self.quals, self.earliest, self.kind, self.seq]:
+            column[row : end - 1] = column[row + 1 : end]
+        self._clear(slice(end - 1, end))
+        self.num_long -= 1
+
+    def forget_long(self, mem: list) -> None:
+        r"""Forget the long-term memory of a triple, like `LongMemory.forget`."""
+        row = self._long_row(self._encode(mem))
+        if row is None:
+            raise ValueError(f"{mem} is not in the long-term memory.")
+        self._forget_long_row(row)
+
+    def count_memories(self) -> tuple[int, int]:
+        r"""Like `LongMemory.count_memories`.
+
+        Returns:
+            num_timestamps, num_strengths
+
+        """
+        quals = self.quals[self._long]
+        return (
+            int(np.count_nonzero(~np.isnan(quals[:, _TIMESTAMP]))),
+            int(np.count_nonzero(~np.isnan(quals[:, _STRENGTH]))),
+        )
+
+    def select(self, selection: Literal["oldest", "weakest"]) -> int:
+        r"""The row of the memory that `forget_by_selection` would forget: the one
+        with the earliest timestamp, or the smallest strength, first in the order.
+
+        Args:
+            selection: "oldest" or "weakest"
+
+        """
+        if selection == "oldest":
+            keys = self.earliest[self._long]
+        elif selection == "weakest":
+            keys = self.quals[self._long, _STRENGTH]
+        else:
+            raise ValueError(f"Unknown selection: {selection}")
+        if np.isnan(keys).all():
+            raise ValueError(f"There is no memory to select as the {selection}.")
+
+        return self.capacity["short"] + int(np.nanargmin(keys))
+
+    def forget_by_selection(self, selection: Literal["oldest", "weakest"]) -> None:
+        r"""Like `LongMemory.forget_by_selection`."""
+        self._forget_long_row(self.select(selection))
+
+    def decay(self) -> None:
+        r"""Decay the strengths of the long-term memory, like `LongMemory.decay`."""
+        # NaN, i.e., no strength, stays NaN.
+        strength = self.quals[self._long, _STRENGTH]
+        self.quals[self._long, _STRENGTH] = np.maximum(
+            strength * self.semantic_decay_factor, self.min_strength
+        )
+
+    # Memory management, like `agent.policy`.
+
+    def _forget_when_full(self) -> None:
+        num_timestamps, num_strengths = self.count_memories()
+        if num_timestamps > num_strengths:
+            self.forget_by_selection("oldest")
+        elif num_timestamps < num_strengths:
+            self.forget_by_selection("weakest")
+        else:
+            self.forget_by_selection(random.choice(["oldest", "weakest"]))
+
+    def manage(self, policies: list[Literal["episodic", "semantic", "forget"]]) -> None:
+        r"""Move every short-term memory into the long-term memory, or forget it,
+        like `manage_all_memories`, and empty the short-term memory.
+
+        Args:
+            policies: "episodic", "semantic" or "forget" per short-term memory, in
+                their order
+
+        """
+        assert len(policies) == self.num_short
+        start = self._short.start
+        for row, policy in zip(range(start, start + self.num_short), policies):
+            if policy == "forget":
+                continue
+            triple = tuple(self.triples[row].tolist())
+            if self.num_long == self.capacity["long"] and triple not in self._long_seqs:
+                self._forget_when_full()
+            if policy == "episodic":
+                self._add_long(triple, self.quals[row, _CURRENT_TIME], 0)
+            elif policy == "semantic":
+                self._add_long(triple, None, 1)
+            else:
+                raise ValueError(f"Unknown policy: {policy}")
+        self.forget_short()
+
+    # Reading the memories.
+
+    def working_memory(self) -> tuple[np.ndarray, np.ndarray]:
+        r"""The working memory, short-term then long-term, as views of the columns.
+
+        Returns:
+            triples: [num_short + num_long, 3] int32 ids
+            quals: [num_short + num_long, 3] float64 qualifiers, like `encode_state`'s
+
+        """
+        rows = slice(self._short.start, self._long.stop)
+        return self.triples[rows], self.quals[rows]
+
+    def gnn_input(self) -> tuple:
+        r"""The working memory as the input tensors of the GNN, like `process_graph`.
+
+        Returns:
+            the same as `agent.dqn.nn.utils.process_encoded_graph`
+
+        """
+        # Imported here, since the rest of the store doesn't need torch_scatter.
+        from .dqn.nn.utils import process_encoded_graph
+
+        triples, quals = self.working_memory()
+        return process_encoded_graph(
+            triples, quals, len(triples), self.entities, self.relations
+        )
+
+    def query(
+        self, head: str | None, relation: str | None, tail: str | None
+    ) -> np.ndarray:
+        r"""The rows of the working memory that match a pattern.
+
+        Args:
+            head, relation, tail: the pattern. None matches anything.
+
+        Returns:
+            rows: the indices of the matching rows of `working_memory`
+
+        """
+        triples, _ = self.working_memory()
+        mask = np.ones(len(triples), dtype=bool)
+        for column, value, to_idx in [
+            (0, head, self.entity_to_idx),
+            (1, relation, self.relation_to_idx),
+            (2, tail, self.entity_to_idx),
+        ]:
+            if value is not None:
+                mask &= triples[:, column] == to_idx.get(value, -1)
+
+        return np.flatnonzero(mask)
+
+    def answer_question(
+        self,
+        qa_function: Literal[
+            "latest_strongest", "strongest_latest", "latest", "strongest"
+        ],
+        question: list[str | int],
+    ) -> str | None:
+        r"""Answer a one-hop question like `agent.policy.answer_questions`.
+
+        Args:
+            qa_function: "latest_strongest", "strongest_latest", "latest" or
+                "strongest"
+            question: e.g., [laptop, atlocation, ?, current_time]
+
+        Returns:
+            pred: the answer, or None
+
+        """
+        query_idx = question.index("?")
+        pattern = [None if part == "?" else part for part in question[:3]]
+        rows = self.query(*pattern)
+        if len(rows) == 0:
+            return None
+        triples, quals = self.working_memory()
+        answers = triples[rows, query_idx]
+        quals = quals[rows]
+
+        def best(column: int) -> int | None:
+            if np.isnan(quals[:, column]).all():
+                return None
+            return int(answers[np.nanargmax(quals[:, column])])
+
+        latest = best(_CURRENT_TIME)
+        if latest is None:
+            latest = best(_TIMESTAMP)
+        strongest = best(_STRENGTH)
+        if qa_function == "latest_strongest":
+            found = strongest if latest is None else latest
+        elif qa_function == "strongest_latest":
+            found = latest if strongest is None else strongest
+        elif qa_function == "latest":
+            found = latest
+        elif qa_function == "strongest":
+            found = strongest
+        else:
+            raise ValueError("Unknown policy.")
+
+        return None if found is None else self.entities[found]
+
+    def to_list(self, kind: int | None = None) -> list[list]:
+        r"""The memories as [head, relation, tail, qualifiers] quadruples.
+
+        Args:
+            kind: `SHORT` or `LONG`, or None for the working memory
+
+        Returns:
+            quadruples: the timestamps of a long-term memory are [earliest, latest],
+                or [latest] if they are the same
+
+        """
+        rows = {SHORT: self._short, LONG: self._long}.get(
+            kind, slice(self._short.start, self._long.stop)
+        )
+        quadruples = []
+        for (head, relation, tail), quals, earliest in zip(
+            self.triples[rows].tolist(),
+            self.quals[rows].tolist(),
+            self.earliest[rows].tolist(),
+        ):
+            qualifiers = {}
+            if not np.isnan(quals[_CURRENT_TIME]):
+                qualifiers["current_time"] = int(quals[_CURRENT_TIME])
+            if not np.isnan(quals[_TIMESTAMP]):
+                qualifiers["timestamp"] = sorted(
+                    {int(earliest), int(quals[_TIMESTAMP])}
+                )
+            if not np.isnan(quals[_STRENGTH]):
+                qualifiers["strength"] = quals[_STRENGTH]
+            quadruples.append(
+                [
+                    self.entities[head],
+                    self.relations[relation],
+                    self.entities[tail],
+                    qualifiers,
+                ]
+            )
+
+        return quadruples
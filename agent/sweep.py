@@ -0,0 +1,276 @@
+"""Sweeping the hyperparameters of `HandcraftedAgent` across a process pool.
+
+A sweep is a grid of agent hyperparameters (and room sizes), times a list of seeds. One
+job is one point of the grid with one seed, i.e., `num_samples_for_results` episodes.
+Every worker keeps the envs it has made in its `env_pool`, and reuses them for the
+later jobs with the same env config, whatever their seeds: a job puts its env back
+when it's done. Every job seeds everything with its seed before its first episode, so
+its scores don't depend on which worker runs it, or after which other job.
+
+Every finished job is appended to `progress.jsonl` in the output directory. Running
+the same sweep again skips the jobs that are already there, so an interrupted sweep
+resumes where it stopped. The consolidated table, one row per point of the grid, is
+written to `results.csv`.
+"""
+
+import itertools
+import json
+import multiprocessing as mp
+import os
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from tqdm.auto import tqdm
+
+from .handcrafted import HandcraftedAgent
+from .utils import seed_everything, write_csv
+
+# The hyperparameters of a point of the grid, in the order of the results table.
+GRID_KEYS = [
+    "room_size",
+    "mm_policy",
+    "qa_function",
+    "explore_policy",
+    "pretrain_semantic",
+    "capacity_long",
+    "semantic_decay_factor",
+]
+
+
+def expand_grid(grid: dict[str, list] | list[dict[str, list]]) -> list[dict]:
+    r"""Expand a grid of hyperparameters into all of its combinations.
+
+    Args:
+        grid: {hyperparameter: list of values}. A list of such grids is expanded one
+            by one and concatenated, e.g., when some hyperparameters only make sense
+            with some others.
+
+    Returns:
+        one dict per combination
+
+    """
+    if isinstance(grid, dict):
+        grid = [grid]
+
+    combinations = []
+    for grid_ in grid:
+        keys = list(grid_.keys())
+        for values in itertools.product(*[grid_[key] for key in keys]):
+            combination = dict(zip(keys, values))
+            if combination not in combinations:
+                combinations.append(combination)
+
+    return combinations
+
+
+def job_key(job: dict) -> str:
+    """The string that identifies a job in `progress.jsonl`."""
+    return json.dumps(job, sort_keys=True)
+
+
+def run_job(
+    job: dict,
+    env_str: str,
+    env_config: dict,
+    num_samples_for_results: int,
+    capacity_short: int,
+) -> list[float]:
+    r"""Play the episodes of one job.
+
+    Args:
+        job: one point of the grid, with its "seed"
+        env_str: This has to be "room_env:RoomEnv-v2"
+        env_config: The configuration of the environment, except for the room size
+            and the seed, which are taken from `job`.
+        num_samples_for_results: The number of episodes to play.
+        capacity_short: The capacity of the short-term memory system.
+
+    Returns:
+        scores: the total rewards of the episodes
+
+    """
+    env_config = {**env_config, "room_size": job["room_size"], "seed": job["seed"]}
+    with tempfile.TemporaryDirectory() as default_root_dir:
+        agent = HandcraftedAgent(
+            env_str=env_str,
+            env_config=env_config,
+            mm_policy=job["mm_policy"],
+            qa_function=job["qa_function"],
+            explore_policy=job["explore_policy"],
+            num_samples_for_results=num_samples_for_results,
+            capacity={"long": job["capacity_long"], "short": capacity_short},
+            pretrain_semantic=job["pretrain_semantic"],
+            semantic_decay_factor=job["semantic_decay_factor"],
+            default_root_dir=default_root_dir,
+        )
+
+        seed_everything(job["seed"])
+        try:
+            return [agent.run_episode() for _ in range(num_samples_for_results)]
+        finally:
+            agent.release_env()
+
+
+def read_progress(out_dir: str) -> dict[str, list[float]]:
+    r"""Read the finished jobs of a sweep.
+
+    Args:
+        out_dir: the output directory of the sweep
+
+    Returns:
+        {job key: scores}
+
+    """
+    path = os.path.join(out_dir, "progress.jsonl")
+    progress = {}
+    if not os.path.isfile(path):
+        return progress
+
+    with open(path, "r") as stream:
+        for line in stream:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line is cut short, if the sweep was killed while writing.
+                continue
+            progress[job_key(record["job"])] = record["scores"]
+
+    return progress
+
+
+def drop_partial_line(path: str) -> None:
+    r"""Cut off the last line of a file, if it doesn't end with a newline, e.g., if
+    the sweep was killed while writing it. Otherwise the next record would be
+    appended to it.
+
+    Args:
+        path: the file
+
+    """
+    with open(path, "rb+") as stream:
+        data = stream.read()
+        if data and not data.endswith(b"\n"):
+            stream.truncate(data.rfind(b"\n") + 1)
+
+
+def summarize(jobs: list[dict], progress: dict[str, list[float]]) -> list[dict]:
+    r"""Put the finished jobs together, one row per point of the grid. Like in
+    `handcrafted.ipynb`, the mean score of every seed is averaged over the seeds.
+
+    Args:
+        jobs: the jobs of the sweep
+        progress: {job key: scores}, as returned by `read_progress`
+
+    Returns:
+        rows: the results table, sorted by the capacity and then by the test mean
+
+    """
+    means = defaultdict(list)
+    for job in jobs:
+        if job_key(job) in progress:
+            point = tuple(job[key] for key in GRID_KEYS)
+            means[point].append(np.mean(progress[job_key(job)]).item())
+
+    rows = []
+    for point, means_ in means.items():
+        rows.append(
+            {
+                **dict(zip(GRID_KEYS, point)),
+                "num_seeds": len(means_),
+                "test_mean": round(np.mean(means_).item(), 2),
+                "test_std": round(np.std(means_).item(), 2),
+            }
+        )
+
+    return sorted(rows, key=lambda row: (row["capacity_long"], -row["test_mean"]))
+
+
+def run_sweep(
+    grid: dict[str, list] | list[dict[str, list]],
+    out_dir: str,
+    env_str: str = "room_env:RoomEnv-v2",
+    env_config: dict = {
+        "question_prob": 1.0,
+        "terminates_at": 99,
+        "randomize_observations": "objects",
+        "rewards": {"correct": 1, "wrong": 0, "partial": 0},
+        "make_everything_static": False,
+        "num_total_questions": 1000,
+        "question_interval": 1,
+        "include_walls_in_observations": True,
+        "deterministic_objects": False,
+    },
+    seeds: list[int] = [0, 1, 2, 3, 4],
+    num_samples_for_results: int = 10,
+    capacity_short: int = 15,
+    num_workers: int = os.cpu_count(),
+) -> list[dict]:
+    r"""Run (or resume) a sweep of `HandcraftedAgent`.
+
+    Args:
+        grid: {hyperparameter: list of values}, or a list of them (see
+            `expand_grid`). Every hyperparameter in `GRID_KEYS` has to be there.
+        out_dir: the directory for `progress.jsonl` and `results.csv`
+        env_str: This has to be "room_env:RoomEnv-v2"
+        env_config: The configuration of the environment, except for the room size
+            and the seed.
+        seeds: the seeds to run every point of the grid with
+        num_samples_for_results: The number of episodes per job.
+        capacity_short: The capacity of the short-term memory system.
+        num_workers: number of worker processes
+
+    Returns:
+        rows: the results table, as written to `results.csv`
+
+    """
+    jobs = [
+        {**combination, "seed": seed}
+        for combination in expand_grid(grid)
+        for seed in seeds
+    ]
+    for key in GRID_KEYS:
+        if any(key not in job for job in jobs):
+            raise ValueError(f"{key} is missing from the grid.")
+
+    os.makedirs(out_dir, exist_ok=True)
+    progress = read_progress(out_dir)
+    todo = [job for job in jobs if job_key(job) not in progress]
+    print(f"{len(jobs) - len(todo)} out of {len(jobs)} jobs are already done.")
+
+    if todo:
+        if os.path.isfile(os.path.join(out_dir, "progress.jsonl")):
+            drop_partial_line(os.path.join(out_dir, "progress.jsonl"))
+        with ProcessPoolExecutor(
+            max_workers=num_workers, mp_context=mp.get_context("spawn")
+        ) as executor, open(os.path.join(out_dir, "progress.jsonl"), "a") as stream:
+            futures = {
+                executor.submit(
+                    run_job,
+                    job,
+                    env_str,
+                    env_config,
+                    num_samples_for_results,
+                    capacity_short,
+                ): job
+                for job in todo
+            }
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                job = futures[future]
+                scores = future.result()
+                progress[job_key(job)] = scores
+                stream.write(json.dumps({"job": job, "scores": scores}) + "\n")
+                stream.flush()
+                os.fsync(stream.fileno())
+
+    rows = summarize(jobs, progress)
+    columns = GRID_KEYS + ["num_seeds", "test_mean", "test_std"]
+    path = os.path.join(out_dir, "results.csv")
+    write_csv(
+        [columns] + [[row[column] for column in columns] for row in rows],
+        path + ".tmp",
+    )
+    os.replace(path + ".tmp", path)
+
+    return rows
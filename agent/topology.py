@@ -0,0 +1,104 @@
+"""A map of the rooms, kept up to date step by step.
+
+`explore(..., "avoid_walls")`, `find_agent_location` and
+`DQNAgent.get_intrinsic_explore_reward` look for the agent's room and for its walls
+in the working memory, which they scan every step. `RoomTopology` keeps them instead:
+
+- From the observations of a step, which are the short-term memories until they are
+  managed, it keeps where the agent is and the edges of its room, and it adds the
+  edges to the map of all the rooms seen so far.
+- The long-term memory has one memory per triple, so whether it remembers a wall is
+  a lookup of [room, direction, "wall"] in its `EvictionIndex`, which `manage_memory`
+  keeps up to date with every memory that is moved or forgotten.
+
+```
+topology = RoomTopology(eviction_index)
+ingest_observations(memory_systems, observations["room"], topology=topology)
+action = explore(memory_systems, "avoid_walls", topology=topology)
+manage_all_memories(memory_systems, policies, eviction_index, topology=topology)
+```
+"""
+
+from .eviction import EvictionIndex
+
+DIRECTIONS = ["north", "east", "south", "west"]
+
+
+class RoomTopology:
+    r"""The rooms, their edges, and where the agent is.
+
+    Attributes:
+        long (EvictionIndex): the index of the long-term memory
+        rooms (dict[str, dict[str, str]]): {room: {direction: room or "wall"}} of every
+            edge that was observed
+        agent_location (str | None): the room of the agent, if the short-term memory
+            has it
+        edges (dict[str, dict[str, str]]): {room: {direction: room or "wall"}} of the
+            edges in the short-term memory
+
+    """
+
+    def __init__(self, long: EvictionIndex) -> None:
+        """Start with no rooms.
+
+        Args:
+            long: the index of the long-term memory, e.g., `DQNAgent.eviction_index`
+
+        """
+        self.long = long
+        self.rooms = {}
+        self.forget_observations()
+
+    def observe(self, obs_multiple: list[list[str | int]]) -> None:
+        r"""Take in the observations of a step, as they become short-term memories.
+
+        Args:
+            obs_multiple: [head, relation, tail, current_time] observations
+
+        """
+        self.forget_observations()
+        for head, relation, tail, _ in obs_multiple:
+            if head == "agent" and relation == "atlocation":
+                self.agent_location = tail
+            elif relation in DIRECTIONS:
+                self.edges.setdefault(head, {})[relation] = tail
+                self.rooms.setdefault(head, {})[relation] = tail
+
+    def forget_observations(self) -> None:
+        r"""Forget the short-term memories, e.g., after they were managed."""
+        self.agent_location = None
+        self.edges = {}
+
+    def walls(self, room: str) -> set[str]:
+        r"""The directions of a room that the working memory knows are walls.
+
+        Args:
+            room: the room
+
+        """
+        edges = self.edges.get(room, {})
+        return {
+            direction
+            for direction in DIRECTIONS
+            if edges.get(direction) == "wall" or (room, direction, "wall") in self.long
+        }
+
+    def has_edges(self, room: str) -> bool:
+        r"""Whether the working memory has any edge of a room, of the ones that were
+        observed, or a wall."""
+        if self.edges.get(room):
+            return True
+        return any(
+            (room, direction, tail) in self.long
+            for direction, tail in self.rooms.get(room, {}).items()
+        ) or any((room, direction, "wall") in self.long for direction in DIRECTIONS)
+
+    def open_directions(self) -> set[str]:
+        r"""The directions to other rooms, of the rooms in the short-term memory."""
+        return {
+            direction
+            for room, edges in self.edges.items()
+            if "room" in room
+            for direction, tail in edges.items()
+            if "wall" not in tail
+        }
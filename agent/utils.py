@@ -5,12 +5,59 @@ import json
 import os
 import pickle
 import random
-from typing import Union
+from contextlib import contextmanager
+from typing import Iterator, Union
 
 import numpy as np
 import torch
 import yaml
 
+# Whether the hot paths of the agents check their invariants, which can cost O(n) per
+# call, e.g., `short.has_memory`. It's the checked mode by default, and the fast mode
+# if the environment variable AGENT_FAST is "1". See `set_checked`.
+_checked = os.environ.get("AGENT_FAST", "0") != "1"
+
+
+def is_checked() -> bool:
+    """Whether the agents run in the checked mode, rather than the fast one."""
+    return _checked
+
+
+def set_checked(checked: bool) -> bool:
+    """Switch between the checked and the fast mode, for every agent.
+
+    The checked mode asserts the invariants of the memory systems, and of the actions,
+    in `agent.policy`, `DQNAgent.step` and `HandcraftedAgent.run_episode`. The fast mode
+    skips them, which only matters when the memories are many. Tests run checked.
+
+    Args:
+        checked: True for the checked mode, False for the fast one
+
+    Returns:
+        the previous mode, True if it was checked
+
+    """
+    global _checked
+    previous, _checked = _checked, bool(checked)
+    return previous
+
+
+@contextmanager
+def checked_mode(checked: bool) -> Iterator[None]:
+    """Run a block in the checked or the fast mode, and switch back after it.
+
+    ```
+    with checked_mode(False):
+        agent.train()
+    ```
+
+    """
+    previous = set_checked(checked)
+    try:
+        yield
+    finally:
+        set_checked(previous)
+
 
 def seed_everything(seed: int) -> None:
     """Seed every randomness to seed"""
@@ -23,6 +70,25 @@ def seed_everything(seed: int) -> None:
     torch.backends.cudnn.benchmark = True
 
 
+def get_rng_states() -> dict:
+    """Get the states of every randomness that `seed_everything` seeds."""
+    return {
+        "random": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else [],
+    }
+
+
+def set_rng_states(states: dict) -> None:
+    """Set the states of every randomness, as returned by `get_rng_states`."""
+    random.setstate(states["random"])
+    np.random.set_state(states["numpy"])
+    torch.set_rng_state(states["torch"])
+    if states["cuda"]:
+        torch.cuda.set_rng_state_all(states["cuda"])
+
+
 def read_json(fname: str) -> dict:
     """Read json"""
     with open(fname, "r") as stream:
@@ -0,0 +1,81 @@
+import unittest
+from unittest import mock
+
+import agent.benchmark
+from agent.benchmark import (compare, run_benchmarks, scaling_curve,
+                             scaling_exponent)
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_run(self) -> None:
+        results = run_benchmarks(
+            ["process_graph", "replay.sample_batch"],
+            capacities=[12],
+            batch_sizes=[1, 2],
+            repeat=1,
+            min_time=0,
+        )
+        self.assertEqual(
+            list(results["results"]),
+            [
+                "process_graph/capacity=12",
+                "replay.sample_batch/capacity=12/batch=1",
+                "replay.sample_batch/capacity=12/batch=2",
+            ],
+        )
+        self.assertGreater(results["results"]["process_graph/capacity=12"]["min_s"], 0)
+
+    def test_pattern(self) -> None:
+        """Test that the cases that don't match the pattern aren't built."""
+        with mock.patch.object(
+            agent.benchmark, "make_states", wraps=agent.benchmark.make_states
+        ) as make_states, mock.patch.object(
+            agent.benchmark, "_gnn", side_effect=AssertionError
+        ):
+            results = run_benchmarks(
+                ["process_graph", "gnn.forward", "replay.sample_batch"],
+                capacities=[12, 24],
+                batch_sizes=[1, 2],
+                pattern="sample_batch/capacity=24/batch=2",
+                repeat=1,
+                min_time=0,
+            )
+        self.assertEqual(
+            list(results["results"]), ["replay.sample_batch/capacity=24/batch=2"]
+        )
+        self.assertEqual(make_states.call_count, 1)
+
+    def test_compare(self) -> None:
+        baseline = {"results": {case: {"median_s": 1.0} for case in "abcd"}}
+        results = {
+            "results": {
+                "a": {"median_s": 1.5},
+                "b": {"median_s": 0.5},
+                "c": {"median_s": 1.05},
+                "e": {"median_s": 1.0},
+            }
+        }
+        rows = compare(results, baseline, threshold=0.1)
+        self.assertEqual(
+            {row["case"]: row["status"] for row in rows},
+            {
+                "a": "regression",
+                "b": "improvement",
+                "c": "same",
+                "d": "missing",
+                "e": "new",
+            },
+        )
+
+    def test_scaling(self) -> None:
+        self.assertAlmostEqual(
+            scaling_exponent([10, 100, 1000, 10000], [5, 1, 10, 100]), 1.0
+        )
+        self.assertAlmostEqual(scaling_exponent([10, 100], [1, 100]), 2.0)
+
+        curve = scaling_curve("vanilla", sizes=[20, 200], repeat=1, min_time=0)
+        self.assertEqual(
+            [point["num_quadruples"] for point in curve["points"]], [20, 200]
+        )
+        self.assertGreater(curve["points"][1]["allocated_bytes"], 0)
+        self.assertIsInstance(curve["time_exponent"], float)
@@ -0,0 +1,122 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+import yaml
+
+from agent.dqn.artifacts import Artifact, ArtifactWriter, convert_yaml
+from agent.dqn.metrics import read_metric
+
+
+class TestArtifact(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_write_and_read(self):
+        path = os.path.join(self.dir.name, "states_q_values_actions_test")
+        rows = [
+            {
+                "state": [["agent", "atlocation", "room0", {"current_time": step}]],
+                "q_values_mm": np.full((step, 3), step, dtype=np.float32),
+                "action_explore": step % 5,
+            }
+            for step in range(7)
+        ]
+        writer = ArtifactWriter(path, shard_size=3)
+        for row in rows:
+            writer.append(row)
+        self.assertEqual(Artifact(path).num_rows, 6)  # two full shards so far
+        writer.close()
+
+        artifact = Artifact(path)
+        self.assertEqual(len(artifact), 7)
+        self.assertEqual(artifact.num_shards, 3)
+        self.assertEqual(artifact.columns["state"]["kind"], "json")
+        self.assertEqual(artifact.columns["q_values_mm"]["kind"], "array")
+        for step, row in enumerate(rows):
+            loaded = artifact.row(step)
+            self.assertEqual(loaded["state"], row["state"])
+            self.assertEqual(loaded["q_values_mm"].shape, (step, 3))
+            self.assertEqual(loaded["q_values_mm"].dtype, np.float32)
+            np.testing.assert_array_equal(loaded["q_values_mm"], row["q_values_mm"])
+            self.assertEqual(loaded["action_explore"], step % 5)
+        self.assertEqual(
+            [int(action) for action in artifact.column("action_explore")],
+            [step % 5 for step in range(7)],
+        )
+        self.assertIsInstance(artifact._load("q_values_mm", 0)[0], np.memmap)
+        with self.assertRaises(IndexError):
+            artifact.get("state", 7)
+
+    def test_append_to_open_shard(self):
+        path = os.path.join(self.dir.name, "q_values")
+        writer = ArtifactWriter(path, shard_size=4)
+        for step in range(10):
+            writer.append({"value": np.full(step % 3, step, dtype=np.float64)})
+            writer.flush()
+            artifact = Artifact(path)
+            self.assertEqual(len(artifact), step + 1)
+            self.assertEqual(artifact.num_shards, step // 4 + 1)
+        self.assertEqual(
+            [value.tolist() for value in Artifact(path).column("value", start=7)],
+            [[7.0], [8.0, 8.0], []],
+        )
+        # 3 shards of a value and an index file, the manifest, and the shard list.
+        self.assertEqual(len(os.listdir(path)), 3 * 2 + 2)
+
+        state = pickle.loads(pickle.dumps(writer))
+        writer.append({"value": np.ones(2)})
+        writer.append({"value": np.ones(2)})
+        writer.append({"value": np.ones(2)})
+        writer.flush()
+        self.assertEqual(Artifact(path).num_shards, 4)
+        state.truncate()
+        artifact = Artifact(path)
+        self.assertEqual((len(artifact), artifact.num_shards), (10, 3))
+        self.assertEqual(artifact.get("value", 8).tolist(), [8.0, 8.0])
+        self.assertEqual(len(os.listdir(path)), 3 * 2 + 2)
+
+    def test_convert_yaml(self):
+        default_root_dir = self.dir.name
+        q_values = {
+            split: {
+                "explore": [[[0.1, 0.2, 0.3, 0.4, 0.5]]] * 2,
+                "mm": [[[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]], []],
+            }
+            for split in ["train", "val", "test"]
+        }
+        states_q_values_actions = [
+            {
+                "state": [["agent", "atlocation", "room0", {"current_time": 0}]],
+                "q_values_explore": [[0.1, 0.2, 0.3, 0.4, 0.5]],
+                "action_explore": [4],
+                "q_values_mm": [[0.1, 0.2, 0.3]],
+                "action_mm": [1],
+            }
+        ]
+        with open(os.path.join(default_root_dir, "q_values.yaml"), "w") as stream:
+            yaml.dump(q_values, stream)
+        with open(
+            os.path.join(default_root_dir, "states_q_values_actions_test.yaml"), "w"
+        ) as stream:
+            yaml.dump(states_q_values_actions, stream)
+
+        written = convert_yaml(default_root_dir)
+        self.assertEqual(len(written), 7)
+
+        loaded = read_metric(
+            os.path.join(default_root_dir, "metrics", "q_values_val_mm")
+        )
+        self.assertEqual([value.tolist() for value in loaded], q_values["val"]["mm"])
+
+        artifact = Artifact(
+            os.path.join(default_root_dir, "states_q_values_actions_test")
+        )
+        row = artifact.row(0)
+        self.assertEqual(row["state"], states_q_values_actions[0]["state"])
+        self.assertEqual(row["action_mm"].tolist(), [1])
@@ -0,0 +1,56 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import torch
+
+from agent.dqn.checkpoints import CheckpointManager, read_index
+
+
+class TestCheckpointManager(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_top_k(self):
+        checkpoints = CheckpointManager(self.dir.name, top_k=2)
+        for episode, score in enumerate([3, 5, 1, 5, 4]):
+            checkpoints.save({"w": torch.tensor(float(episode))}, episode, score)
+        checkpoints.close()
+
+        # Of the same scores, the later episode is the better one.
+        self.assertEqual(
+            [(entry["episode"], entry["score"]) for entry in checkpoints.entries],
+            [(3, 5), (1, 5)],
+        )
+        self.assertEqual(read_index(self.dir.name), checkpoints.entries)
+        self.assertEqual(
+            sorted(os.listdir(self.dir.name)),
+            sorted(["checkpoints.json"] + [e["path"] for e in checkpoints.entries]),
+        )
+        self.assertEqual(torch.load(checkpoints.best())["w"].item(), 3.0)
+
+    def test_restore_and_pickle(self):
+        checkpoints = CheckpointManager(self.dir.name)
+        checkpoints.save({"w": torch.tensor(1.0)}, 0, 1)
+        state_dicts = [torch.load(path) for path in checkpoints.paths()]
+        entries = list(checkpoints.entries)
+        loaded = pickle.loads(pickle.dumps(checkpoints))
+        checkpoints.close()
+
+        with tempfile.TemporaryDirectory() as directory:
+            loaded.directory = directory
+            loaded.restore(entries, state_dicts)
+            loaded.save({"w": torch.tensor(2.0)}, 1, 0)
+            self.assertEqual(torch.load(loaded.best())["w"].item(), 1.0)
+            self.assertEqual(read_index(directory), entries)
+            loaded.close()
+
+    def test_error(self):
+        checkpoints = CheckpointManager(os.path.join(self.dir.name, "does_not_exist"))
+        checkpoints.save({"w": torch.tensor(1.0)}, 0, 1)
+        with self.assertRaises(RuntimeError):
+            checkpoints.wait()
@@ -0,0 +1,98 @@
+import os
+import socket
+import tempfile
+import unittest
+
+import torch
+
+from agent.dqn.distributed import (all_reduce_gradients, all_reduce_mean,
+                                   broadcast_object, broadcast_parameters,
+                                   launch, shard_batch_size)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def data_parallel_step(rank: int, world_size: int, out_dir: str) -> None:
+    torch.manual_seed(rank)  # different initial weights on every rank
+    model = torch.nn.Linear(4, 2)
+    broadcast_parameters(model)
+
+    torch.manual_seed(0)
+    x = torch.randn(8, 4)
+    y = torch.randn(8, 2)
+    shard = shard_batch_size(8, world_size)
+
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    loss = torch.nn.functional.mse_loss(
+        model(x[rank * shard : (rank + 1) * shard]),
+        y[rank * shard : (rank + 1) * shard],
+    )
+    optimizer.zero_grad()
+    loss.backward()
+    all_reduce_gradients(model)
+    optimizer.step()
+
+    mean = all_reduce_mean([float(rank)])
+    torch.save(
+        {"state_dict": model.state_dict(), "mean": mean},
+        os.path.join(out_dir, f"rank={rank}.pt"),
+    )
+
+
+def receive_object(rank: int, world_size: int, out_dir: str) -> None:
+    received = broadcast_object(f"rank={rank}")
+    torch.save(received, os.path.join(out_dir, f"rank={rank}.pt"))
+
+
+class TestDistributed(unittest.TestCase):
+    def test_shard_batch_size(self):
+        self.assertEqual(shard_batch_size(32, 4), 8)
+        with self.assertRaises(ValueError):
+            shard_batch_size(32, 3)
+
+    def test_data_parallel_step(self):
+        with tempfile.TemporaryDirectory() as out_dir:
+            launch(
+                data_parallel_step,
+                2,
+                (out_dir,),
+                master_port=free_port(),
+            )
+            results = [
+                torch.load(os.path.join(out_dir, f"rank={rank}.pt"))
+                for rank in range(2)
+            ]
+
+        # Every rank ends up with the same weights ...
+        for key, val in results[0]["state_dict"].items():
+            self.assertTrue(torch.equal(val, results[1]["state_dict"][key]))
+        self.assertEqual(results[0]["mean"], [0.5])
+
+        # ... which are the same as one step on the full batch on one process.
+        torch.manual_seed(0)
+        model = torch.nn.Linear(4, 2)
+        torch.manual_seed(0)
+        x = torch.randn(8, 4)
+        y = torch.randn(8, 2)
+        optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+        loss = torch.nn.functional.mse_loss(model(x), y)
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        for key, val in model.state_dict().items():
+            self.assertTrue(
+                torch.allclose(val, results[0]["state_dict"][key], atol=1e-6)
+            )
+
+    def test_broadcast_object(self):
+        with tempfile.TemporaryDirectory() as out_dir:
+            launch(receive_object, 2, (out_dir,), master_port=free_port())
+            received = [
+                torch.load(os.path.join(out_dir, f"rank={rank}.pt"))
+                for rank in range(2)
+            ]
+        self.assertEqual(received, ["rank=0", "rank=0"])
@@ -0,0 +1,93 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+
+from agent.dqn.metrics import MetricSeries, read_metric
+
+
+class TestMetricSeries(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_decimation(self):
+        series = MetricSeries(history_size=4, flush_interval=3)
+        for step in range(10):
+            series.append(float(step))
+
+        self.assertEqual(list(series), [0.0, 4.0, 8.0, 9.0])
+        self.assertEqual(series.steps, [0, 4, 8, 9])
+        self.assertEqual(series[-1], 9.0)
+        self.assertEqual(series.stride, 4)
+        self.assertEqual(list(series.recent), [float(step) for step in range(10)])
+
+    def test_bounded(self):
+        series = MetricSeries(ring_size=10, history_size=100, flush_interval=7)
+        for step in range(10000):
+            series.append(float(step))
+
+        self.assertLessEqual(len(series.history), 100)
+        self.assertEqual(len(series.recent), 10)
+        self.assertEqual(series[-1], 9999.0)
+        steps = series.steps
+        self.assertEqual(steps[0], 0)
+        self.assertEqual(len(set(np.diff(steps[:-1]))), 1)  # evenly spaced
+
+    def test_tensors_and_file(self):
+        path = os.path.join(self.dir.name, "loss.f64")
+        series = MetricSeries(path, history_size=4, flush_interval=4)
+        for step in range(10):
+            series.append(torch.tensor(float(step)))
+        self.assertEqual(len(series._pending), 2)
+
+        self.assertEqual(np.asarray(series).tolist(), [0.0, 4.0, 8.0, 9.0])
+        # Reading the series doesn't write it.
+        self.assertEqual(read_metric(path), [float(step) for step in range(8)])
+        series.append(torch.tensor(10.0))
+        series.append(torch.tensor(11.0))
+        self.assertEqual(read_metric(path), [float(step) for step in range(12)])
+
+    def test_arrays_and_file(self):
+        path = os.path.join(self.dir.name, "q_values")
+        series = MetricSeries(path, flush_interval=2)
+        for step in range(3):
+            series.append(np.array([[step, step + 1.0]]))
+
+        self.assertEqual(
+            [value.tolist() for value in series], [[[0, 1]], [[1, 2]], [[2, 3]]]
+        )
+        self.assertEqual(len(read_metric(path)), 2)
+        series.flush()
+        self.assertEqual(
+            [value.tolist() for value in read_metric(path)],
+            [[[0, 1]], [[1, 2]], [[2, 3]]],
+        )
+
+        loaded = pickle.loads(pickle.dumps(series))
+        series.append(np.array([[3, 4.0]]))
+        series.flush()
+        self.assertEqual(len(read_metric(path)), 4)
+        loaded.truncate()
+        self.assertEqual(len(read_metric(path)), 3)
+
+    def test_pickle_and_truncate(self):
+        path = os.path.join(self.dir.name, "loss.f64")
+        series = MetricSeries(path)
+        for step in range(5):
+            series.append(float(step))
+        loaded = pickle.loads(pickle.dumps(series))
+
+        for step in range(5, 8):
+            series.append(float(step))
+        series.flush()
+        self.assertEqual(len(read_metric(path)), 8)
+
+        loaded.truncate()
+        self.assertEqual(read_metric(path), [0.0, 1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(list(loaded), [0.0, 1.0, 2.0, 3.0, 4.0])
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from agent.dqn.artifacts import ArtifactWriter
+from agent.dqn.plotting import BackgroundPlotter, MetricsReader, render
+
+
+class TestMetricsReader(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.metrics_dir = os.path.join(self.dir.name, "metrics")
+        os.makedirs(self.metrics_dir)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_incremental_update(self):
+        for name in ["epsilons", "training_loss_total"]:
+            with open(os.path.join(self.metrics_dir, f"{name}.f64"), "wb") as stream:
+                np.arange(5, dtype=np.float64).tofile(stream)
+        writer = ArtifactWriter(os.path.join(self.metrics_dir, "q_values_train_mm"))
+        writer.append({"value": np.array([[0, 1.0, 2.0], [0, 3.0, 4.0]])})
+        writer.append({"value": np.array([[1, 1.0, 2.0]])})
+        writer.flush()
+        # Not flushed yet, so not there for the reader.
+        writer.append({"value": np.array([[2, 5.0, 6.0]])})
+
+        reader = MetricsReader(self.metrics_dir, history_size=4)
+        reader.update()
+        self.assertEqual(reader.get("epsilons.f64"), ([0, 2, 4], [0.0, 2.0, 4.0]))
+        self.assertEqual(reader.get("q_values_train_mm/1")[1], [1.0, 3.0, 1.0])
+
+        with open(os.path.join(self.metrics_dir, "epsilons.f64"), "ab") as stream:
+            np.arange(5, 9, dtype=np.float64).tofile(stream)
+        writer.flush()
+        reader.update()
+        self.assertEqual(reader.get("epsilons.f64"), ([0, 4, 8], [0.0, 4.0, 8.0]))
+        self.assertEqual(reader.get("q_values_train_mm/1")[1], [1.0, 3.0, 1.0, 5.0])
+        self.assertEqual(reader.get("does_not_exist.f64"), ([], []))
+
+    def test_render(self):
+        with open(os.path.join(self.metrics_dir, "epsilons.f64"), "wb") as stream:
+            np.linspace(1, 0, 100).tofile(stream)
+        reader = MetricsReader(self.metrics_dir)
+        reader.update()
+        path = os.path.join(self.dir.name, "plot.pdf")
+        render(
+            reader,
+            path,
+            scores={"train": [1, 2, 3], "val": [[1, 2], [3, 4]], "test": None},
+            iteration_idx=10,
+            num_iterations=100,
+            total_maximum_episode_rewards=100,
+        )
+        self.assertTrue(os.path.isfile(path))
+        self.assertEqual(sorted(os.listdir(self.dir.name)), ["metrics", "plot.pdf"])
+
+
+class TestBackgroundPlotter(unittest.TestCase):
+    def test_submit_and_close(self):
+        with tempfile.TemporaryDirectory() as default_root_dir:
+            os.makedirs(os.path.join(default_root_dir, "metrics"))
+            with open(
+                os.path.join(default_root_dir, "metrics", "epsilons.f64"), "wb"
+            ) as stream:
+                np.linspace(1, 0, 100).tofile(stream)
+
+            plotter = BackgroundPlotter(default_root_dir)
+            for iteration_idx in range(10):
+                plotter.submit(scores={"train": [1, 2]}, iteration_idx=iteration_idx)
+            plotter.close()
+
+            self.assertEqual(plotter.process.exitcode, 0)
+            self.assertTrue(os.path.isfile(os.path.join(default_root_dir, "plot.pdf")))
@@ -0,0 +1,183 @@
+import multiprocessing as mp
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+
+from agent.dqn.nn.utils import process_encoded_graph, process_graph
+from agent.dqn.shared_replay import (SharedReplayBuffer, decode_state,
+                                     encode_state)
+
+entities = ["agent", "room_000", "room_001", "wall", "dep_001", "sta_000"]
+relations = ["atlocation", "north", "south", "atlocation_inv", "north_inv"]
+
+
+def make_state(i: int) -> list[list]:
+    return [
+        ["agent", "atlocation", "room_000", {"current_time": i, "strength": 1.6}],
+        ["room_000", "north", "wall", {"current_time": i}],
+        ["dep_001", "atlocation", "room_001", {"timestamp": [1, i]}],
+        ["sta_000", "atlocation", "room_001", {"timestamp": [i], "strength": 2}],
+    ]
+
+
+def produce(buffer: SharedReplayBuffer, start: int, num: int) -> None:
+    for i in range(start, start + num):
+        buffer.store(make_state(i), i % 5, [0, 1], float(i), float(i), make_state(i), 0)
+    buffer.close()
+
+
+class TestEncodeDecodeState(unittest.TestCase):
+    def test_round_trip(self):
+        entity_to_idx = {e: i for i, e in enumerate(entities)}
+        relation_to_idx = {r: i for i, r in enumerate(relations)}
+        state = make_state(7)
+        triples, quals, num = encode_state(state, entity_to_idx, relation_to_idx, 6)
+
+        self.assertEqual(triples.shape, (6, 3))
+        self.assertEqual(num, 4)
+        self.assertTrue((triples[4:] == -1).all())
+
+        decoded = decode_state(triples, quals, num, entities, relations)
+        self.assertEqual(decoded[0], state[0])
+        self.assertEqual(decoded[1], state[1])
+        # Only the maximum timestamp is kept.
+        self.assertEqual(
+            decoded[2], ["dep_001", "atlocation", "room_001", {"timestamp": [7]}]
+        )
+        self.assertEqual(decoded[3], state[3])
+
+    def test_process_encoded_graph(self):
+        """Test that the GNN reads an encoded state like the decoded one."""
+        entity_to_idx = {e: i for i, e in enumerate(entities)}
+        relation_to_idx = {r: i for i, r in enumerate(relations)}
+        state = make_state(7)
+        encoded = encode_state(state, entity_to_idx, relation_to_idx, 6)
+
+        expected = process_graph(decode_state(*encoded, entities, relations))
+        actual = process_encoded_graph(*encoded, entities, relations)
+        self.assertEqual(len(actual), len(expected))
+        for a, e in zip(actual, expected):
+            if isinstance(e, torch.Tensor):
+                self.assertTrue(torch.equal(a, e))
+            else:
+                self.assertEqual(a, e)
+
+    def test_too_many_memories(self):
+        with self.assertRaises(ValueError):
+            encode_state(make_state(0), {e: i for i, e in enumerate(entities)}, {}, 2)
+
+
+class TestSharedReplayBuffer(unittest.TestCase):
+    def setUp(self):
+        self.buffer = SharedReplayBuffer(
+            size=64,
+            batch_size=8,
+            max_memories=6,
+            max_short=3,
+            entities=entities,
+            relations=relations,
+        )
+
+    def tearDown(self):
+        self.buffer.close()
+        self.buffer.unlink()
+
+    def test_store_and_sample(self):
+        for i in range(20):
+            self.buffer.store(
+                make_state(i),
+                np.array(i % 5),
+                np.array([i % 3]),
+                float(i) * 2,
+                float(i),
+                make_state(i + 1),
+                i % 2 == 0,
+            )
+        self.assertEqual(len(self.buffer), 20)
+
+        batch = self.buffer.sample_batch()
+        for key in [
+            "obs",
+            "next_obs",
+            "acts_explore",
+            "acts_mm",
+            "rews_explore",
+            "rews_mm",
+            "done",
+        ]:
+            self.assertEqual(len(batch[key]), 8)
+
+        obs = [decode_state(*state, entities, relations) for state in batch["obs"]]
+        next_obs = [
+            decode_state(*state, entities, relations) for state in batch["next_obs"]
+        ]
+        nums = [state[0][3]["current_time"] for state in obs]
+        self.assertEqual(nums, [state[0][3]["current_time"] - 1 for state in next_obs])
+        self.assertEqual([n % 5 for n in nums], batch["acts_explore"].tolist())
+        self.assertEqual(
+            [[n % 3] for n in nums], [a.tolist() for a in batch["acts_mm"]]
+        )
+        self.assertEqual([float(n) for n in nums], batch["rews_mm"].tolist())
+        self.assertEqual([float(n % 2 == 0) for n in nums], batch["done"].tolist())
+
+    def test_ring_buffer_wraps(self):
+        for i in range(100):
+            self.buffer.store(make_state(i), 0, [0], 0.0, 0.0, make_state(i), False)
+        self.assertEqual(len(self.buffer), 64)
+        self.assertEqual(self.buffer.ptr, 100 % 64)
+
+    def test_multiple_producers(self):
+        workers = [
+            mp.Process(target=produce, args=(self.buffer, idx * 10, 10))
+            for idx in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+        self.assertEqual(len(self.buffer), 40)
+        stored = sorted(self.buffer.rews_mm_buf[:40].tolist())
+        self.assertEqual(stored, [float(i) for i in range(40)])
+        self.assertEqual(len(self.buffer.sample_batch()["obs"]), 8)
+
+    def test_save_and_load(self):
+        for i in range(20):
+            self.buffer.store(
+                make_state(i), i % 5, [0], 0.0, float(i), make_state(i), 0
+            )
+        loaded = SharedReplayBuffer(
+            size=64,
+            batch_size=8,
+            max_memories=6,
+            max_short=3,
+            entities=entities,
+            relations=relations,
+        )
+        try:
+            with tempfile.TemporaryDirectory() as dir_path:
+                path = os.path.join(dir_path, "buffer.npz")
+                self.buffer.save(path)
+                loaded.load(path)
+
+            self.assertEqual(len(loaded), 20)
+            self.assertEqual(loaded.ptr, 20)
+            np.random.seed(0)
+            expected = self.buffer.sample_batch()
+            np.random.seed(0)
+            batch = loaded.sample_batch()
+            self.assertEqual(batch["rews_mm"].tolist(), expected["rews_mm"].tolist())
+            for state, expected_state in zip(batch["obs"], expected["obs"]):
+                for array, expected_array in zip(state, expected_state):
+                    np.testing.assert_array_equal(array, expected_array)
+
+            # Storing after loading still works.
+            loaded.store(make_state(20), 0, [0], 0.0, 20.0, make_state(20), 0)
+            self.assertEqual(len(loaded), 21)
+        finally:
+            loaded.close()
+            loaded.unlink()
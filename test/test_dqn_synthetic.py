@@ -0,0 +1,70 @@
+import unittest
+
+import numpy as np
+
+from agent.dqn.nn import GNN
+from agent.dqn.nn.utils import process_graph
+from agent.dqn.synthetic import generate_working_memory, make_vocab
+
+
+class SyntheticTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.vocab = make_vocab()
+
+    def test_working_memory(self) -> None:
+        entities = set(self.vocab["entities"])
+        relations = set(self.vocab["relations"])
+        for num_quadruples in [1, 10, 1000]:
+            state = generate_working_memory(
+                num_quadruples, self.vocab, current_time=7, seed=0
+            )
+            self.assertEqual(len(state), num_quadruples)
+            self.assertEqual(state[0][:2], ["agent", "atlocation"])
+            self.assertEqual(state[0][3], {"current_time": 7})
+
+            for idx, (head, relation, tail, qualifiers) in enumerate(state):
+                self.assertIn(head, entities)
+                self.assertIn(relation, relations)
+                self.assertIn(tail, entities)
+                (key,) = qualifiers
+                self.assertEqual(key == "current_time", idx < min(15, num_quadruples))
+                if key == "timestamp":
+                    self.assertEqual(qualifiers[key], sorted(set(qualifiers[key])))
+                    self.assertLessEqual(max(qualifiers[key]), 7)
+                elif key == "strength":
+                    self.assertTrue(1 <= qualifiers[key] <= 8)
+
+            # All the qualifiers are entities of the GNN.
+            *_, short_memory_idx, _ = process_graph(state)
+            self.assertEqual(len(short_memory_idx), min(15, num_quadruples))
+
+        walls = [quadruple for quadruple in state if quadruple[2] == "wall"]
+        self.assertGreater(len(walls), 0)
+
+    def test_seed(self) -> None:
+        self.assertEqual(
+            generate_working_memory(100, self.vocab, seed=1),
+            generate_working_memory(100, self.vocab, seed=1),
+        )
+        self.assertNotEqual(
+            generate_working_memory(100, self.vocab, seed=1),
+            generate_working_memory(100, self.vocab, seed=2),
+        )
+
+    def test_gnn_forward(self) -> None:
+        gnn = GNN(
+            entities=self.vocab["entities"],
+            relations=self.vocab["relations"],
+            gcn_layer_params={
+                "type": "stare",
+                "embedding_dim": 8,
+                "num_layers": 2,
+                "gcn_drop": 0.1,
+                "triple_qual_weight": 0.8,
+            },
+        )
+        data = np.empty(2, dtype=object)
+        data[0] = generate_working_memory(5000, self.vocab, seed=0)
+        data[1] = generate_working_memory(20, self.vocab, seed=1)
+        q_mm = gnn(data, policy_type="mm")
+        self.assertEqual([q.shape for q in q_mm], [(15, 3), (15, 3)])
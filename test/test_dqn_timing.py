@@ -0,0 +1,46 @@
+import time
+import unittest
+
+from agent.dqn.timing import PhaseTimer, format_summary
+
+
+class TestPhaseTimer(unittest.TestCase):
+    def test_summary(self):
+        timer = PhaseTimer()
+        for _ in range(3):
+            with timer.phase("step"):
+                with timer.phase("step.env_step"):
+                    time.sleep(0.01)
+            timer.count("env_steps")
+        for size in [0, 1, 5, 6, 100]:
+            timer.observe("nodes", size)
+
+        summary = timer.summary()
+        self.assertEqual(list(summary["phases"]), ["step", "step.env_step"])
+        self.assertEqual(summary["phases"]["step"]["calls"], 3)
+        self.assertGreaterEqual(summary["phases"]["step"]["total_s"], 0.03)
+        self.assertGreater(summary["rates"]["env_steps"], 0)
+        self.assertEqual(
+            summary["sizes"]["nodes"],
+            {
+                "mean": 22.4,
+                "min": 0,
+                "max": 100,
+                "histogram": {0: 1, 1: 1, 4: 2, 64: 1},
+            },
+        )
+        self.assertIn("env_steps/s", format_summary(summary))
+
+        timer.reset()
+        self.assertEqual(timer.summary()["phases"], {})
+
+    def test_disabled(self):
+        timer = PhaseTimer(enabled=False)
+        with timer.phase("step"):
+            pass
+        timer.count("env_steps")
+        timer.observe("nodes", 3)
+        summary = timer.summary()
+        self.assertEqual(
+            (summary["phases"], summary["rates"], summary["sizes"]), ({}, {}, {})
+        )
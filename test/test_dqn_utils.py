@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 from typing import Literal
 
@@ -5,12 +7,21 @@ import numpy as np
 import torch
 
 from agent.dqn.nn import GNN
-from agent.dqn.utils import (ReplayBuffer, compute_loss_explore,
-                             compute_loss_mm, console, find_non_masked_rows,
-                             plot_results, save_final_results,
-                             save_states_q_values_actions, save_validation,
-                             select_action, target_hard_update, update_epsilon,
-                             update_model)
+from agent.dqn.utils import (
+    ReplayBuffer,
+    compute_loss_explore,
+    compute_loss_mm,
+    console,
+    find_non_masked_rows,
+    plot_results,
+    save_final_results,
+    save_states_q_values_actions,
+    save_validation,
+    select_action,
+    target_hard_update,
+    update_epsilon,
+    update_model,
+)
 
 batch = {
     "obs": np.array(
@@ -672,6 +683,65 @@ class TestReplayBuffer(unittest.TestCase):
         self.assertEqual(nums, [foo["state"] - 1 for foo in batch["next_obs"]])
         self.assertTrue(([foo % 2 == 0 for foo in nums] == batch["done"]).all())
 
+    def test_save_and_load(self):
+        entities = ["agent", "room_000", "wall"]
+        relations = ["atlocation", "north"]
+        for i in range(120):
+            self.buffer.store(
+                [["agent", "atlocation", "room_000", {"current_time": i}]],
+                i % 5,
+                list(range(i % 3)),
+                float(i) * 2,
+                float(i),
+                [
+                    ["agent", "atlocation", "room_000", {"current_time": i + 1}],
+                    ["room_000", "north", "wall", {"timestamp": [i], "strength": 2}],
+                    [
+                        "agent",
+                        "atlocation",
+                        "room_000",
+                        {"strength": 0.8**i, "timestamp": [0, i, 1]},
+                    ],
+                ],
+                i % 2 == 0,
+            )
+
+        with tempfile.TemporaryDirectory() as dir_name:
+            path = os.path.join(dir_name, "replay_buffer.npz")
+            self.buffer.save(path, entities, relations)
+            loaded = ReplayBuffer(size=100, batch_size=32)
+            loaded.load(path, entities, relations)
+
+        self.assertEqual((loaded.ptr, loaded.size), (self.buffer.ptr, 100))
+        for idx in range(100):
+            self.assertEqual(loaded.obs_buf[idx], self.buffer.obs_buf[idx])
+            self.assertEqual(loaded.next_obs_buf[idx], self.buffer.next_obs_buf[idx])
+            # The order of the qualifiers and the types of their values are kept.
+            for loaded_mem, mem in zip(
+                loaded.next_obs_buf[idx], self.buffer.next_obs_buf[idx]
+            ):
+                self.assertEqual(list(loaded_mem[3]), list(mem[3]))
+                self.assertEqual(
+                    [type(val) for val in loaded_mem[3].values()],
+                    [type(val) for val in mem[3].values()],
+                )
+            self.assertEqual(
+                loaded.acts_mm_buf[idx].tolist(), self.buffer.acts_mm_buf[idx]
+            )
+        self.assertTrue((loaded.acts_explore_buf == self.buffer.acts_explore_buf).all())
+        self.assertTrue((loaded.rews_mm_buf == self.buffer.rews_mm_buf).all())
+        self.assertTrue((loaded.done_buf == self.buffer.done_buf).all())
+
+        np.random.seed(0)
+        before = self.buffer.sample_batch()
+        np.random.seed(0)
+        after = loaded.sample_batch()
+        for key in ["obs", "next_obs", "acts_explore", "rews_explore", "done"]:
+            self.assertEqual(after[key].tolist(), before[key].tolist())
+        self.assertEqual(
+            [acts.tolist() for acts in after["acts_mm"]], list(before["acts_mm"])
+        )
+
 
 class TestFindNonMaskedRows(unittest.TestCase):
 
@@ -0,0 +1,87 @@
+import gc
+import tempfile
+import unittest
+
+import gymnasium as gym
+
+from agent.env_pool import HISTORY, EnvPool, env_pool
+from agent.handcrafted import HandcraftedAgent
+from agent.local_env import LOCAL_ENV_STR
+
+ENV_CONFIG = {"room_size": "m", "terminates_at": 9, "num_total_questions": 10}
+
+
+class EnvPoolTest(unittest.TestCase):
+    def test_same_env_for_every_seed(self) -> None:
+        pool = EnvPool()
+        env = pool.get(LOCAL_ENV_STR, {**ENV_CONFIG, "seed": 0})
+        pool.put(env)
+        self.assertIs(pool.get(LOCAL_ENV_STR, {**ENV_CONFIG, "seed": 1}), env)
+        self.assertIsNot(
+            pool.get(LOCAL_ENV_STR, {**ENV_CONFIG, "seed": 1, "room_size": "s"}), env
+        )
+        self.assertEqual(len(pool), 2)
+        pool.close_all()
+        self.assertEqual(len(pool), 0)
+
+    def test_checked_out_once(self) -> None:
+        pool = EnvPool()
+        env = pool.get(LOCAL_ENV_STR, {**ENV_CONFIG, "seed": 0})
+        other = pool.get(LOCAL_ENV_STR, {**ENV_CONFIG, "seed": 1})
+        self.assertIsNot(other, env)
+        self.assertEqual(env.unwrapped.seed, 0)
+        self.assertEqual(len(pool), 2)
+
+        pool.put(env)
+        with self.assertRaises(ValueError):
+            pool.put(env)
+        self.assertIs(pool.get(LOCAL_ENV_STR, {**ENV_CONFIG, "seed": 2}), env)
+        self.assertEqual(other.unwrapped.seed, 1)
+        pool.close_all()
+
+    def test_history_cleared(self) -> None:
+        pool = EnvPool()
+        env = pool.get("room_env:RoomEnv-v2", {**ENV_CONFIG, "seed": 0})
+        env.reset()
+        self.assertEqual(len(env.unwrapped.observations_all), 1)
+        pool.put(env)
+
+        env = pool.get("room_env:RoomEnv-v2", {**ENV_CONFIG, "seed": 0})
+        for name in HISTORY:
+            self.assertEqual(getattr(env.unwrapped, name), [])
+        pool.close_all()
+
+    def test_reseeded_like_a_new_env(self) -> None:
+        for env_str in [LOCAL_ENV_STR, "room_env:RoomEnv-v2"]:
+            env_config = {**ENV_CONFIG, "seed": 3}
+            env = gym.make(env_str, **env_config)
+            expected = [env.reset()[0] for _ in range(2)]
+
+            pool = EnvPool()
+            env = pool.get(env_str, {**ENV_CONFIG, "seed": 1})
+            env.reset()
+            pool.put(env)
+            env = pool.get(env_str, env_config)
+            self.assertEqual(env.unwrapped.seed, 3)
+            self.assertEqual([env.reset()[0] for _ in range(2)], expected)
+
+    def test_agents_put_their_envs_back(self) -> None:
+        with tempfile.TemporaryDirectory() as default_root_dir:
+            kwargs = {
+                "env_str": LOCAL_ENV_STR,
+                "env_config": {**ENV_CONFIG, "seed": 0},
+                "num_samples_for_results": 1,
+                "default_root_dir": default_root_dir,
+            }
+            agent = HandcraftedAgent(**kwargs)
+            env = agent.env
+            del agent
+            gc.collect()
+            agent = HandcraftedAgent(**kwargs)
+            self.assertIs(agent.env, env)
+
+            agent.test()
+            self.assertIsNone(agent.env)
+            self.assertIs(HandcraftedAgent(**kwargs).env, env)
+            gc.collect()
+            self.assertNotIn(id(env), env_pool.checked_out)
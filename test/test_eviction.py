@@ -0,0 +1,104 @@
+import random
+import unittest
+from copy import deepcopy
+
+from humemai.memory import LongMemory, MemorySystems, ShortMemory
+
+from agent.eviction import EvictionIndex
+from agent.policy import manage_memory
+
+
+def random_memory_systems(seed: int) -> MemorySystems:
+    rng = random.Random(seed)
+    memory_systems = MemorySystems(
+        short=ShortMemory(capacity=20),
+        long=LongMemory(capacity=8, semantic_decay_factor=0.9, min_strength=1),
+    )
+    for _ in range(6):
+        room = f"room{rng.randint(0, 9)}"
+        qualifiers = rng.choice(
+            [
+                {"timestamp": sorted(rng.sample(range(10), 2))},
+                {"strength": rng.randint(1, 5)},
+                {"timestamp": [rng.randint(0, 9)], "strength": rng.randint(1, 5)},
+            ]
+        )
+        mem = ["agent", "atlocation", room, qualifiers]
+        if memory_systems.long.can_be_added(mem)[0]:
+            memory_systems.long.add(mem)
+    return memory_systems
+
+
+class EvictionIndexTest(unittest.TestCase):
+    def test_count_and_select(self) -> None:
+        for seed in range(20):
+            memory_systems = random_memory_systems(seed)
+            index = EvictionIndex(memory_systems.long)
+            self.assertEqual(
+                index.count_memories(), memory_systems.long.count_memories()
+            )
+            for selection in ["oldest", "weakest"]:
+                if index.count_memories()[selection == "weakest"] == 0:
+                    continue
+                long = deepcopy(memory_systems.long)
+                long.forget_by_selection(selection)
+                selected = index.select(selection)
+                self.assertIn(selected, memory_systems.long.entries)
+                self.assertNotIn(selected, long.entries)
+
+    def test_same_as_manage_memory(self) -> None:
+        for seed in range(20):
+            rng = random.Random(seed)
+            observations = [
+                [rng.choice(["agent", "laptop", "phone"]), "atlocation", f"room{i}", t]
+                for t in range(10)
+                for i in rng.sample(range(10), 3)
+            ]
+            policies = [rng.choice(["episodic", "semantic"]) for _ in observations]
+
+            entries = []
+            for use_index in [False, True]:
+                random.seed(seed)
+                memory_systems = random_memory_systems(seed)
+                index = EvictionIndex(memory_systems.long) if use_index else None
+                for obs, policy in zip(observations, policies):
+                    mem_short = ShortMemory.ob2short(obs)
+                    memory_systems.short.add(mem_short)
+                    manage_memory(memory_systems, policy, mem_short, index)
+                    if obs[3] % 3 != 2:
+                        continue
+                    if index is None:
+                        memory_systems.long.decay()
+                    else:
+                        index.decay()
+                entries.append(memory_systems.long.entries)
+                if index is not None:
+                    self.assertEqual(
+                        index.count_memories(), memory_systems.long.count_memories()
+                    )
+
+            self.assertEqual(entries[0], entries[1])
+
+    def test_decay(self) -> None:
+        for factor in [1.0, 0.5]:
+            for seed in range(20):
+                memory_systems = random_memory_systems(seed)
+                memory_systems.long.semantic_decay_factor = factor
+                index = EvictionIndex(memory_systems.long)
+                for _ in range(4):
+                    index.decay()
+                    rebuilt = EvictionIndex(memory_systems.long)
+                    self.assertEqual(index._keys, rebuilt._keys)
+                    self.assertEqual(index.count_memories(), rebuilt.count_memories())
+                    if index.num_strengths:
+                        self.assertIs(
+                            index.select("weakest"), rebuilt.select("weakest")
+                        )
+
+    def test_no_op_decay(self) -> None:
+        memory_systems = random_memory_systems(0)
+        memory_systems.long.semantic_decay_factor = 1.0
+        index = EvictionIndex(memory_systems.long)
+        weakest = list(index._weakest)
+        index.decay()
+        self.assertEqual(index._weakest, weakest)
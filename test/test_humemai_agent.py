@@ -3,12 +3,19 @@ import logging
 logger = logging.getLogger()
 logger.disabled = True
 
+import os
 import random
+import shutil
 import unittest
+from copy import deepcopy
 
+import numpy as np
+import torch
 from tqdm.auto import tqdm
 
 from agent import DQNAgent
+from agent.dqn.checkpoints import read_index
+from agent.dqn.utils import update_model
 
 
 class DQNAgentTest(unittest.TestCase):
@@ -95,3 +102,315 @@ class DQNAgentTest(unittest.TestCase):
                                 )
 
                                 agent.remove_results_from_disk()
+
+    def test_async_validation(self) -> None:
+        terminates_at = 4
+        batch_size = 2
+        num_iterations = (terminates_at + 1) * 2
+        agent = DQNAgent(
+            num_iterations=num_iterations,
+            replay_buffer_size=num_iterations,
+            warm_start=batch_size,
+            batch_size=batch_size,
+            target_update_interval=1,
+            epsilon_decay_until=num_iterations,
+            capacity={"long": 3, "short": 15},
+            dqn_params={
+                "gcn_layer_params": {
+                    "type": "stare",
+                    "embedding_dim": 2,
+                    "num_layers": 2,
+                    "gcn_drop": 0.1,
+                    "triple_qual_weight": 0.8,
+                },
+                "relu_between_gcn_layers": True,
+                "dropout_between_gcn_layers": True,
+                "mlp_params": {"num_hidden_layers": 2, "dueling_dqn": True},
+            },
+            num_samples_for_results={"val": 1, "test": 1},
+            validation_interval=1,
+            plotting_interval=50,
+            env_config={
+                "question_prob": 1.0,
+                "terminates_at": terminates_at,
+                "randomize_observations": "all",
+                "room_size": "xl-different-prob",
+                "rewards": {"correct": 1, "wrong": 0, "partial": 0},
+                "make_everything_static": False,
+                "num_total_questions": 5,
+                "question_interval": 1,
+                "include_walls_in_observations": True,
+            },
+            default_root_dir="training-results/TRASH",
+            async_validation=True,
+        )
+        agent.train()
+
+        self.assertEqual(len(agent.pending_validations), 0)
+        self.assertEqual(len(agent.scores["val"]), 2)
+        self.assertEqual(len(read_index(agent.default_root_dir)), 1)
+        self.assertEqual(
+            len(agent.q_values["val"]["explore"]), len(agent.q_values["val"]["mm"])
+        )
+
+        agent.remove_results_from_disk()
+
+    def test_parallel_evaluation_is_deterministic(self) -> None:
+        terminates_at = 4
+        agent = DQNAgent(
+            num_iterations=10,
+            replay_buffer_size=10,
+            warm_start=2,
+            batch_size=2,
+            capacity={"long": 3, "short": 15},
+            dqn_params={
+                "gcn_layer_params": {
+                    "type": "stare",
+                    "embedding_dim": 2,
+                    "num_layers": 2,
+                    "gcn_drop": 0.1,
+                    "triple_qual_weight": 0.8,
+                },
+                "relu_between_gcn_layers": True,
+                "dropout_between_gcn_layers": True,
+                "mlp_params": {"num_hidden_layers": 2, "dueling_dqn": True},
+            },
+            num_samples_for_results={"val": 3, "test": 3},
+            env_config={
+                "question_prob": 1.0,
+                "terminates_at": terminates_at,
+                "randomize_observations": "all",
+                "room_size": "xl-different-prob",
+                "rewards": {"correct": 1, "wrong": 0, "partial": 0},
+                "make_everything_static": False,
+                "num_total_questions": 5,
+                "question_interval": 1,
+                "include_walls_in_observations": True,
+            },
+            default_root_dir="training-results/TRASH",
+        )
+        agent.dqn.eval()
+
+        results = []
+        for num_workers in [1, 2, 3]:
+            agent.num_evaluation_workers = num_workers
+            results.append(agent.validate_test_middle("test"))
+            agent.close_evaluation_executor()
+
+        for scores, states, q_values, actions in results[1:]:
+            self.assertEqual(scores, results[0][0])
+            self.assertEqual(states, results[0][1])
+            self.assertEqual(actions, results[0][3])
+            self.assertEqual(len(q_values), terminates_at + 1)
+
+        agent.remove_results_from_disk()
+
+    def test_resume(self) -> None:
+        terminates_at = 4
+        num_iterations = (terminates_at + 1) * 3
+        params = {
+            "num_iterations": num_iterations,
+            "replay_buffer_size": num_iterations,
+            "warm_start": 2,
+            "batch_size": 2,
+            "target_update_interval": 1,
+            "epsilon_decay_until": num_iterations,
+            "capacity": {"long": 3, "short": 15},
+            "dqn_params": {
+                "gcn_layer_params": {
+                    "type": "stare",
+                    "embedding_dim": 2,
+                    "num_layers": 2,
+                    "gcn_drop": 0.1,
+                    "triple_qual_weight": 0.8,
+                },
+                "relu_between_gcn_layers": True,
+                "dropout_between_gcn_layers": True,
+                "mlp_params": {"num_hidden_layers": 2, "dueling_dqn": True},
+            },
+            "num_samples_for_results": {"val": 1, "test": 1},
+            "validation_interval": 1,
+            "plotting_interval": 50,
+            "env_config": {
+                "question_prob": 1.0,
+                "terminates_at": terminates_at,
+                "randomize_observations": "all",
+                "room_size": "xl-different-prob",
+                "rewards": {"correct": 1, "wrong": 0, "partial": 0},
+                "make_everything_static": False,
+                "num_total_questions": 5,
+                "question_interval": 1,
+                "include_walls_in_observations": True,
+            },
+            "default_root_dir": "training-results/TRASH",
+            "checkpoint_interval": 1,
+        }
+        agent = DQNAgent(**deepcopy(params))
+        agent.train()
+
+        # The last checkpoint is from the end of the second episode.
+        resumed = DQNAgent(**deepcopy(params))
+        resumed.resume(agent.default_root_dir)
+
+        self.assertEqual(resumed.iteration_idx, agent.iteration_idx)
+        for key, val in agent.training_loss.items():
+            self.assertEqual(list(resumed.training_loss[key]), list(val))
+        self.assertEqual(resumed.scores["train"], agent.scores["train"])
+        self.assertEqual(list(resumed.epsilons), list(agent.epsilons))
+        for key, val in agent.dqn.state_dict().items():
+            self.assertTrue(torch.equal(val, resumed.dqn.state_dict()[key]))
+
+        resumed.remove_results_from_disk()
+
+    def test_replay_cache(self) -> None:
+        params = {
+            "num_iterations": 10,
+            "replay_buffer_size": 16,
+            "warm_start": 12,
+            "batch_size": 2,
+            "capacity": {"long": 3, "short": 15},
+            "dqn_params": {
+                "gcn_layer_params": {
+                    "type": "stare",
+                    "embedding_dim": 2,
+                    "num_layers": 2,
+                    "gcn_drop": 0.1,
+                    "triple_qual_weight": 0.8,
+                },
+                "relu_between_gcn_layers": True,
+                "dropout_between_gcn_layers": True,
+                "mlp_params": {"num_hidden_layers": 2, "dueling_dqn": True},
+            },
+            "env_config": {
+                "question_prob": 1.0,
+                "terminates_at": 4,
+                "randomize_observations": "all",
+                "room_size": "xl-different-prob",
+                "rewards": {"correct": 1, "wrong": 0, "partial": 0},
+                "make_everything_static": False,
+                "num_total_questions": 5,
+                "question_interval": 1,
+                "include_walls_in_observations": True,
+            },
+            "default_root_dir": "training-results/TRASH",
+            "replay_cache_dir": "training-results/TRASH/replay-cache",
+        }
+        filled = DQNAgent(**deepcopy(params))
+        filled.fill_replay_buffer()
+        after_filling = random.random()
+        self.assertTrue(
+            os.path.isfile(
+                os.path.join(
+                    params["replay_cache_dir"], filled.replay_cache_key() + ".npz"
+                )
+            )
+        )
+
+        loaded = DQNAgent(**deepcopy(params))
+        self.assertEqual(loaded.replay_cache_key(), filled.replay_cache_key())
+        loaded.fill_replay_buffer()
+        self.assertEqual(random.random(), after_filling)
+        self.assertEqual(len(loaded.replay_buffer), 12)
+        self.assertTrue(
+            (loaded.replay_buffer.rews_mm_buf == filled.replay_buffer.rews_mm_buf).all()
+        )
+        # A cache hit is the same buffer as a fresh fill.
+        for name in ["obs_buf", "next_obs_buf", "acts_explore_buf", "done_buf"]:
+            self.assertEqual(
+                getattr(loaded.replay_buffer, name).tolist(),
+                getattr(filled.replay_buffer, name).tolist(),
+            )
+        np.random.seed(0)
+        batch = loaded.replay_buffer.sample_batch()
+        np.random.seed(0)
+        self.assertEqual(
+            batch["next_obs"].tolist(),
+            filled.replay_buffer.sample_batch()["next_obs"].tolist(),
+        )
+
+        other = DQNAgent(**{**deepcopy(params), "warm_start": 8})
+        self.assertNotEqual(other.replay_cache_key(), filled.replay_cache_key())
+
+        for agent in [filled, loaded, other]:
+            agent.remove_results_from_disk()
+        shutil.rmtree(params["replay_cache_dir"])
+
+        # The same with a shared replay buffer, whose cache hit can be trained on.
+        params["shared_replay_buffer"] = True
+        filled = DQNAgent(**deepcopy(params))
+        filled.fill_replay_buffer()
+        loaded = DQNAgent(**deepcopy(params))
+        loaded.fill_replay_buffer()
+        self.assertEqual(len(loaded.replay_buffer), 12)
+        np.random.seed(0)
+        batch = loaded.replay_buffer.sample_batch()
+        np.random.seed(0)
+        expected = filled.replay_buffer.sample_batch()
+        self.assertEqual(batch["rews_mm"].tolist(), expected["rews_mm"].tolist())
+        self.assertEqual(batch["done"].tolist(), expected["done"].tolist())
+        loss_mm, loss_explore, loss = update_model(
+            replay_buffer=loaded.replay_buffer,
+            optimizer=loaded.optimizer,
+            device=loaded.device,
+            dqn=loaded.dqn,
+            dqn_target=loaded.dqn_target,
+            ddqn=loaded.ddqn,
+            gamma=loaded.gamma,
+        )
+        self.assertTrue(np.isfinite(loss))
+
+        for agent in [filled, loaded]:
+            agent.replay_buffer.close()
+            agent.replay_buffer.unlink()
+            agent.remove_results_from_disk()
+        shutil.rmtree(params["replay_cache_dir"])
+
+    def test_timing_and_profiling(self) -> None:
+        agent = DQNAgent(
+            num_iterations=10,
+            replay_buffer_size=10,
+            warm_start=2,
+            batch_size=2,
+            capacity={"long": 3, "short": 15},
+            dqn_params={
+                "gcn_layer_params": {
+                    "type": "stare",
+                    "embedding_dim": 2,
+                    "num_layers": 2,
+                    "gcn_drop": 0.1,
+                    "triple_qual_weight": 0.8,
+                },
+                "relu_between_gcn_layers": True,
+                "dropout_between_gcn_layers": True,
+                "mlp_params": {"num_hidden_layers": 2, "dueling_dqn": True},
+            },
+            num_samples_for_results={"val": 1, "test": 1},
+            validation_interval=1,
+            plotting_interval=50,
+            env_config={
+                "question_prob": 1.0,
+                "terminates_at": 4,
+                "randomize_observations": "all",
+                "room_size": "xl-different-prob",
+                "rewards": {"correct": 1, "wrong": 0, "partial": 0},
+                "make_everything_static": False,
+                "num_total_questions": 5,
+                "question_interval": 1,
+                "include_walls_in_observations": True,
+            },
+            default_root_dir="training-results/TRASH",
+            profile_iterations=[2, 4],
+        )
+        agent.train()
+
+        summary = agent.timer.summary()
+        self.assertEqual(summary["phases"]["update.backward"]["calls"], 8)
+        self.assertIn("gnn.process_batch", summary["phases"])
+        self.assertGreater(summary["rates"]["env_steps"], 0)
+        self.assertIn("nodes", summary["sizes"])
+        for fname in ["profile_trace.json", "profile_key_averages.txt"]:
+            self.assertTrue(os.path.isfile(os.path.join(agent.default_root_dir, fname)))
+        with open(os.path.join(agent.default_root_dir, "profile_trace.json")) as f:
+            self.assertIn("gnn.stare_layer_1", f.read())
+
+        agent.remove_results_from_disk()
@@ -0,0 +1,131 @@
+import logging
+
+logger = logging.getLogger()
+logger.disabled = True
+
+import random
+import unittest
+
+import gymnasium as gym
+
+from agent import HandcraftedAgent
+from agent.local_env import LOCAL_ENV_STR, ROOM_SIZES
+
+ENV_CONFIG = {
+    "question_prob": 1.0,
+    "seed": 42,
+    "terminates_at": 9,
+    "randomize_observations": "all",
+    "room_size": "l-different-prob",
+    "rewards": {"correct": 1, "wrong": 0, "partial": 0},
+    "make_everything_static": False,
+    "num_total_questions": 100,
+    "question_interval": 1,
+    "include_walls_in_observations": True,
+}
+
+
+def run_episode(env: gym.Env, seed: int) -> list:
+    rng = random.Random(seed)
+    observations, info = env.reset()
+    trajectory = [observations]
+    done = False
+    while not done:
+        answers = [rng.choice(env.unwrapped.entities["room"]) for _ in range(10)]
+        action = rng.choice(["north", "east", "south", "west", "stay"])
+        observations, reward, done, truncated, info = env.step((answers, action))
+        trajectory.append((observations, reward))
+    return trajectory
+
+
+class LocalRoomEnvTest(unittest.TestCase):
+    def test_contract(self) -> None:
+        for room_size in ROOM_SIZES:
+            real = gym.make(
+                "room_env:RoomEnv-v2", **{**ENV_CONFIG, "room_size": room_size}
+            )
+            local = gym.make(LOCAL_ENV_STR, **{**ENV_CONFIG, "room_size": room_size})
+            self.assertEqual(
+                {k: len(v) for k, v in local.unwrapped.entities.items()},
+                {k: len(v) for k, v in real.unwrapped.entities.items()},
+            )
+            self.assertEqual(local.unwrapped.relations, real.unwrapped.relations)
+            self.assertEqual(
+                len(local.unwrapped.return_room_layout(False)),
+                len(real.unwrapped.return_room_layout(False)),
+            )
+            for attribute in [
+                "num_questions_step",
+                "total_maximum_episode_rewards",
+                "terminates_at",
+            ]:
+                self.assertEqual(
+                    getattr(local.unwrapped, attribute),
+                    getattr(real.unwrapped, attribute),
+                )
+
+    def test_episode(self) -> None:
+        env = gym.make(LOCAL_ENV_STR, **ENV_CONFIG)
+        trajectory = run_episode(env, 0)
+        self.assertEqual(len(trajectory), ENV_CONFIG["terminates_at"] + 2)
+        entities = {e for es in env.unwrapped.entities.values() for e in es}
+
+        for t, step in enumerate(trajectory):
+            observations = step if t == 0 else step[0]
+            (agent,) = [obs for obs in observations["room"] if obs[0] == "agent"]
+            for head, relation, tail, time in observations["room"]:
+                self.assertEqual(time, t)
+                self.assertIn(head, entities)
+                self.assertIn(tail, entities)
+                if relation == "atlocation":
+                    self.assertEqual(tail, agent[2])
+                else:
+                    self.assertEqual(head, agent[2])
+                    self.assertEqual(tail, env.unwrapped.room_map[agent[2]][relation])
+            self.assertEqual(len(observations["questions"]), 10)
+            for question in observations["questions"]:
+                self.assertEqual(question[1:], ["atlocation", "?", t])
+            if t > 0:
+                self.assertTrue(0 <= step[1] <= 10)
+
+    def test_question_prob(self) -> None:
+        env = gym.make(LOCAL_ENV_STR, **{**ENV_CONFIG, "question_prob": 0.5})
+        trajectory = run_episode(env, 0)
+        questions = [
+            question
+            for t, step in enumerate(trajectory)
+            for question in (step if t == 0 else step[0])["questions"]
+        ]
+        self.assertIn(None, questions)
+        self.assertTrue(any(question is not None for question in questions))
+
+        num_asked = [
+            sum(question is not None for question in step["questions"])
+            for step in [trajectory[0]] + [step[0] for step in trajectory[1:-1]]
+        ]
+        for asked, (_, reward) in zip(num_asked, trajectory[1:]):
+            self.assertTrue(0 <= reward <= asked)
+
+    def test_seed(self) -> None:
+        self.assertEqual(
+            run_episode(gym.make(LOCAL_ENV_STR, **ENV_CONFIG), 0),
+            run_episode(gym.make(LOCAL_ENV_STR, **ENV_CONFIG), 0),
+        )
+        self.assertNotEqual(
+            run_episode(gym.make(LOCAL_ENV_STR, **ENV_CONFIG), 0),
+            run_episode(gym.make(LOCAL_ENV_STR, **{**ENV_CONFIG, "seed": 0}), 0),
+        )
+
+    def test_handcrafted_agent(self) -> None:
+        agent = HandcraftedAgent(
+            env_str=LOCAL_ENV_STR,
+            env_config=ENV_CONFIG,
+            mm_policy="handcrafted",
+            pretrain_semantic="include_walls",
+            num_samples_for_results=2,
+            capacity={"long": 12, "short": 15},
+            default_root_dir="./training-results/TRASH",
+        )
+        agent.test()
+        agent.remove_results_from_disk()
+        self.assertLessEqual(agent.scores["test_score"]["mean"], 100)
@@ -4,9 +4,12 @@ from copy import deepcopy
 
 from humemai.memory import LongMemory, MemorySystems, ShortMemory
 
-from agent.policy import (answer_question, encode_all_observations,
+from agent.policy import (MM_ACTIONS, HandcraftedMMPolicy, answer_question,
+                          answer_questions, encode_all_observations,
                           encode_observation, explore, find_agent_location,
+                          ingest_observations, manage_all_memories,
                           manage_memory)
+from agent.utils import checked_mode
 
 
 class TestFindAgentLocation(unittest.TestCase):
@@ -267,6 +270,52 @@ class TestEncodeAllObservations(unittest.TestCase):
         self.assertEqual(self.short_memory.entries.count(expected_memory), 1)
 
 
+class TestIngestObservations(unittest.TestCase):
+
+    setUp = TestEncodeAllObservations.setUp
+
+    def test_ingest_observations_success(self):
+        """Test that the observations are encoded like one by one."""
+        obs_list = [
+            ["agent", "atlocation", "room1", 1],
+            ["room1", "north", "wall", 1],
+            ["agent", "atlocation", "room1", 1],
+        ]
+        ingest_observations(self.memory_systems, obs_list)
+        self.assertEqual(
+            self.short_memory.entries,
+            [
+                ["agent", "atlocation", "room1", {"current_time": 1}],
+                ["room1", "north", "wall", {"current_time": 1}],
+            ],
+        )
+
+    def test_ingest_observations_duplicates(self):
+        """Test that the duplicates are dropped without an error, like one by one."""
+        obs_list = [["agent", "atlocation", f"room{i % 2}", 1] for i in range(4)]
+        ingest_observations(self.memory_systems, obs_list)
+        self.assertEqual(
+            self.short_memory.entries,
+            [
+                ["agent", "atlocation", "room0", {"current_time": 1}],
+                ["agent", "atlocation", "room1", {"current_time": 1}],
+            ],
+        )
+
+        obs_list.append(["agent", "atlocation", "room0", 2])
+        self.short_memory.forget_all()
+        ingest_observations(self.memory_systems, obs_list)
+        self.assertEqual(len(self.short_memory.entries), 3)
+
+    def test_ingest_observations_full(self):
+        """Test that nothing is encoded when the observations don't fit."""
+        obs_list = [["agent", "atlocation", f"room{i}", 1] for i in range(4)]
+        with self.assertRaises(ValueError) as context:
+            ingest_observations(self.memory_systems, obs_list)
+        self.assertEqual(str(context.exception), "The memory system is full!")
+        self.assertEqual(len(self.short_memory.entries), 0)
+
+
 class TestManageMemory(unittest.TestCase):
 
     def setUp(self):
@@ -295,6 +344,21 @@ class TestManageMemory(unittest.TestCase):
         self.assertIn(expected_memory, self.long_memory.entries)
         self.assertNotIn(self.mem_short, self.short_memory.entries)
 
+    def test_manage_memory_checked(self):
+        """Test that the checked mode asserts that the memory is a short-term one."""
+        mem_short = ["laptop", "atlocation", "room1", {"current_time": 1}]
+        with checked_mode(True):
+            with self.assertRaises(AssertionError):
+                manage_memory(self.memory_systems, "episodic", mem_short)
+
+    def test_manage_memory_fast(self):
+        """Test that the fast mode moves a memory like the checked mode."""
+        with checked_mode(False):
+            manage_memory(self.memory_systems, "episodic", self.mem_short)
+        expected_memory = ["agent", "atlocation", "room1", {"timestamp": [1]}]
+        self.assertIn(expected_memory, self.long_memory.entries)
+        self.assertNotIn(self.mem_short, self.short_memory.entries)
+
     def test_manage_memory_random(self):
         """Test moving short-term memory to long-term memory with random policy."""
         episodic_count = 0
@@ -447,6 +511,93 @@ class TestManageMemory(unittest.TestCase):
         self.assertGreaterEqual(len(set(possible_rooms)), 3)
 
 
+class TestManageAllMemories(unittest.TestCase):
+
+    def test_same_as_manage_memory(self):
+        """Test that the memories are moved like one by one."""
+        observations = [
+            ["agent", "atlocation", "room1", 5],
+            ["room1", "north", "wall", 5],
+            ["room1", "east", "room2", 5],
+            ["laptop", "atlocation", "room1", 5],
+            ["phone", "atlocation", "room1", 5],
+        ]
+        policies = ["episodic", "forget", "semantic", "semantic", "episodic"]
+
+        entries = []
+        for batched in [False, True]:
+            memory_systems = MemorySystems(
+                short=ShortMemory(capacity=5), long=LongMemory(capacity=3)
+            )
+            memory_systems.long.add(
+                ["agent", "atlocation", "room3", {"timestamp": [2]}]
+            )
+            memory_systems.long.add(["laptop", "atlocation", "room2", {"strength": 2}])
+            ingest_observations(memory_systems, observations)
+            if batched:
+                manage_all_memories(memory_systems, policies)
+            else:
+                for policy, mem_short in zip(policies, list(memory_systems.short)):
+                    manage_memory(memory_systems, policy, mem_short)
+            self.assertTrue(memory_systems.short.is_empty)
+            entries.append(memory_systems.long.entries)
+
+        self.assertEqual(entries[0], entries[1])
+        self.assertEqual(len(entries[1]), 3)
+
+
+class TestHandcraftedMMPolicy(unittest.TestCase):
+
+    @staticmethod
+    def handcrafted(mem_short: list) -> str:
+        """The rules of the "handcrafted" policy, as substring tests."""
+        if mem_short[0] == "agent":
+            return "episodic"
+        elif "ind" in mem_short[0] or "dep" in mem_short[0]:
+            return "episodic"
+        elif "sta" in mem_short[0]:
+            return "semantic"
+        elif "room" in mem_short[0] and "room" in mem_short[2]:
+            return "semantic"
+        elif "wall" in mem_short[2]:
+            return "forget"
+        else:
+            raise ValueError("something is wrong")
+
+    def test_same_as_substring_tests(self):
+        """Test that the table gives the actions of the substring tests."""
+        entities = [
+            "agent",
+            "ind_001",
+            "dep_001",
+            "sta_001",
+            "room_001",
+            "wall",
+            "laptop",
+            "roomwall",
+            "sta_room",
+        ]
+        policy = HandcraftedMMPolicy(entities[:4])
+        mems_short, expected = [], []
+        for head in entities:
+            for tail in entities:
+                mem_short = [head, "north", tail, {"current_time": 1}]
+                try:
+                    action = self.handcrafted(mem_short)
+                except ValueError:
+                    with self.assertRaises(ValueError):
+                        policy.action(mem_short)
+                    continue
+                self.assertEqual(policy.action(mem_short), action)
+                mems_short.append(mem_short)
+                expected.append(MM_ACTIONS.index(action))
+
+        self.assertEqual(policy.actions(mems_short).tolist(), expected)
+        self.assertEqual(policy.actions([]).tolist(), [])
+        with self.assertRaises(ValueError):
+            policy.actions(mems_short + [["laptop", "atlocation", "room_001", {}]])
+
+
 class TestAnswerQuestion(unittest.TestCase):
 
     def setUp(self):
@@ -520,3 +671,46 @@ class TestAnswerQuestion(unittest.TestCase):
         self.assertIsNone(answer)
         answer = answer_question(self.memory_systems, "strongest_latest", question)
         self.assertIsNone(answer)
+
+
+class TestAnswerQuestions(unittest.TestCase):
+
+    setUp = TestAnswerQuestion.setUp
+
+    def test_same_as_answer_question(self):
+        """Test that the batched answers are the same as the one by one answers."""
+        questions = [
+            ["agent", "atlocation", "?", 5],
+            ["laptop", "atlocation", "?", 5],
+            ["car", "atlocation", "?", 5],
+        ]
+        for qa_function in ["latest", "strongest", "latest_strongest"]:
+            self.assertEqual(
+                answer_questions(self.memory_systems, qa_function, questions),
+                [
+                    answer_question(self.memory_systems, qa_function, question)
+                    for question in questions
+                ],
+            )
+        self.assertEqual(
+            answer_questions(self.memory_systems, "strongest_latest", questions),
+            ["room2", "room2", None],
+        )
+
+    def test_answer_questions_random(self):
+        """Test that the random answers are of the queried memories."""
+        answers = answer_questions(
+            self.memory_systems, "random", [["laptop", "atlocation", "?", 5]] * 100
+        )
+        self.assertEqual(set(answers), {"room1", "room2"})
+
+    def test_answer_questions_none(self):
+        """Test that the questions that are not asked are answered with None."""
+        self.assertEqual(
+            answer_questions(
+                self.memory_systems, "latest", [None, ["agent", "atlocation", "?", 5]]
+            ),
+            [None, "room1"],
+        )
+        with self.assertRaises(ValueError):
+            answer_questions(self.memory_systems, "foo", [])
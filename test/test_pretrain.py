@@ -0,0 +1,57 @@
+import unittest
+from unittest import mock
+
+import gymnasium as gym
+from humemai.memory import LongMemory
+
+from agent.local_env import LOCAL_ENV_STR
+from agent.pretrain import pretrain_semantic, room_layout
+
+
+class PretrainSemanticTest(unittest.TestCase):
+    def test_same_as_pretraining(self) -> None:
+        env = gym.make(LOCAL_ENV_STR, room_size="m")
+        expected = LongMemory(capacity=12, semantic_decay_factor=0.9, min_strength=1)
+        expected.pretrain_semantic(
+            semantic_knowledge=env.unwrapped.return_room_layout(True)
+        )
+
+        with mock.patch.object(
+            env.unwrapped,
+            "return_room_layout",
+            wraps=env.unwrapped.return_room_layout,
+        ) as return_room_layout:
+            longs = []
+            for _ in range(3):
+                long = LongMemory(
+                    capacity=12, semantic_decay_factor=0.9, min_strength=1
+                )
+                pretrain_semantic(long, env, exclude_walls=True)
+                longs.append(long)
+            self.assertEqual(len(room_layout(env, True)), 20)
+            return_room_layout.assert_called_once_with(True)
+
+        for long in longs:
+            self.assertEqual(vars(long), vars(expected))
+
+        # The copies don't share their qualifiers.
+        longs[0].decay()
+        longs[0].entries[0][3]["strength"] = 100
+        self.assertEqual(longs[1].entries, expected.entries)
+
+    def test_capacity(self) -> None:
+        env = gym.make(LOCAL_ENV_STR, room_size="m")
+        for capacity in [4, 8, 4]:
+            long = LongMemory(
+                capacity=capacity, semantic_decay_factor=1.0, min_strength=1
+            )
+            pretrain_semantic(long, env, exclude_walls=False)
+            self.assertEqual(long.size, capacity)
+
+            expected = LongMemory(
+                capacity=capacity, semantic_decay_factor=1.0, min_strength=1
+            )
+            expected.pretrain_semantic(
+                semantic_knowledge=env.unwrapped.return_room_layout(False)
+            )
+            self.assertEqual(vars(long), vars(expected))
@@ -0,0 +1,151 @@
+import random
+import unittest
+
+import numpy as np
+import torch
+from humemai.memory import LongMemory, MemorySystems, ShortMemory
+
+from agent.dqn.nn.utils import process_graph
+from agent.dqn.shared_replay import decode_state, encode_state
+from agent.policy import (answer_questions, ingest_observations,
+                          manage_all_memories)
+from agent.store import LONG, SHORT, MemoryStore
+
+ROOMS = [f"room_{i:03d}" for i in range(4)]
+OBJECTS = ["agent", "sta_000", "ind_000", "dep_000", "ind_001"]
+ENTITIES = ROOMS + OBJECTS + ["wall"]
+RELATIONS = ["north", "east", "south", "west", "atlocation"]
+
+
+def random_observations(rng: random.Random, t: int) -> list[list]:
+    room = rng.choice(ROOMS)
+    observations = [["agent", "atlocation", room, t]]
+    observations += [
+        [room, direction, rng.choice(ROOMS + ["wall"]), t]
+        for direction in rng.sample(RELATIONS[:4], rng.randint(0, 4))
+    ]
+    observations += [[obj, "atlocation", room, t] for obj in rng.sample(OBJECTS[1:], 2)]
+    return observations
+
+
+def long_term(entries: list[list]) -> list[tuple]:
+    """The triples of long-term memories, with what the store keeps of them."""
+    rows = []
+    for head, relation, tail, qualifiers in entries:
+        timestamps = qualifiers.get("timestamp")
+        rows.append(
+            (
+                head,
+                relation,
+                tail,
+                min(timestamps) if timestamps else None,
+                max(timestamps) if timestamps else None,
+                round(qualifiers["strength"], 6) if "strength" in qualifiers else None,
+            )
+        )
+    return rows
+
+
+class MemoryStoreTest(unittest.TestCase):
+    def make(self, capacity: dict) -> tuple[MemorySystems, MemoryStore]:
+        memory_systems = MemorySystems(
+            short=ShortMemory(capacity=capacity["short"]),
+            long=LongMemory(
+                capacity=capacity["long"], semantic_decay_factor=0.8, min_strength=1
+            ),
+        )
+        store = MemoryStore(
+            ENTITIES, RELATIONS, capacity, semantic_decay_factor=0.8, min_strength=1
+        )
+        return memory_systems, store
+
+    def assert_same(self, memory_systems: MemorySystems, store: MemoryStore) -> None:
+        self.assertEqual(store.to_list(SHORT), memory_systems.short.to_list())
+        self.assertEqual(
+            long_term(store.to_list(LONG)), long_term(memory_systems.long.to_list())
+        )
+        self.assertEqual(store.count_memories(), memory_systems.long.count_memories())
+
+        state = memory_systems.short.to_list() + memory_systems.long.to_list()
+        triples, quals, num = encode_state(
+            state, store.entity_to_idx, store.relation_to_idx, len(state)
+        )
+        store_triples, store_quals = store.working_memory()
+        self.assertEqual(len(store_triples), num)
+        np.testing.assert_array_equal(store_triples, triples)
+        np.testing.assert_allclose(store_quals, quals)
+        self.assert_same_gnn_input(
+            decode_state(triples, quals, num, store.entities, store.relations), store
+        )
+
+        questions = [[obj, "atlocation", "?", 0] for obj in OBJECTS]
+        questions += [["?", "atlocation", room, 0] for room in ROOMS]
+        for qa_function in ["latest_strongest", "strongest_latest", "latest"]:
+            self.assertEqual(
+                [store.answer_question(qa_function, q) for q in questions],
+                answer_questions(memory_systems, qa_function, questions),
+            )
+
+    def assert_same_gnn_input(self, state: list[list], store: MemoryStore) -> None:
+        if not any("agent" in (mem[0], mem[2]) for mem in state):
+            with self.assertRaises(ValueError):
+                store.gnn_input()
+            return
+        for output, expected in zip(
+            store.gnn_input(), process_graph(state), strict=True
+        ):
+            if isinstance(expected, torch.Tensor):
+                self.assertTrue(torch.equal(output, expected))
+            else:
+                self.assertEqual(output, expected)
+
+    def test_same_as_memory_systems(self) -> None:
+        """Test random episodes on both the memory systems and the store."""
+        for seed in range(10):
+            rng = random.Random(seed)
+            memory_systems, store = self.make({"short": 8, "long": 6})
+            for t in range(30):
+                observations = random_observations(rng, t)
+                ingest_observations(memory_systems, observations)
+                store.add_observations(observations)
+                self.assert_same(memory_systems, store)
+
+                policies = [
+                    rng.choice(["episodic", "semantic", "forget"]) for _ in observations
+                ]
+                random.seed(t)
+                manage_all_memories(memory_systems, policies)
+                random.seed(t)
+                store.manage(policies)
+                memory_systems.long.decay()
+                store.decay()
+                self.assert_same(memory_systems, store)
+
+    def test_pretrain_semantic(self) -> None:
+        memory_systems, store = self.make({"short": 4, "long": 3})
+        layout = [[room, "north", "wall"] for room in ROOMS]
+        memory_systems.long.pretrain_semantic(semantic_knowledge=layout)
+        store.pretrain_semantic(layout)
+        self.assertEqual(store.num_long, 3)
+        self.assert_same(memory_systems, store)
+
+    def test_forget_long(self) -> None:
+        _, store = self.make({"short": 2, "long": 3})
+        for room in ROOMS[:3]:
+            store.add_long(["agent", "atlocation", room, {"timestamp": [1, 2]}])
+        store.add_long(["agent", "atlocation", ROOMS[0], {"strength": 2}])
+        self.assertFalse(
+            store.can_be_added(["agent", "atlocation", ROOMS[3], {"strength": 1}])
+        )
+        store.forget_long(["agent", "atlocation", ROOMS[1], {}])
+        self.assertEqual(
+            store.to_list(LONG),
+            [
+                ["agent", "atlocation", ROOMS[0], {"timestamp": [1, 2], "strength": 2}],
+                ["agent", "atlocation", ROOMS[2], {"timestamp": [1, 2]}],
+            ],
+        )
+        self.assertEqual(store.query("agent", "atlocation", None).tolist(), [0, 1])
+        self.assertEqual(store.select("weakest"), store.capacity["short"])
+        with self.assertRaises(ValueError):
+            store.forget_long(["agent", "atlocation", ROOMS[1], {}])
@@ -0,0 +1,101 @@
+import logging
+
+logger = logging.getLogger()
+logger.disabled = True
+
+import json
+import os
+import tempfile
+import unittest
+
+from agent.sweep import expand_grid, run_sweep
+
+
+class SweepTest(unittest.TestCase):
+    def test_expand_grid(self) -> None:
+        combinations = expand_grid(
+            [
+                {"mm_policy": ["random", "handcrafted"], "qa_function": ["latest"]},
+                {"mm_policy": ["episodic"], "qa_function": ["latest", "random"]},
+                {"mm_policy": ["random"], "qa_function": ["latest"]},
+            ]
+        )
+        self.assertEqual(
+            combinations,
+            [
+                {"mm_policy": "random", "qa_function": "latest"},
+                {"mm_policy": "handcrafted", "qa_function": "latest"},
+                {"mm_policy": "episodic", "qa_function": "latest"},
+                {"mm_policy": "episodic", "qa_function": "random"},
+            ],
+        )
+
+    def test_run_and_resume(self) -> None:
+        grid = {
+            "room_size": ["xxs"],
+            "mm_policy": ["random", "handcrafted"],
+            "qa_function": ["latest_strongest"],
+            "explore_policy": ["avoid_walls"],
+            "pretrain_semantic": [False],
+            "capacity_long": [6],
+            "semantic_decay_factor": [0.8],
+        }
+        env_config = {
+            "question_prob": 1.0,
+            "terminates_at": 4,
+            "randomize_observations": "objects",
+            "rewards": {"correct": 1, "wrong": 0, "partial": 0},
+            "make_everything_static": False,
+            "num_total_questions": 5,
+            "question_interval": 1,
+            "include_walls_in_observations": True,
+        }
+        with tempfile.TemporaryDirectory() as out_dir:
+            rows = run_sweep(
+                grid,
+                out_dir,
+                env_config=env_config,
+                seeds=[0, 1],
+                num_samples_for_results=2,
+                num_workers=2,
+            )
+            self.assertEqual(len(rows), 2)
+            self.assertTrue(all(row["num_seeds"] == 2 for row in rows))
+            self.assertTrue(os.path.isfile(os.path.join(out_dir, "results.csv")))
+            with open(os.path.join(out_dir, "progress.jsonl")) as stream:
+                self.assertEqual(len(stream.readlines()), 4)
+
+            # Nothing is left to run, and the table is the same.
+            rows_resumed = run_sweep(
+                grid,
+                out_dir,
+                env_config=env_config,
+                seeds=[0, 1],
+                num_samples_for_results=2,
+                num_workers=2,
+            )
+            self.assertEqual(rows_resumed, rows)
+            with open(os.path.join(out_dir, "progress.jsonl")) as stream:
+                self.assertEqual(len(stream.readlines()), 4)
+
+            # A record cut short is dropped, and its job is run again.
+            path = os.path.join(out_dir, "progress.jsonl")
+            with open(path) as stream:
+                lines = stream.readlines()
+            with open(path, "w") as stream:
+                stream.writelines(lines[:3])
+                stream.write(lines[3][:20])
+            rows_resumed = run_sweep(
+                grid,
+                out_dir,
+                env_config=env_config,
+                seeds=[0, 1],
+                num_samples_for_results=2,
+                num_workers=2,
+            )
+            self.assertEqual(rows_resumed, rows)
+            with open(path) as stream:
+                self.assertEqual(
+                    sorted(json.loads(line)["scores"] for line in stream),
+                    sorted(json.loads(line)["scores"] for line in lines),
+                )
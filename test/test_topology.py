@@ -0,0 +1,73 @@
+import random
+import unittest
+
+from humemai.memory import LongMemory, MemorySystems, ShortMemory
+
+from agent.eviction import EvictionIndex
+from agent.policy import (explore, find_agent_location, ingest_observations,
+                          manage_all_memories)
+from agent.topology import RoomTopology
+
+OBSERVATIONS = [
+    ["room1", "north", "room2", 6],
+    ["room1", "east", "wall", 6],
+    ["room1", "south", "room3", 6],
+    ["agent", "atlocation", "room1", 6],
+    ["laptop", "atlocation", "room1", 6],
+]
+
+
+class RoomTopologyTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.memory_systems = MemorySystems(
+            short=ShortMemory(capacity=10), long=LongMemory(capacity=10)
+        )
+        self.memory_systems.long.add(["room1", "west", "wall", {"strength": 3}])
+        self.memory_systems.long.add(["room4", "north", "wall", {"timestamp": [1]}])
+        self.eviction_index = EvictionIndex(self.memory_systems.long)
+        self.topology = RoomTopology(self.eviction_index)
+
+    def test_observe(self) -> None:
+        ingest_observations(self.memory_systems, OBSERVATIONS, topology=self.topology)
+        self.assertEqual(self.topology.agent_location, "room1")
+        self.assertEqual(
+            self.topology.rooms,
+            {"room1": {"north": "room2", "east": "wall", "south": "room3"}},
+        )
+        self.assertEqual(self.topology.walls("room1"), {"east", "west"})
+        self.assertEqual(self.topology.walls("room4"), {"north"})
+        self.assertEqual(self.topology.open_directions(), {"north", "south"})
+
+        manage_all_memories(
+            self.memory_systems,
+            ["episodic"] * self.memory_systems.short.size,
+            eviction_index=self.eviction_index,
+            topology=self.topology,
+        )
+        self.assertIsNone(self.topology.agent_location)
+        self.assertEqual(self.topology.open_directions(), set())
+        # The wall is remembered by the long-term memory now.
+        self.assertEqual(self.topology.walls("room1"), {"east", "west"})
+        self.assertTrue(self.topology.has_edges("room1"))
+
+        self.eviction_index.forget_by_selection("weakest")
+        self.assertEqual(self.topology.walls("room1"), {"east"})
+
+    def test_same_as_working_memory(self) -> None:
+        """Test that the topology answers like the scans of the working memory."""
+        ingest_observations(self.memory_systems, OBSERVATIONS, topology=self.topology)
+        self.assertEqual(
+            find_agent_location(self.memory_systems, self.topology),
+            find_agent_location(self.memory_systems),
+        )
+        for topology in [None, self.topology]:
+            random.seed(0)
+            actions = {
+                explore(self.memory_systems, "avoid_walls", topology=topology)
+                for _ in range(100)
+            }
+            self.assertEqual(actions, {"north", "south"})
+
+    def test_no_location(self) -> None:
+        with self.assertRaises(ValueError):
+            find_agent_location(self.memory_systems, self.topology)
@@ -3,8 +3,8 @@ import unittest
 import numpy as np
 import torch
 
-from agent.utils import (argmax, get_duplicate_dicts, list_duplicates_of,
-                         positional_encoding)
+from agent.utils import (argmax, checked_mode, get_duplicate_dicts, is_checked,
+                         list_duplicates_of, positional_encoding, set_checked)
 
 
 class TestUtils(unittest.TestCase):
@@ -15,6 +15,23 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(argmax([-1, -3, -2, -4]), 0)
         self.assertEqual(argmax([1]), 0)
 
+    def test_checked_mode(self):
+        """Test switching between the checked and the fast mode."""
+        previous = set_checked(True)
+        self.assertTrue(is_checked())
+        with checked_mode(False):
+            self.assertFalse(is_checked())
+            with checked_mode(True):
+                self.assertTrue(is_checked())
+            self.assertFalse(is_checked())
+        self.assertTrue(is_checked())
+
+        with self.assertRaises(RuntimeError):
+            with checked_mode(False):
+                raise RuntimeError
+        self.assertTrue(is_checked())
+        self.assertTrue(set_checked(previous))
+
     def test_get_duplicate_dicts(self):
         """Test the get_duplicate_dicts function."""
         search = {"a": 1, "b": 2}